@@ -0,0 +1,147 @@
+# Run loops for the Assistants API on the async client: the original polling loop and a
+# streaming, event-driven loop
+
+import asyncio
+import os
+import time
+
+from tracing import record_usage, span
+
+# Same 60 second budget the chat loop has always used
+RUN_TIMEOUT = 60
+TIMEOUT_MESSAGE = "The request timed out. Please try again later."
+
+# "stream" reacts to run events as they arrive, "poll" keeps the old once-a-second loop
+RUN_MODE = os.getenv("ASSISTANT_RUN_MODE", "stream")
+
+TERMINAL_EVENTS = {
+    "thread.run.completed": "completed",
+    "thread.run.failed": "failed",
+    "thread.run.cancelled": "cancelled",
+    "thread.run.expired": "expired",
+    "thread.run.incomplete": "incomplete",
+}
+
+
+# Poll the run until it completes, fails or times out; handle_tool_calls is a coroutine function.
+# Returns (status, messages); messages is None because the caller has to list them itself.
+async def apoll_run(client, thread_id, assistant_id, handle_tool_calls, timeout=RUN_TIMEOUT, interval=1, **run_options):
+    with span("run.create"):
+        run = await client.beta.threads.runs.create(
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            **run_options
+        )
+
+    start_time = time.time()
+    while True:
+        if time.time() - start_time > timeout:
+            raise TimeoutError(TIMEOUT_MESSAGE)
+
+        with span("run.poll") as poll_span:
+            run = await client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+            poll_span.set(status=run.status)
+
+        if run.status == "requires_action":
+            tool_calls = run.required_action.submit_tool_outputs.tool_calls
+            with span("tools", calls=len(tool_calls)):
+                tool_outputs = await handle_tool_calls(tool_calls)
+            with span("run.submit_tool_outputs"):
+                await client.beta.threads.runs.submit_tool_outputs(
+                    thread_id=thread_id,
+                    run_id=run.id,
+                    tool_outputs=tool_outputs
+                )
+        elif run.status in ("completed", "failed", "cancelled", "expired", "incomplete"):
+            record_usage(run.usage, "run")
+            return run.status, None
+
+        await asyncio.sleep(interval)
+
+
+# Stream the run and react to each event as it arrives.
+# Tool outputs are submitted on a continuation of the same run stream, and the assistant's
+# messages are collected from the stream so no extra messages.list round trip is needed.
+# Returns (status, messages) with messages newest first, like messages.list. on_delta, if given,
+# is awaited with each piece of message text and the id of its message as it arrives, for callers
+# that pass the answer on while it is being written; only the run's last message is the answer.
+async def astream_run(client, thread_id, assistant_id, handle_tool_calls, timeout=RUN_TIMEOUT, on_delta=None,
+                      **run_options):
+    import openai
+    deadline = time.time() + timeout
+    messages = []
+
+    manager = client.beta.threads.runs.stream(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        timeout=timeout,
+        **run_options
+    )
+    # One span per stream: the run itself, then each continuation after tool outputs
+    stage = "run.stream"
+    try:
+        while manager is not None:
+            next_manager = None
+            with span(stage) as stream_span:
+                async with manager as stream:
+                    async for event in stream:
+                        if time.time() > deadline:
+                            raise TimeoutError(TIMEOUT_MESSAGE)
+
+                        stream_span.add("events")
+                        if event.event == "thread.message.delta" and on_delta is not None:
+                            for part in event.data.delta.content or []:
+                                if part.type == "text" and part.text and part.text.value:
+                                    await on_delta(part.text.value, event.data.id)
+                        elif event.event == "thread.message.completed":
+                            messages.append(event.data)
+                        elif event.event == "thread.run.requires_action":
+                            run = event.data
+                            tool_calls = run.required_action.submit_tool_outputs.tool_calls
+                            with span("tools", calls=len(tool_calls)):
+                                tool_outputs = await handle_tool_calls(tool_calls)
+                            remaining = deadline - time.time()
+                            if remaining <= 0:
+                                raise TimeoutError(TIMEOUT_MESSAGE)
+                            next_manager = client.beta.threads.runs.submit_tool_outputs_stream(
+                                thread_id=thread_id,
+                                run_id=run.id,
+                                tool_outputs=tool_outputs,
+                                timeout=remaining
+                            )
+                            break
+                        elif event.event in TERMINAL_EVENTS:
+                            record_usage(getattr(event.data, "usage", None), "run")
+                            return TERMINAL_EVENTS[event.event], list(reversed(messages))
+            manager = next_manager
+            stage = "run.submit_tool_outputs"
+    except openai.APITimeoutError:
+        raise TimeoutError(TIMEOUT_MESSAGE)
+
+    return "failed", list(reversed(messages))
+
+
+# Run the assistant on the thread with the configured run mode; on_delta only sees text in stream mode
+async def aexecute_run(client, thread_id, assistant_id, handle_tool_calls, mode=None, timeout=RUN_TIMEOUT,
+                       on_delta=None, **run_options):
+    if (mode or RUN_MODE) == "poll":
+        return await apoll_run(client, thread_id, assistant_id, handle_tool_calls, timeout=timeout, **run_options)
+    return await astream_run(
+        client, thread_id, assistant_id, handle_tool_calls, timeout=timeout, on_delta=on_delta, **run_options
+    )
+
+
+# Text of the newest assistant message in a newest-first message list
+def extract_response(messages):
+    if messages:
+        for message in messages:
+            if message.role == "assistant":
+                if isinstance(message.content, list):
+                    return " ".join([item.text.value for item in message.content if hasattr(item, 'text')])
+                elif isinstance(message.content, str):
+                    return message.content
+                else:
+                    return str(message.content)
+        return "No response received from assistant."
+    else:
+        return "No response received from assistant."
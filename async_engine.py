@@ -0,0 +1,198 @@
+# asyncio chat engine: one process serves many concurrent conversations, each session with
+# its own Assistants thread. It is the one turn implementation behind main.py, chat_server.py
+# and batch_eval.py. Retrieval, the run loop and the tools are all non-blocking, and
+# MAX_CONCURRENT_TURNS bounds how many turns are in flight at once.
+
+import asyncio
+import os
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+from assistant_runs import aexecute_run, extract_response
+from http_client import async_http_client
+from lifecycle import aget_or_create_assistant, get_embeddings
+from retrieval import aget_relevant_documents, context_instructions, pack_context
+from tool_dispatch import adispatch_tool_calls
+from tool_registry import registry
+from response_cache import AsyncToolUseTracker, response_cache
+from conversation_memory import ConversationMemory, asummarize_with_openai
+from tracing import span
+from transactions import turn_scope
+
+# Load environment variables
+load_dotenv()
+
+MAX_CONCURRENT_TURNS = int(os.getenv("MAX_CONCURRENT_TURNS", "100"))
+
+
+class ChatSession:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        # The thread is created by the session's first turn
+        self.thread_id = None
+        # Turns of one session run one at a time, like they would in a single conversation
+        self.lock = asyncio.Lock()
+        self.turns = 0
+        # Names the session's turns in transaction idempotency keys, unique even if the id is reused
+        self.conversation_id = uuid.uuid4().hex
+        self.last_active = time.time()
+        # Bounded history of the conversation, replayed into a new thread when it is compacted
+        self.memory = ConversationMemory()
+
+
+class AsyncChatEngine:
+    # allow_side_effects=False answers calls of side-effecting tools (process_transaction) with a
+    # dry-run note instead of running them, for evaluation runs
+    def __init__(self, client=None, assistant_id=None, max_concurrency=MAX_CONCURRENT_TURNS,
+                 retrieve=aget_relevant_documents, response_cache=response_cache, embeddings=None,
+                 allow_side_effects=True):
+        if client is None:
+            import openai
+            client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = client
+        self.assistant_id = assistant_id
+        self.retrieve = retrieve
+        self.response_cache = response_cache
+        self.embeddings = embeddings
+        self.allow_side_effects = allow_side_effects
+        self.sessions = {}
+        self._turn_slots = asyncio.Semaphore(max_concurrency)
+
+    # Look up or create the assistant unless an assistant id was given
+    async def start(self):
+        if self.assistant_id is None:
+            self.assistant_id = await aget_or_create_assistant(self.client)
+        return self
+
+    def get_session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = ChatSession(session_id)
+        return session
+
+    def end_session(self, session_id):
+        self.sessions.pop(session_id, None)
+
+    async def _ensure_thread(self, session):
+        if session.thread_id is None:
+            thread = await self.client.beta.threads.create()
+            session.thread_id = thread.id
+            session.memory.thread_started()
+
+    # Create the session's thread ahead of its first turn
+    async def ensure_thread(self, session_id):
+        session = self.get_session(session_id)
+        async with session.lock:
+            await self._ensure_thread(session)
+        return session
+
+    async def _run_tool_call(self, tool_call):
+        name = tool_call.function.name
+        tool = registry.get(name)
+        if not self.allow_side_effects and tool is not None and tool.side_effects:
+            return f"Dry run: {name} was not executed, nothing was processed."
+        with span(f"tool.{name}"):
+            return await registry.acall(name, tool_call.function.arguments)
+
+    async def _handle_tool_calls(self, tool_calls):
+        return await adispatch_tool_calls(tool_calls, self._run_tool_call)
+
+    # Fold older turns into the session's summary and continue on a new thread seeded with it
+    async def _compact_thread(self, session):
+        with span("thread.compact"):
+            await session.memory.acompact(lambda summary, turns: asummarize_with_openai(summary, turns, self.client))
+            thread = await self.client.beta.threads.create(messages=session.memory.thread_messages())
+            session.thread_id = thread.id
+            session.memory.thread_started()
+
+    # Add a turn answered without a run to the thread and the history, so later turns see it
+    async def _record_exchange(self, session, user_input, response):
+        with span("messages.create"):
+            await self.client.beta.threads.messages.create(thread_id=session.thread_id, role="user", content=user_input)
+            await self.client.beta.threads.messages.create(
+                thread_id=session.thread_id, role="assistant", content=response
+            )
+        session.memory.add_turn(user_input, response)
+        if session.memory.needs_compaction():
+            await self._compact_thread(session)
+
+    def memory_stats(self):
+        return {session_id: session.memory.stats() for session_id, session in self.sessions.items()}
+
+    # Answer one turn of a session. on_delta, if given, is awaited with each piece of text and the
+    # id of its message as the run streams it; the last message is the answer. turn_id, if given,
+    # identifies the turn across client retries, so a retried turn doesn't process its
+    # transactions twice.
+    async def chat(self, session_id, user_input, on_delta=None, turn_id=None):
+        session = self.get_session(session_id)
+        async with session.lock, self._turn_slots:
+            session.turns += 1
+            session.last_active = time.time()
+            try:
+                with span("turn", session=session_id) as turn_span, \
+                        turn_scope(turn_id or f"{session.conversation_id}:{session.turns}"):
+                    await self._ensure_thread(session)
+
+                    # Answer a near-identical knowledge question from the response cache. Only the
+                    # opening question of a conversation is looked up or stored: later ones may
+                    # refer to earlier turns, which the cached answer knows nothing about.
+                    cacheable = self.response_cache is not None and session.memory.turn_count == 0
+                    if cacheable:
+                        query_embedding = await (self.embeddings or get_embeddings()).aembed_query(user_input)
+                        cached_response = self.response_cache.lookup(query_embedding)
+                        if cached_response is not None:
+                            await self._record_exchange(session, user_input, cached_response)
+                            return cached_response
+
+                    # Retrieve relevant documents
+                    relevant_docs = await self.retrieve(user_input)
+                    combined_context = pack_context(relevant_docs)
+
+                    # Add the user's message to the thread; the context only goes with this turn's run
+                    with span("messages.create"):
+                        await self.client.beta.threads.messages.create(
+                            thread_id=session.thread_id,
+                            role="user",
+                            content=user_input
+                        )
+                    run_options = {}
+                    instructions = context_instructions(combined_context)
+                    if instructions:
+                        run_options["additional_instructions"] = instructions
+
+                    # Run the assistant and wait for it to complete or fail with a timeout
+                    tool_use = AsyncToolUseTracker(self._handle_tool_calls)
+                    status, messages = await aexecute_run(
+                        self.client, session.thread_id, self.assistant_id, tool_use, on_delta=on_delta, **run_options
+                    )
+                    turn_span.set(status=status, tools_used=tool_use.used)
+                    if status != "completed":
+                        return "I'm sorry, but I encountered an error while processing your request. Please try again."
+
+                    if messages is None:
+                        with span("messages.list"):
+                            messages = (await self.client.beta.threads.messages.list(thread_id=session.thread_id)).data
+                    response = extract_response(messages)
+
+                    # Keep the history within its token budget
+                    session.memory.add_turn(user_input, response)
+                    if session.memory.needs_compaction():
+                        await self._compact_thread(session)
+                    turn_span.set(history_tokens=session.memory.window_tokens, compactions=session.memory.compactions)
+
+                    # Only answers drawn from the knowledge base, with no tools, can be reused
+                    if cacheable and combined_context and not tool_use.used:
+                        self.response_cache.store(query_embedding, user_input, response)
+                    return response
+
+            except TimeoutError as e:
+                return str(e)
+            except Exception as e:
+                return f"An error occurred: {str(e)}. Please try again."
+
+    async def close(self):
+        await async_http_client.close()
+        await self.client.close()
+
@@ -0,0 +1,271 @@
+# Offline batch mode for large jobs (re-answering FAQ sets, checking retrieval quality) instead
+# of one blocking chat_with_assistant run per question:
+# 1. retrieval for every question at once: one lexical pass, batched embedding requests and the
+#    pgvector searches spread over the connection pool
+# 2. generation, either
+#    - "batch": one OpenAI Batch API job of chat completions (the assistant's model and
+#      instructions plus the packed context; half the price, no tools, done within the window)
+#    - "async": every question as its own conversation on the asyncio chat engine (the
+#      assistant with its tools, except that transactions are only dry-run),
+#      MAX_CONCURRENT_TURNS at a time
+#    - "none": retrieval only
+# 3. one JSONL result per question, in input order
+#
+# Input is JSONL; the question is "query" (or "question", or "title" and "body" as in
+# requests.jsonl), the id is "id" (or "request_id", else the line number) and ids must be unique.
+# Lines with "expected_sources" are scored: hit when one of them is retrieved, and the reciprocal
+# rank.
+#
+# Usage: python batch_eval.py faq.jsonl --output answers.jsonl --generation batch
+#        python batch_eval.py faq.jsonl --output retrieval.jsonl --generation none
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from lifecycle import get_openai
+from tracing import span
+
+# Load environment variables
+load_dotenv()
+
+BATCH_MODEL = os.getenv("BATCH_MODEL", "")
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+# Seconds between status checks of a Batch API job
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "30"))
+BATCH_MAX_TOKENS = int(os.getenv("BATCH_MAX_TOKENS", "800"))
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+# Answers the chat engines give when a turn failed
+FAILED_PREFIXES = ("An error occurred", "I'm sorry, but I encountered an error", "The request timed out")
+
+
+def load_queries(path):
+    queries = []
+    with open(path) as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get("query") or record.get("question")
+            if not text:
+                text = "\n\n".join(part for part in (record.get("title"), record.get("body")) if part)
+            queries.append({
+                "id": str(record.get("id") or record.get("request_id") or number),
+                "query": text,
+                "expected_sources": record.get("expected_sources"),
+            })
+    return queries
+
+
+def _sources(relevant_docs):
+    return [doc.metadata.get("source", "") for doc, _ in relevant_docs]
+
+
+# Hit and reciprocal rank of the first retrieved chunk from an expected source
+def score_retrieval(relevant_docs, expected_sources):
+    expected = {Path(source).name for source in expected_sources}
+    for rank, source in enumerate(_sources(relevant_docs), start=1):
+        if Path(source).name in expected:
+            return {"hit": True, "reciprocal_rank": 1.0 / rank}
+    return {"hit": False, "reciprocal_rank": 0.0}
+
+
+def retrieve_all(queries):
+    from retrieval import get_relevant_documents_batch
+    return get_relevant_documents_batch([query["query"] for query in queries])
+
+
+# One Batch API request line: a chat completion with the assistant's instructions and the context
+def batch_request(query, context, model):
+    from assistant_config import ASSISTANT_INSTRUCTIONS
+    from retrieval import context_instructions
+    system = ASSISTANT_INSTRUCTIONS.strip()
+    instructions = context_instructions(context)
+    if instructions:
+        system += "\n\n" + instructions
+    return {
+        "custom_id": query["id"],
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": model,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": query["query"]}],
+            "max_tokens": BATCH_MAX_TOKENS,
+        },
+    }
+
+
+# Upload the requests, start the job and wait for it. Returns {custom_id: (answer, error)}.
+def run_batch_job(client, requests, poll_seconds=BATCH_POLL_SECONDS, completion_window=BATCH_COMPLETION_WINDOW):
+    data = "".join(json.dumps(request) + "\n" for request in requests).encode()
+    with span("batch.upload", requests=len(requests), bytes=len(data)):
+        input_file = client.files.create(file=("batch_eval.jsonl", io.BytesIO(data)), purpose="batch")
+    with span("batch.create"):
+        batch = client.batches.create(
+            input_file_id=input_file.id, endpoint="/v1/chat/completions", completion_window=completion_window
+        )
+    print(f"Batch {batch.id} submitted with {len(requests)} requests")
+    with span("batch.wait") as wait_span:
+        while batch.status not in BATCH_TERMINAL_STATUSES:
+            time.sleep(poll_seconds)
+            batch = client.batches.retrieve(batch.id)
+            wait_span.add("polls")
+        wait_span.set(status=batch.status)
+
+    answers = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        with span("batch.download"):
+            content = client.files.content(file_id).text
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                error = record.get("error") or response.get("body", {}).get("error")
+                answers[record["custom_id"]] = (None, str(error))
+            else:
+                answers[record["custom_id"]] = (response["body"]["choices"][0]["message"]["content"], None)
+    # Requests the job never got to (failed, expired or cancelled batch)
+    for request in requests:
+        answers.setdefault(request["custom_id"], (None, f"batch {batch.status}"))
+    return answers
+
+
+# Each question as a new conversation on the asyncio engine, reusing the retrieval done above.
+# Side-effecting tools are not run: an evaluation must not write to the ledger.
+# Returns {id: (answer, error)}.
+async def run_async_fanout(queries, retrieved, max_concurrency=None):
+    from async_engine import MAX_CONCURRENT_TURNS, AsyncChatEngine
+    by_text = {query["query"]: docs for query, docs in zip(queries, retrieved)}
+
+    async def retrieve(query_text):
+        return by_text.get(query_text, [])
+
+    engine = AsyncChatEngine(
+        max_concurrency=max_concurrency or MAX_CONCURRENT_TURNS, retrieve=retrieve, allow_side_effects=False
+    )
+
+    async def answer(query):
+        session_id = f"batch-{query['id']}"
+        response = await engine.chat(session_id, query["query"])
+        engine.end_session(session_id)
+        if response.startswith(FAILED_PREFIXES):
+            return query["id"], (None, response)
+        return query["id"], (response, None)
+
+    try:
+        await engine.start()
+        return dict(await asyncio.gather(*(answer(query) for query in queries)))
+    finally:
+        await engine.close()
+
+
+# Ids key the Batch API custom_ids and the answers, so a repeated id would mix up results
+def check_ids(queries):
+    seen = set()
+    duplicates = set()
+    for query in queries:
+        if query["id"] in seen:
+            duplicates.add(query["id"])
+        seen.add(query["id"])
+    if duplicates:
+        raise ValueError(f"Duplicate question ids: {', '.join(sorted(duplicates))}")
+
+
+def evaluate(queries, generation="batch", model=None, poll_seconds=BATCH_POLL_SECONDS, max_concurrency=None):
+    from assistant_config import ASSISTANT_MODEL
+    from retrieval import pack_context
+
+    check_ids(queries)
+
+    timings = {}
+    start = time.perf_counter()
+    retrieved = retrieve_all(queries)
+    timings["retrieval_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    answers = {}
+    with span("batch.generation", mode=generation, queries=len(queries)):
+        if generation == "batch":
+            requests = [
+                batch_request(query, pack_context(docs), model or BATCH_MODEL or ASSISTANT_MODEL)
+                for query, docs in zip(queries, retrieved)
+            ]
+            answers = run_batch_job(get_openai(), requests, poll_seconds)
+        elif generation == "async":
+            answers = asyncio.run(run_async_fanout(queries, retrieved, max_concurrency))
+    timings["generation_seconds"] = time.perf_counter() - start
+
+    results = []
+    for query, docs in zip(queries, retrieved):
+        answer, error = answers.get(query["id"], (None, None))
+        result = {
+            "id": query["id"],
+            "query": query["query"],
+            "sources": _sources(docs),
+            "scores": [round(score, 4) for _, score in docs],
+        }
+        if generation != "none":
+            result["answer"] = answer
+            result["error"] = error
+        if query["expected_sources"]:
+            result.update(score_retrieval(docs, query["expected_sources"]))
+        results.append(result)
+    return results, timings
+
+
+def write_results(path, results):
+    with open(path, "w") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+
+
+def summarize(results, timings):
+    print(f"{len(results)} questions: retrieval {timings['retrieval_seconds']:.2f}s, "
+          f"generation {timings['generation_seconds']:.2f}s")
+    failed = sum(1 for result in results if result.get("error"))
+    if any("answer" in result for result in results):
+        print(f"answered {len(results) - failed}, failed {failed}")
+    scored = [result for result in results if "hit" in result]
+    if scored:
+        hit_rate = sum(result["hit"] for result in scored) / len(scored)
+        mrr = sum(result["reciprocal_rank"] for result in scored) / len(scored)
+        print(f"retrieval over {len(scored)} labelled questions: hit rate {hit_rate:.2%}, MRR {mrr:.3f}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer or evaluate a JSONL of questions in bulk")
+    parser.add_argument("queries", help="JSONL of questions")
+    parser.add_argument("--output", required=True, help="JSONL of results, one per question")
+    parser.add_argument("--generation", choices=["batch", "async", "none"], default="batch")
+    parser.add_argument("--model", help="Model of the Batch API requests (default BATCH_MODEL or the assistant's)")
+    parser.add_argument("--poll-seconds", type=float, default=BATCH_POLL_SECONDS)
+    parser.add_argument("--max-concurrency", type=int, help="Conversations in flight with --generation async")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    try:
+        check_ids(queries)
+    except ValueError as e:
+        parser.error(f"{args.queries}: {e}")
+    results, timings = evaluate(queries, args.generation, args.model, args.poll_seconds, args.max_concurrency)
+    write_results(args.output, results)
+    failed = summarize(results, timings)
+    print(f"Wrote {args.output}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Multiplex many concurrent conversations through the asyncio chat engine against the
+# local stand-in Assistants server, with retrieval replaced by a fixed-latency stand-in.
+#
+# Usage: python -m benchmarks.bench_async_engine --sessions 200 --turns 3
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import openai
+
+from async_engine import AsyncChatEngine
+from benchmarks.bench_run_loop import percentile
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def make_retriever(latency):
+    async def retrieve(query_text):
+        await asyncio.sleep(latency)
+        return []
+    return retrieve
+
+
+async def run_session(engine, session_id, turns, latencies):
+    for turn in range(turns):
+        start = time.perf_counter()
+        response = await engine.chat(session_id, f"Question {turn} from {session_id}")
+        latencies.append(time.perf_counter() - start)
+        if response.startswith("An error occurred"):
+            raise RuntimeError(response)
+
+
+async def run(args, server):
+    client = openai.AsyncOpenAI(base_url=server.base_url, api_key="bench", max_retries=0)
+    engine = AsyncChatEngine(
+        client=client,
+        assistant_id="asst_bench",
+        max_concurrency=args.max_concurrency,
+        retrieve=make_retriever(args.retrieval_latency),
+    )
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(engine, f"session-{i}", args.turns, latencies) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    await client.close()
+
+    total = args.sessions * args.turns
+    print(f"{total} turns across {args.sessions} sessions in {elapsed:.2f}s ({total / elapsed:.1f} turns/s)")
+    print(f"turn latency: mean {statistics.mean(latencies):.3f}s, p50 {percentile(latencies, 50):.3f}s, "
+          f"p95 {percentile(latencies, 95):.3f}s, p99 {percentile(latencies, 99):.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent sessions through the asyncio chat engine")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--max-concurrency", type=int, default=100)
+    parser.add_argument("--think-time", type=float, default=0.3)
+    parser.add_argument("--retrieval-latency", type=float, default=0.05)
+    parser.add_argument("--tool-calls", type=int, default=0, help="Tool calls per run (get_travel_advisory)")
+    args = parser.parse_args()
+
+    tool_calls = [("get_travel_advisory", {"city": "Paris", "country": "France"})] * args.tool_calls
+    with FakeOpenAIServer(think_time=args.think_time, tool_calls=tool_calls) as server:
+        asyncio.run(run(args, server))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# batch_eval.py against the local stand-ins, next to the interactive loop it replaces: the same
+# questions answered one main.chat_with_assistant turn at a time, as one Batch API job,
+# and as an async fan-out on the chat engine. Reports wall time, OpenAI requests and embedding
+# requests per mode, and checks every question got an answer.
+#
+# Retrieval runs against a throwaway pgvector cluster seeded with the replay corpus, or with
+# --pgvector off against a stand-in: per-question embedding plus --retrieval-latency for the
+# interactive loop, one batched embedding plus the latency once per pool-wide round of searches
+# for batch_eval.
+#
+# Usage: python -m benchmarks.bench_batch_eval --questions 200 --pgvector off
+
+import argparse
+import asyncio
+import math
+import os
+import tempfile
+import time
+
+from benchmarks.bench_replay import CORPUS, configure_environment
+from benchmarks.ephemeral_pgvector import EphemeralPgvector
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_openweather import FakeOpenWeatherServer
+
+TOPICS = ["business visa", "visa processing time", "wire transfer investments", "future dated transactions",
+          "travel insurance", "investment confirmations", "ACH payments", "expedited visas"]
+
+
+# Each mode gets its own wording, so none of them is served from the embedding cache
+def make_queries(count, mode):
+    return [
+        {"id": f"q{i}", "query": f"Question {i} ({mode}): what should I know about {TOPICS[i % len(TOPICS)]}?",
+         "expected_sources": ["bench"]}
+        for i in range(count)
+    ]
+
+
+# Embeddings requested the way OpenAIEmbeddings does with its tiktoken encoding (a list of up to
+# chunk_size texts per request). OpenAIEmbeddings itself needs the encoding downloaded for that
+# and falls back to one request per text without it, which would hide the batching here.
+class ListInputEmbeddings:
+    def __init__(self, model="text-embedding-ada-002", chunk_size=1000):
+        import openai
+        self.client = openai.OpenAI()
+        self.model = model
+        self.chunk_size = chunk_size
+
+    def embed_documents(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.chunk_size):
+            response = self.client.embeddings.create(model=self.model, input=texts[start:start + self.chunk_size])
+            vectors += [item.embedding for item in response.data]
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def use_offline_embeddings():
+    import lifecycle
+    from embedding_cache import CachedEmbeddings
+    lifecycle._embeddings = CachedEmbeddings(ListInputEmbeddings())
+
+
+def stand_in_retrieval(latency):
+    from lifecycle import PGVECTOR_POOL_SIZE, get_embeddings
+
+    async def get_relevant_documents(query_text, filter=None, collections=None):
+        get_embeddings().embed_query(query_text)
+        await asyncio.sleep(latency)
+        return []
+
+    def retrieve_all(queries):
+        get_embeddings().embed_documents([query["query"] for query in queries])
+        time.sleep(latency * math.ceil(len(queries) / PGVECTOR_POOL_SIZE))
+        return [[] for _ in queries]
+
+    return get_relevant_documents, retrieve_all
+
+
+def measure(openai_server, func):
+    before = openai_server.counters()
+    start = time.perf_counter()
+    answered = func()
+    seconds = time.perf_counter() - start
+    after = openai_server.counters()
+    embedding_requests = after["routes"].get("embeddings", 0) - before["routes"].get("embeddings", 0)
+    return {"seconds": seconds, "answered": answered, "requests": after["requests"] - before["requests"],
+            "embedding_requests": embedding_requests}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="batch_eval.py against the interactive loop")
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--think-time", type=float, default=0.05,
+                        help="Seconds the stand-in model takes per run step, and per batch job")
+    parser.add_argument("--pgvector", choices=["ephemeral", "off"], default="ephemeral")
+    parser.add_argument("--database-url", help="Use this pgvector database instead of starting one")
+    parser.add_argument("--retrieval-latency", type=float, default=0.02, help="Stand-in search time with --pgvector off")
+    parser.add_argument("--skip-interactive", action="store_true", help="Don't run the one-at-a-time baseline")
+    args = parser.parse_args()
+    args.run_mode = "stream"
+    args.trace_path = ""
+
+    database = None
+    with FakeOpenAIServer(think_time=args.think_time) as openai_server, FakeOpenWeatherServer() as weather_server, \
+            tempfile.TemporaryDirectory() as workdir:
+        try:
+            connection_string = args.database_url
+            if args.pgvector == "ephemeral" and not connection_string:
+                database = EphemeralPgvector().start()
+                connection_string = database.connection_string
+            configure_environment(args, openai_server, weather_server, workdir, connection_string)
+            os.environ["BATCH_POLL_SECONDS"] = str(args.think_time / 5)
+
+            import batch_eval
+            import main as interactive
+            use_offline_embeddings()
+            if args.pgvector == "ephemeral":
+                from lifecycle import get_vector_store
+                get_vector_store().add_texts(CORPUS, metadatas=[{"source": "bench", "start_index": 0} for _ in CORPUS])
+            else:
+                interactive.retrieve, batch_eval.retrieve_all = stand_in_retrieval(args.retrieval_latency)
+
+            results = {}
+            if not args.skip_interactive:
+                def one_at_a_time():
+                    answered = 0
+                    for query in make_queries(args.questions, "interactive"):
+                        interactive.new_conversation()
+                        answered += not interactive.chat_with_assistant(query["query"]).startswith(batch_eval.FAILED_PREFIXES)
+                    return answered
+                results["interactive"] = measure(openai_server, one_at_a_time)
+
+            for mode in ("batch", "async"):
+                def run_mode():
+                    answers, _ = batch_eval.evaluate(make_queries(args.questions, mode), mode, poll_seconds=args.think_time / 5)
+                    return sum(1 for answer in answers if answer["answer"] and not answer["error"])
+                results[mode] = measure(openai_server, run_mode)
+        finally:
+            if database is not None:
+                database.stop()
+
+    print(f"{'mode':<14}{'questions':>10}{'answered':>10}{'seconds':>10}{'q/s':>9}{'requests':>10}{'embed reqs':>12}")
+    for mode, result in results.items():
+        print(f"{mode:<14}{args.questions:>10}{result['answered']:>10}{result['seconds']:>10.2f}"
+              f"{args.questions / result['seconds']:>9.1f}{result['requests']:>10}{result['embedding_requests']:>12}")
+
+
+if __name__ == "__main__":
+    main()
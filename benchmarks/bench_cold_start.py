@@ -0,0 +1,182 @@
+# Import time and cold start of the entry points, each measured in a fresh interpreter:
+# - import: median time to import the module, and the requests it sent while importing (should
+#   be none: clients, the assistant, threads and the agent are built on first use or by --prewarm)
+# - first turn: time to answer the first question in a new process, cold and after prewarm(),
+#   against the local OpenAI stand-in (retrieval is replaced by an empty stand-in for main.py,
+#   since it needs Postgres)
+# Exits 1 when an import or a cold first turn is over its budget, or an import sent requests.
+#
+# Usage: python -m benchmarks.bench_cold_start --repeat 5 --import-budget-ms 750
+#        python -m benchmarks.bench_cold_start --importtime 15   (slowest imports per entry point)
+
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Kept free of heavy imports: this module is also the child process being timed
+ENTRY_POINTS = ["main", "main-using-langchain", "async_engine", "chat_server"]
+FIRST_TURN_ENTRY_POINTS = ["main", "main-using-langchain"]
+QUESTION = "What documents do I need for a business visa?"
+
+
+def _child_import(name):
+    start = time.perf_counter()
+    importlib.import_module(name)
+    return {"import_seconds": time.perf_counter() - start}
+
+
+def _child_first_turn(name, prewarmed):
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    result = {"import_seconds": time.perf_counter() - start}
+
+    if name == "main":
+        async def no_documents(query_text):
+            return []
+        module.retrieve = no_documents
+        chat = module.chat_with_assistant
+    else:
+        chat = module.chat_with_agent
+
+    if prewarmed:
+        from prewarm import prewarm
+        start = time.perf_counter()
+        prewarm(assistant=name == "main", retrieval=False, verbose=False)
+        if name == "main":
+            module.ensure_conversation()
+        else:
+            module.get_agent_executor()
+        result["prewarm_seconds"] = time.perf_counter() - start
+
+    for key in ("first_turn_seconds", "second_turn_seconds"):
+        start = time.perf_counter()
+        response = chat(QUESTION)
+        result[key] = time.perf_counter() - start
+        if response.startswith(("An error occurred", "I'm sorry")):
+            raise RuntimeError(response)
+    return result
+
+
+def run_child(args, env):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_cold_start", "--child", *args],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    # The last line is the result; anything before it is the entry point's own output
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def child_environment(openai_server, weather_server, workdir):
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": openai_server.base_url,
+        "OPENAI_API_BASE": openai_server.base_url,
+        "OPENWEATHER_API_KEY": "bench",
+        "OPENWEATHER_BASE_URL": weather_server.base_url,
+        "ASSISTANT_CACHE_PATH": os.path.join(workdir, "assistant_cache.json"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "LEDGER_PATH": os.path.join(workdir, "transactions.sqlite3"),
+        "TRACE_PATH": "",
+        "METRICS_PORT": "0",
+        "AGENT_VERBOSE": "false",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+
+# Slowest imports (cumulative) of one entry point, from python -X importtime
+def slowest_imports(name, env, top):
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import importlib; importlib.import_module({name!r})"],
+        env=env, capture_output=True, text=True, check=True,
+    ).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        entries.append((int(cumulative), module.rstrip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and cold start of the entry points")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per import measurement")
+    parser.add_argument("--import-budget-ms", type=float, default=750.0, help="Budget for the median import")
+    parser.add_argument("--first-turn-budget-ms", type=float, default=3000.0,
+                        help="Budget for the cold first turn (import not included)")
+    parser.add_argument("--think-time", type=float, default=0.05, help="Seconds the stand-in model takes per run step")
+    parser.add_argument("--importtime", type=int, default=0, help="Also list this many slowest imports per entry point")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, name = args.child[0], args.child[1]
+        result = _child_import(name) if mode == "import" else _child_first_turn(name, mode == "prewarmed")
+        print(json.dumps(result))
+        return
+
+    from benchmarks.fake_openai import FakeOpenAIServer
+    from benchmarks.fake_openweather import FakeOpenWeatherServer
+
+    results = {}
+    failures = []
+    with FakeOpenAIServer(think_time=args.think_time) as openai_server, FakeOpenWeatherServer() as weather_server, \
+            tempfile.TemporaryDirectory() as workdir:
+        env = child_environment(openai_server, weather_server, workdir)
+
+        print(f"{'entry point':<24}{'import p50 ms':>15}{'min ms':>9}{'max ms':>9}{'requests':>10}")
+        for name in ENTRY_POINTS:
+            before = openai_server.request_count + weather_server.request_count
+            imports = [run_child(["import", name], env)["import_seconds"] * 1000 for _ in range(args.repeat)]
+            requests = openai_server.request_count + weather_server.request_count - before
+            median = statistics.median(imports)
+            results[name] = {"import_ms": median, "import_min_ms": min(imports), "import_max_ms": max(imports),
+                             "import_requests": requests}
+            print(f"{name:<24}{median:>15.1f}{min(imports):>9.1f}{max(imports):>9.1f}{requests:>10}")
+            if median > args.import_budget_ms:
+                failures.append(f"{name}: import {median:.1f} ms over the {args.import_budget_ms:.0f} ms budget")
+            if requests:
+                failures.append(f"{name}: {requests} requests sent while importing")
+
+        print()
+        print(f"{'entry point':<24}{'mode':<11}{'prewarm ms':>12}{'first turn ms':>15}{'second turn ms':>16}")
+        for name in FIRST_TURN_ENTRY_POINTS:
+            for mode in ("cold", "prewarmed"):
+                result = run_child([mode, name], env)
+                prewarm_ms = result.get("prewarm_seconds", 0.0) * 1000
+                first_ms = result["first_turn_seconds"] * 1000
+                second_ms = result["second_turn_seconds"] * 1000
+                results[name][mode] = {"prewarm_ms": prewarm_ms, "first_turn_ms": first_ms, "second_turn_ms": second_ms}
+                print(f"{name:<24}{mode:<11}{prewarm_ms:>12.1f}{first_ms:>15.1f}{second_ms:>16.1f}")
+                if mode == "cold" and first_ms > args.first_turn_budget_ms:
+                    failures.append(f"{name}: cold first turn {first_ms:.1f} ms over the "
+                                    f"{args.first_turn_budget_ms:.0f} ms budget")
+
+        if args.importtime:
+            for name in ENTRY_POINTS:
+                print(f"\nSlowest imports of {name} (cumulative ms)")
+                for cumulative, module in slowest_imports(name, env, args.importtime):
+                    print(f"{cumulative / 1000:>10.1f}  {module}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    for failure in failures:
+        print(f"OVER BUDGET {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"\nAll imports within {args.import_budget_ms:.0f} ms and cold first turns within "
+          f"{args.first_turn_budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
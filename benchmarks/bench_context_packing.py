@@ -0,0 +1,71 @@
+# Prompt tokens added per turn by the retrieved context: the old repr of six (Document, score)
+# tuples against pack_context. Retrieval results are simulated from synthetic documents split
+# the same way ingestion splits them, with neighbouring chunks scoring alike as they do in
+# practice.
+#
+# Usage: python -m benchmarks.bench_context_packing --queries 200
+
+import argparse
+import random
+import statistics
+import time
+
+from langchain_core.documents import Document
+
+from benchmarks.bench_ingest_pipeline import WORDS
+from document_loading import text_splitter
+from retrieval import pack_context
+from tokens import count_tokens
+
+
+def old_format_context(relevant_docs):
+    return "\n\n".join([f"Relevant information: {doc}" for doc in relevant_docs])
+
+
+def make_chunks(files, seed):
+    rng = random.Random(seed)
+    documents = [
+        Document(
+            page_content="\n\n".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))
+                                     for _ in range(20)),
+            metadata={"source": f"docs/file-{i}.pdf"},
+        )
+        for i in range(files)
+    ]
+    return text_splitter().split_documents(documents)
+
+
+# A hit region in one or two files, plus a few weak matches elsewhere
+def simulate_results(chunks, rng, k=6):
+    center = rng.randrange(len(chunks) - 4)
+    results = [(chunks[center + i], rng.uniform(0.78, 0.9)) for i in range(rng.randint(2, 4))]
+    while len(results) < k:
+        results.append((rng.choice(chunks), rng.uniform(0.6, 0.8)))
+    return sorted(results, key=lambda result: result[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Context tokens per turn before and after packing")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--files", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    chunks = make_chunks(args.files, seed=0)
+    queries = [simulate_results(chunks, rng) for _ in range(args.queries)]
+
+    rows = []
+    for name, build in (("Document reprs (before)", old_format_context), ("pack_context", pack_context)):
+        start = time.perf_counter()
+        contexts = [build(results) for results in queries]
+        elapsed = (time.perf_counter() - start) / len(queries)
+        tokens = [count_tokens(context) for context in contexts]
+        rows.append((name, statistics.mean(tokens), max(tokens), elapsed * 1000))
+
+    print(f"{'context':<26}{'mean tokens':>13}{'max tokens':>12}{'ms/turn':>10}")
+    for name, mean_tokens, max_tokens, ms in rows:
+        print(f"{name:<26}{mean_tokens:>13.1f}{max_tokens:>12}{ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
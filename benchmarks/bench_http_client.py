@@ -0,0 +1,69 @@
+# Exercise the shared HTTP client against a local stand-in OpenWeather server:
+# pooled vs bare requests.get latency, retries on injected 503s and the circuit breaker.
+#
+# Usage: python -m benchmarks.bench_http_client --requests 200
+
+import argparse
+import statistics
+import time
+
+import requests
+
+from benchmarks.fake_openweather import FakeOpenWeatherServer
+from http_client import CircuitOpenError, HttpClient
+
+
+def timed_calls(get, url, count):
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        response = get(url, params={"q": "Paris", "limit": 1})
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared HTTP client benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    with FakeOpenWeatherServer() as server:
+        url = f"{server.base_url}/geo/1.0/direct"
+
+        print(f"{'client':<10}{'requests':>10}{'mean ms':>10}{'connections':>13}")
+        before = server.connection_count
+        latencies = timed_calls(requests.get, url, args.requests)
+        print(f"{'bare':<10}{args.requests:>10}{statistics.mean(latencies) * 1000:>10.2f}{server.connection_count - before:>13}")
+
+        client = HttpClient(backoff_base=0.01, failure_threshold=3, reset_timeout=0.5)
+        before = server.connection_count
+        latencies = timed_calls(client.get, url, args.requests)
+        print(f"{'pooled':<10}{args.requests:>10}{statistics.mean(latencies) * 1000:>10.2f}{server.connection_count - before:>13}")
+
+        # Two injected 503s are absorbed by retries
+        server.fail_next = 2
+        response = client.get(url, params={"q": "Paris"})
+        print(f"\nretries: status {response.status_code} after 2 injected failures")
+
+        # Keep failing until the circuit opens, then recover after reset_timeout
+        server.fail_next = 1000
+        attempts = 0
+        try:
+            while True:
+                client.get(url, params={"q": "Paris"})
+                attempts += 1
+        except CircuitOpenError as e:
+            print(f"circuit:  opened after {attempts} failed calls ({e})")
+        server.fail_next = 0
+        time.sleep(0.6)
+        response = client.get(url, params={"q": "Paris"})
+        print(f"circuit:  half-open trial returned {response.status_code}, state now {client.stats()[url.split('//')[1]]['circuit']}")
+
+        print("\nper-endpoint stats:")
+        for endpoint, stats in client.stats().items():
+            print(f"  {endpoint}: {stats['calls']} calls, {stats['errors']} errors, {stats['latency_sum']:.3f}s total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# Ingestion throughput in chunks/sec: the old single PGVector.from_documents pass against the
+# streaming pipeline. Embedding runs on a fake local backend with per-request and per-token
+# latency, and rows go to an in-memory store with per-insert latency, so no API key or
+# database is needed.
+#
+# Usage: python -m benchmarks.bench_ingest_pipeline --files 200 --workers 4
+
+import argparse
+import random
+import threading
+import time
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+import ingest_pipeline
+from document_loading import text_splitter
+from ingest_pipeline import IngestPipeline
+from tokens import count_tokens
+
+WORDS = "travel weather advisory investment wire transfer payment policy refund booking city country".split()
+
+
+class FakeEmbeddingBackend(Embeddings):
+    def __init__(self, request_latency, token_latency, max_inputs=2048, size=1536):
+        self.request_latency = request_latency
+        self.token_latency = token_latency
+        self.max_inputs = max_inputs
+        self.vectors = DeterministicFakeEmbedding(size=size)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _request(self, texts):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.request_latency + self.token_latency * sum(count_tokens(text) for text in texts))
+        return self.vectors.embed_documents(texts)
+
+    # Like OpenAIEmbeddings: one request after another, max_inputs texts each
+    def embed_documents(self, texts):
+        vectors = []
+        for i in range(0, len(texts), self.max_inputs):
+            vectors.extend(self._request(texts[i:i + self.max_inputs]))
+        return vectors
+
+    def embed_query(self, text):
+        return self._request([text])[0]
+
+
+class FakeVectorStore:
+    def __init__(self, insert_latency, row_latency):
+        self.insert_latency = insert_latency
+        self.row_latency = row_latency
+        self.rows = 0
+        self.inserts = 0
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        time.sleep(self.insert_latency + self.row_latency * len(texts))
+        self.rows += len(texts)
+        self.inserts += 1
+
+
+def make_files(count, pages, seed=0):
+    rng = random.Random(seed)
+    files = []
+    for i in range(count):
+        text = "\n\n".join(
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(150, 400))) for _ in range(pages)
+        )
+        files.append([Document(page_content=text, metadata={"source": f"docs/file-{i}.pdf"})])
+    return files
+
+
+# Everything in memory, one embed_documents call, one insert: what from_documents does
+def run_single_pass(files, embeddings, store):
+    start = time.perf_counter()
+    chunks = text_splitter().split_documents([doc for documents in files for doc in documents])
+    vectors = embeddings.embed_documents([chunk.page_content for chunk in chunks])
+    store.add_embeddings([chunk.page_content for chunk in chunks], vectors, [chunk.metadata for chunk in chunks])
+    return len(chunks), time.perf_counter() - start
+
+
+def run_pipeline(files, embeddings, store, workers, tokens_per_minute):
+    pipeline = IngestPipeline(
+        embeddings=embeddings,
+        vector_store=store,
+        split=text_splitter().split_documents,
+        workers=workers,
+        tokens_per_minute=tokens_per_minute,
+    )
+    stats = pipeline.run(iter(files))
+    return stats["rows"], stats["seconds"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion throughput with a fake embedding backend")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--request-latency", type=float, default=0.15)
+    parser.add_argument("--token-latency", type=float, default=0.000005)
+    parser.add_argument("--insert-latency", type=float, default=0.02)
+    parser.add_argument("--row-latency", type=float, default=0.0001)
+    parser.add_argument("--tokens-per-minute", type=int, default=0,
+                        help="Pace the pipeline to this budget (0 = unpaced)")
+    args = parser.parse_args()
+
+    files = make_files(args.files, args.pages)
+
+    def backend():
+        return FakeEmbeddingBackend(args.request_latency, args.token_latency)
+
+    def store():
+        return FakeVectorStore(args.insert_latency, args.row_latency)
+
+    single_embeddings, single_store = backend(), store()
+    chunks, single_seconds = run_single_pass(files, single_embeddings, single_store)
+
+    pipeline_embeddings, pipeline_store = backend(), store()
+    rows, pipeline_seconds = run_pipeline(files, pipeline_embeddings, pipeline_store, args.workers,
+                                          args.tokens_per_minute)
+    assert rows == chunks, (rows, chunks)
+
+    print(f"{chunks} chunks from {args.files} files, token budget per request "
+          f"{ingest_pipeline.EMBED_BATCH_TOKENS}, {args.workers} embedding workers")
+    print(f"{'mode':<28}{'seconds':>10}{'chunks/sec':>12}{'requests':>10}{'inserts':>9}")
+    print(f"{'from_documents (before)':<28}{single_seconds:>10.2f}{chunks / single_seconds:>12.1f}"
+          f"{single_embeddings.requests:>10}{single_store.inserts:>9}")
+    print(f"{'streaming pipeline':<28}{pipeline_seconds:>10.2f}{rows / pipeline_seconds:>12.1f}"
+          f"{pipeline_embeddings.requests:>10}{pipeline_store.inserts:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Startup and per-query setup cost before and after the lifecycle layer.
+# Assistant lookup runs against the local stand-in server; the vector store part only runs
+# when PGVECTOR_CONNECTION_STRING points at a database.
+#
+# Usage: python -m benchmarks.bench_lifecycle --starts 20 --queries 20
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import openai
+from langchain_openai import OpenAIEmbeddings
+from langchain_postgres.vectorstores import PGVector
+
+import lifecycle
+from assistant_config import assistant_definition
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def timed(func, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return statistics.mean(latencies) * 1000
+
+
+def bench_assistant(starts):
+    with FakeOpenAIServer() as server, tempfile.TemporaryDirectory() as tmp:
+        client = openai.OpenAI(base_url=server.base_url, api_key="bench", max_retries=0)
+        lifecycle.ASSISTANT_CACHE_PATH = os.path.join(tmp, "assistant_cache.json")
+
+        create_ms = timed(lambda: client.beta.assistants.create(**assistant_definition()), starts)
+        created = len(server.assistants)
+
+        # No local cache: the assistant is found by name and definition hash
+        def lookup():
+            lifecycle.forget_assistant(client)
+            lifecycle.get_or_create_assistant(client)
+        lookup_ms = timed(lookup, starts)
+
+        # Local id cache: every start is a new process, which confirms the cached id with one
+        # retrieve before trusting it
+        def cached():
+            lifecycle._validated_assistants.clear()
+            lifecycle.get_or_create_assistant(client)
+        cached_ms = timed(cached, starts)
+
+        print(f"{'assistant at startup':<34}{'mean ms':>10}{'assistants left behind':>24}")
+        print(f"{'create every start (before)':<34}{create_ms:>10.2f}{created:>24}")
+        print(f"{'lookup by name and hash':<34}{lookup_ms:>10.2f}{len(server.assistants) - created:>24}")
+        print(f"{'local id cache':<34}{cached_ms:>10.2f}{0:>24}")
+
+
+def bench_vector_store(queries):
+    connection = os.getenv("PGVECTOR_CONNECTION_STRING")
+    if not connection:
+        print("\nPGVECTOR_CONNECTION_STRING not set, skipping vector store setup")
+        return
+
+    def build_per_query():
+        PGVector(embeddings=OpenAIEmbeddings(), connection=connection, collection_name=lifecycle.COLLECTION_NAME)
+
+    before_ms = timed(build_per_query, queries)
+    lifecycle.get_vector_store()
+    after_ms = timed(lifecycle.get_vector_store, queries)
+    print(f"\n{'vector store setup per query':<34}{'mean ms':>10}")
+    print(f"{'new store per query (before)':<34}{before_ms:>10.2f}")
+    print(f"{'shared store and pool':<34}{after_ms:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assistant and vector store setup cost")
+    parser.add_argument("--starts", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    bench_assistant(args.starts)
+    bench_vector_store(args.queries)
+
+
+if __name__ == "__main__":
+    main()
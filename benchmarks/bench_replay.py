@@ -0,0 +1,288 @@
+# Replay recorded conversations through main.chat_with_assistant and the LangChain agent
+# (main-using-langchain.chat_with_agent) fully offline: OpenAI (Assistants, chat completions,
+# embeddings) and OpenWeather are local stand-ins with configurable latency and failure
+# injection, and retrieval runs against a throwaway pgvector cluster (or a fixed-latency
+# stand-in with --pgvector off). Reports throughput, per-turn latency percentiles, tokens per
+# turn and round trips per turn, and flags regressions against a stored baseline.
+#
+# Conversations are JSONL, one per line; "tools" is what the stand-in model calls for that turn:
+#   {"id": "weather", "turns": [{"user": "Weather in Paris?", "tools": [["get_current_weather", {"city": "Paris"}]]}]}
+#
+# Usage: python -m benchmarks.bench_replay --target both --repeat 3
+#        python -m benchmarks.bench_replay --save-baseline benchmarks/replay_baseline.json
+#        python -m benchmarks.bench_replay --pgvector off --repeat 3 --baseline benchmarks/replay_baseline.json
+# The stored replay_baseline.json was taken with --pgvector off --repeat 3. Tokens and round trips
+# per turn are deterministic against the stand-ins and are held to --tolerance; wall-clock
+# throughput and percentiles vary from run to run and only fail past --timing-tolerance.
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_run_loop import percentile
+from benchmarks.ephemeral_pgvector import EphemeralPgvector
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_openweather import FakeOpenWeatherServer
+
+# Knowledge-base passages seeded into the ephemeral collection
+CORPUS = [
+    "Business visa applications need a passport valid for six months, an invitation letter from the host company and proof of funds.",
+    "Visa processing usually takes ten working days; expedited processing takes three working days for an extra fee.",
+    "Investments can be paid by ACH or by wire transfer. Wire transfers need the wire ID from the sending bank.",
+    "Transactions dated in the future are rejected. Investment confirmations are sent by email within one business day.",
+    "Travel insurance is recommended for all trips and required for destinations with a level 3 or 4 advisory.",
+]
+
+# Answers that mean the turn failed
+ERROR_PREFIXES = ("An error occurred", "I'm sorry, but I encountered an error", "The request timed out")
+
+# Metrics compared with the baseline and which direction is better
+BASELINE_METRICS = {
+    "turns_per_second": "higher",
+    "p50_ms": "lower",
+    "p95_ms": "lower",
+    "p99_ms": "lower",
+    "tokens_per_turn": "lower",
+    "round_trips_per_turn": "lower",
+}
+
+# Wall-clock metrics, compared with the looser timing tolerance
+TIMING_METRICS = {"turns_per_second", "p50_ms", "p95_ms", "p99_ms"}
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+def load_conversations(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# The stand-in model's tool calls for a user message, looked up from the conversations
+def make_script(conversations):
+    tools = {}
+    for conversation in conversations:
+        for turn in conversation["turns"]:
+            tools[normalize(turn["user"])] = [(name, arguments) for name, arguments in turn.get("tools", [])]
+    return lambda user_text: tools.get(normalize(user_text), [])
+
+
+# Point the entry points at the stand-ins; must run before they are imported
+def configure_environment(args, openai_server, weather_server, workdir, connection_string):
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": openai_server.base_url,
+        "OPENAI_API_BASE": openai_server.base_url,
+        "OPENWEATHER_API_KEY": "bench",
+        "OPENWEATHER_BASE_URL": weather_server.base_url,
+        "ASSISTANT_RUN_MODE": args.run_mode,
+        "ASSISTANT_CACHE_PATH": os.path.join(workdir, "assistant_cache.json"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "LEDGER_PATH": os.path.join(workdir, "transactions.sqlite3"),
+        "INGEST_VERSIONS_PATH": os.path.join(workdir, "ingest_versions.json"),
+        "COLLECTIONS_CONFIG": os.path.join(workdir, "collections.json"),
+        "TRACE_PATH": args.trace_path,
+        "LEXICAL_REFRESH_SECONDS": "0",
+    })
+    if connection_string:
+        os.environ["PGVECTOR_CONNECTION_STRING"] = connection_string
+
+
+def seed_collection():
+    from lifecycle import get_vector_store
+    get_vector_store().add_texts(CORPUS, metadatas=[{"source": "bench", "start_index": 0} for _ in CORPUS])
+
+
+def make_retriever(latency):
+    async def get_relevant_documents(query_text, filter=None, collections=None):
+        await asyncio.sleep(latency)
+        return []
+    return get_relevant_documents
+
+
+def reset_tool_caches():
+    from cache import coordinates_cache, weather_cache
+    coordinates_cache.clear()
+    weather_cache.clear()
+
+
+# Play every conversation through chat(user_input) and measure each turn through the stand-ins
+def replay(conversations, repeat, chat, new_conversation, openai_server, weather_server):
+    turns = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for conversation in conversations:
+            new_conversation()
+            for turn in conversation["turns"]:
+                openai_before = openai_server.counters()
+                weather_before = weather_server.request_count
+                turn_start = time.perf_counter()
+                try:
+                    response = chat(turn["user"])
+                except Exception as e:
+                    response = f"An error occurred: {e}"
+                latency = time.perf_counter() - turn_start
+                openai_after = openai_server.counters()
+                turns.append({
+                    "conversation": conversation["id"],
+                    "latency": latency,
+                    "failed": str(response).startswith(ERROR_PREFIXES),
+                    "tokens": sum(
+                        openai_after[key] - openai_before[key]
+                        for key in ("prompt_tokens", "completion_tokens", "embedding_tokens")
+                    ),
+                    "round_trips": (openai_after["requests"] - openai_before["requests"])
+                    + (weather_server.request_count - weather_before),
+                })
+    return turns, time.perf_counter() - start
+
+
+def summarize(turns, seconds):
+    latencies = [turn["latency"] for turn in turns]
+    count = len(turns)
+    return {
+        "turns": count,
+        "failed_turns": sum(turn["failed"] for turn in turns),
+        "seconds": seconds,
+        "turns_per_second": count / seconds if seconds else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "tokens_per_turn": sum(turn["tokens"] for turn in turns) / count,
+        "round_trips_per_turn": sum(turn["round_trips"] for turn in turns) / count,
+    }
+
+
+def run_assistants(args, conversations, openai_server, weather_server):
+    main = importlib.import_module("main")
+    if args.pgvector == "off":
+        main.retrieve = make_retriever(args.retrieval_latency)
+
+    # The thread is created outside the timed turns, as main.py's first turn would
+    def new_conversation():
+        main.new_conversation()
+        main.ensure_conversation()
+
+    reset_tool_caches()
+    return replay(conversations, args.repeat, main.chat_with_assistant, new_conversation, openai_server, weather_server)
+
+
+def run_langchain(args, conversations, openai_server, weather_server):
+    from conversation_memory import ConversationMemory
+
+    agent = importlib.import_module("main-using-langchain")
+    agent.get_agent_executor().verbose = False
+
+    def new_conversation():
+        agent.memory = ConversationMemory()
+
+    reset_tool_caches()
+    return replay(conversations, args.repeat, agent.chat_with_agent, new_conversation, openai_server, weather_server)
+
+
+def print_report(results):
+    print(f"{'target':<12}{'turns':>7}{'failed':>8}{'turns/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'tokens/turn':>13}{'trips/turn':>12}")
+    for target, summary in results.items():
+        print(f"{target:<12}{summary['turns']:>7}{summary['failed_turns']:>8}{summary['turns_per_second']:>9.2f}"
+              f"{summary['p50_ms']:>9.1f}{summary['p95_ms']:>9.1f}{summary['p99_ms']:>9.1f}"
+              f"{summary['tokens_per_turn']:>13.1f}{summary['round_trips_per_turn']:>12.2f}")
+
+
+# Metrics that got worse than the baseline by more than their tolerance
+def find_regressions(results, baseline, tolerance, timing_tolerance):
+    regressions = []
+    for target, summary in results.items():
+        expected = baseline.get(target)
+        if expected is None:
+            continue
+        for metric, better in BASELINE_METRICS.items():
+            old, new = expected.get(metric), summary[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            allowed = timing_tolerance if metric in TIMING_METRICS else tolerance
+            if (better == "lower" and change > allowed) or (better == "higher" and change < -allowed):
+                regressions.append((target, metric, old, new, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay of recorded conversations")
+    parser.add_argument("--conversations", default="benchmarks/conversations.jsonl")
+    parser.add_argument("--target", choices=["assistants", "langchain", "both"], default="both")
+    parser.add_argument("--repeat", type=int, default=1, help="Times to replay the whole file")
+    parser.add_argument("--run-mode", choices=["stream", "poll"], default="stream")
+    parser.add_argument("--think-time", type=float, default=0.05, help="Seconds the stand-in model takes per run step")
+    parser.add_argument("--openai-latency", type=float, default=0.0, help="Seconds added to every OpenAI request")
+    parser.add_argument("--openai-failure-rate", type=float, default=0.0)
+    parser.add_argument("--weather-latency", type=float, default=0.0)
+    parser.add_argument("--weather-failure-rate", type=float, default=0.0)
+    parser.add_argument("--pgvector", choices=["ephemeral", "off"], default="ephemeral",
+                        help="Retrieve from a throwaway pgvector cluster, or skip retrieval")
+    parser.add_argument("--database-url", help="Use this pgvector database instead of starting one")
+    parser.add_argument("--retrieval-latency", type=float, default=0.02, help="Stand-in retrieval time with --pgvector off")
+    parser.add_argument("--trace-path", default="", help="Also write the turns' spans to this JSONL trace")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Compare with results saved by --save-baseline")
+    parser.add_argument("--save-baseline", help="Save these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="Allowed relative change in tokens and round trips per turn before a regression")
+    parser.add_argument("--timing-tolerance", type=float, default=0.5,
+                        help="Allowed relative change in throughput and latency percentiles before a regression")
+    args = parser.parse_args()
+
+    conversations = load_conversations(args.conversations)
+    targets = ["assistants", "langchain"] if args.target == "both" else [args.target]
+    openai_server = FakeOpenAIServer(
+        think_time=args.think_time, script=make_script(conversations),
+        latency=args.openai_latency, failure_rate=args.openai_failure_rate,
+    )
+    weather_server = FakeOpenWeatherServer(latency=args.weather_latency, failure_rate=args.weather_failure_rate)
+    database = None
+    results = {}
+    with openai_server, weather_server, tempfile.TemporaryDirectory() as workdir:
+        try:
+            connection_string = args.database_url
+            if args.pgvector == "ephemeral" and not connection_string:
+                database = EphemeralPgvector().start()
+                connection_string = database.connection_string
+            configure_environment(args, openai_server, weather_server, workdir, connection_string)
+            if args.pgvector == "ephemeral":
+                seed_collection()
+
+            runners = {"assistants": run_assistants, "langchain": run_langchain}
+            for target in targets:
+                turns, seconds = runners[target](args, conversations, openai_server, weather_server)
+                results[target] = summarize(turns, seconds)
+        finally:
+            if database is not None:
+                database.stop()
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance, args.timing_tolerance)
+        for target, metric, old, new, change in regressions:
+            print(f"REGRESSION {target} {metric}: {old:.2f} -> {new:.2f} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} (timing {args.timing_tolerance:.0%}) of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Compare turn latency of the streaming run loop with the once-a-second polling loop,
+# against a local stand-in Assistants server.
+#
+# Usage: python -m benchmarks.bench_run_loop --turns 10 --think-time 0.3
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import openai
+
+from assistant_runs import aexecute_run
+from benchmarks.fake_openai import FakeOpenAIServer
+from response_cache import AsyncToolUseTracker
+from tool_dispatch import adispatch_tool_calls
+
+
+# Stand-in tools that take tool_latency seconds each, dispatched the same way the chat engine does
+def make_tool_handler(tool_latency):
+    async def run_tool(tool_call):
+        await asyncio.sleep(tool_latency)
+        return f"{tool_call.function.name} ok"
+
+    async def handle_tool_calls(tool_calls):
+        return await adispatch_tool_calls(tool_calls, run_tool)
+    return handle_tool_calls
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_turns(client, mode, turns, handle_tool_calls, expect_tools):
+    thread = await client.beta.threads.create()
+    latencies = []
+    for turn in range(turns):
+        await client.beta.threads.messages.create(thread_id=thread.id, role="user", content=f"Question {turn}")
+        start = time.perf_counter()
+        tool_use = AsyncToolUseTracker(handle_tool_calls)
+        status, messages = await aexecute_run(client, thread.id, "asst_bench", tool_use, mode=mode)
+        if messages is None:
+            messages = (await client.beta.threads.messages.list(thread_id=thread.id)).data
+        latencies.append(time.perf_counter() - start)
+        if status != "completed" or not messages:
+            raise RuntimeError(f"{mode} turn {turn} ended with status {status}")
+        if tool_use.used != expect_tools:
+            raise RuntimeError(f"{mode} turn {turn} did not call the expected tools")
+    return latencies
+
+
+async def run(args, server, handle_tool_calls):
+    client = openai.AsyncOpenAI(base_url=server.base_url, api_key="bench", max_retries=0)
+    print(f"{'mode':<8}{'turns':>6}{'mean s':>10}{'p50 s':>10}{'p95 s':>10}{'requests':>10}")
+    for mode in ("poll", "stream"):
+        requests_before = server.request_count
+        latencies = await run_turns(client, mode, args.turns, handle_tool_calls, bool(args.tool_calls))
+        requests_per_turn = (server.request_count - requests_before) / args.turns
+        print(
+            f"{mode:<8}{args.turns:>6}{statistics.mean(latencies):>10.3f}"
+            f"{percentile(latencies, 50):>10.3f}{percentile(latencies, 95):>10.3f}{requests_per_turn:>10.1f}"
+        )
+    await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming vs polling run loop latency")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--think-time", type=float, default=0.3, help="Seconds the stand-in model takes per run step")
+    parser.add_argument("--tool-calls", type=int, default=1, help="Tool calls per requires_action step, 0 for none")
+    parser.add_argument("--tool-latency", type=float, default=0.0, help="Seconds each stand-in tool call takes")
+    args = parser.parse_args()
+
+    cities = ["Paris", "Tokyo", "Lima", "Oslo", "Cairo"]
+    tool_calls = [("get_current_weather", {"city": cities[i % len(cities)]}) for i in range(args.tool_calls)]
+    handle_tool_calls = make_tool_handler(args.tool_latency)
+    with FakeOpenAIServer(think_time=args.think_time, tool_calls=tool_calls) as server:
+        asyncio.run(run(args, server, handle_tool_calls))
+
+
+if __name__ == "__main__":
+    main()
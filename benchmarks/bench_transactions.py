@@ -0,0 +1,142 @@
+# Transactions per second through the ledger under contention: many sessions (threads, and
+# optionally processes sharing the file) submit wire transfers at once, and a share of them are
+# resubmitted (a retried run step or a duplicated tool call) in the same turn. Runs once with a
+# commit per submission (--max-batch 1 behaviour) and once with group commit, and checks that
+# every key was written exactly once and every submission of a key got the same transaction.
+#
+# Usage: python -m benchmarks.bench_transactions --sessions 64 --transactions 2000 --duplicate-rate 0.2
+#        python -m benchmarks.bench_transactions --processes 4   (several processes on one ledger)
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from transactions import TransactionLedger, process, turn_scope
+
+
+# (turn_id, wire_id, amount) per submission; duplicates repeat an earlier submission's turn and wire
+def make_workload(count, duplicate_rate, seed):
+    rng = random.Random(seed)
+    unique = [(f"s{seed}-{i % 97}:{i}", f"WX-{seed}-{i:06d}", float(rng.randrange(100, 100000))) for i in range(count)]
+    workload = unique + [rng.choice(unique) for _ in range(int(count * duplicate_rate))]
+    rng.shuffle(workload)
+    return workload
+
+
+# Submit the workload from session threads; returns (seconds, latencies, {turn+wire: transaction ids})
+def run_sessions(ledger, workload, sessions):
+    latencies = []
+    seen = {}
+    lock = threading.Lock()
+
+    def session(items):
+        for turn_id, wire_id, amount in items:
+            start = time.perf_counter()
+            with turn_scope(turn_id):
+                _, entry = process(amount, "wire transfer", "2024-02-15", wire_id, ledger=ledger)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                seen.setdefault((turn_id, wire_id), set()).add(entry.transaction_id)
+
+    threads = [threading.Thread(target=session, args=(workload[i::sessions],)) for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies, seen
+
+
+def _process_worker(path, max_batch, count, duplicate_rate, sessions, seed, results):
+    ledger = TransactionLedger(path, max_batch=max_batch)
+    seconds, latencies, seen = run_sessions(ledger, make_workload(count, duplicate_rate, seed), sessions)
+    ledger.close()
+    results.put((seconds, latencies, {key: sorted(ids) for key, ids in seen.items()}, ledger.commits))
+
+
+def run(path, max_batch, args):
+    if args.processes == 1:
+        ledger = TransactionLedger(path, max_batch=max_batch)
+        seconds, latencies, seen = run_sessions(
+            ledger, make_workload(args.transactions, args.duplicate_rate, 0), args.sessions
+        )
+        ledger.close()
+        commits = ledger.commits
+    else:
+        # Every process submits the same workload, so each key is contended across processes too
+        TransactionLedger(path).close()
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=_process_worker, args=(
+                path, max_batch, args.transactions, args.duplicate_rate, args.sessions, 0, results,
+            ))
+            for _ in range(args.processes)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        seconds = time.perf_counter() - start
+        latencies = [latency for outcome in outcomes for latency in outcome[1]]
+        seen = {}
+        for outcome in outcomes:
+            for key, ids in outcome[2].items():
+                seen.setdefault(key, set()).update(ids)
+        commits = sum(outcome[3] for outcome in outcomes)
+
+    connection = sqlite3.connect(path)
+    rows = connection.execute("SELECT COUNT(*), COUNT(DISTINCT idempotency_key) FROM ledger").fetchone()
+    connection.close()
+    problems = []
+    if rows[0] != len(seen) or rows[1] != len(seen):
+        problems.append(f"{rows[0]} rows for {len(seen)} keys")
+    split = sum(1 for ids in seen.values() if len(ids) != 1)
+    if split:
+        problems.append(f"{split} keys got more than one transaction")
+    ordered = sorted(latencies)
+    return {
+        "submissions": len(latencies),
+        "seconds": seconds,
+        "tx_per_second": len(latencies) / seconds,
+        "commits": commits,
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p99_ms": ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1000,
+        "rows": rows[0],
+        "problems": problems,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ledger throughput under contention")
+    parser.add_argument("--sessions", type=int, default=64, help="Submitting threads per process")
+    parser.add_argument("--transactions", type=int, default=2000, help="Distinct transactions per process")
+    parser.add_argument("--duplicate-rate", type=float, default=0.2, help="Extra resubmissions, as a share")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--max-batch", type=int, default=256, help="Group size limit of the group commit run")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'mode':<16}{'submissions':>12}{'seconds':>9}{'tx/s':>9}{'commits':>9}{'p50 ms':>9}{'p99 ms':>9}{'rows':>7}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode, max_batch in (("commit each", 1), ("group commit", args.max_batch)):
+            result = run(os.path.join(workdir, f"ledger-{max_batch}.sqlite3"), max_batch, args)
+            print(f"{mode:<16}{result['submissions']:>12}{result['seconds']:>9.2f}{result['tx_per_second']:>9.0f}"
+                  f"{result['commits']:>9}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['rows']:>7}")
+            for problem in result["problems"]:
+                print(f"  FAILED {problem}")
+                failed = True
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Travel advisory lookups against synthetic datasets of growing size: load time of the index,
+# and lookups per second through get_travel_advisory's index for city hits, country-wide
+# fallbacks and unknown destinations. Lookup time should stay flat as the dataset grows.
+#
+# Usage: python -m benchmarks.bench_travel_advisories --sizes 1000 10000 100000 --lookups 200000
+
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+from travel_advisories import AdvisoryIndex
+
+
+def write_dataset(path, cities_per_country, countries=200):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["country", "city", "level", "advisory", "updated", "aliases"])
+        for country in range(countries):
+            writer.writerow([f"Country {country}", "", country % 4 + 1, "", "2026-01-01", f"C{country}"])
+            for city in range(cities_per_country):
+                writer.writerow([f"Country {country}", f"City {city}", city % 4 + 1, "", "2026-01-01", ""])
+
+
+def make_lookups(count, cities_per_country, countries=200):
+    rng = random.Random(0)
+    lookups = []
+    for i in range(count):
+        country = f"country {rng.randrange(countries)}"
+        kind = i % 3
+        if kind == 0:
+            lookups.append((f"City {rng.randrange(cities_per_country)}", country.title()))
+        elif kind == 1:
+            lookups.append(("Elsewhere", f"c{rng.randrange(countries)}"))
+        else:
+            lookups.append(("Elsewhere", "Atlantis"))
+    return lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Travel advisory index load time and lookup rate")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Rows per dataset")
+    parser.add_argument("--lookups", type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}{'load ms':>10}{'lookups/s':>14}{'us/lookup':>11}{'found':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            cities_per_country = max(1, size // 200)
+            path = os.path.join(workdir, f"advisories_{size}.csv")
+            write_dataset(path, cities_per_country)
+
+            start = time.perf_counter()
+            index = AdvisoryIndex.load(path)
+            load_seconds = time.perf_counter() - start
+
+            lookups = make_lookups(args.lookups, cities_per_country)
+            start = time.perf_counter()
+            found = sum(1 for city, country in lookups if index.lookup(city, country) is not None)
+            seconds = time.perf_counter() - start
+            print(f"{len(index):>10}{load_seconds * 1000:>10.1f}{len(lookups) / seconds:>14.0f}"
+                  f"{seconds / len(lookups) * 1e6:>11.2f}{found / len(lookups):>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
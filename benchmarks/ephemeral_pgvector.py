@@ -0,0 +1,76 @@
+# Throwaway Postgres cluster with the pgvector extension for benchmarks: initdb into a temporary
+# directory, start it on a free local port, and delete everything on stop. Needs the Postgres
+# server binaries (initdb, pg_ctl) with pgvector installed, found on PATH or in PG_BIN.
+
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+
+from sqlalchemy import create_engine, text
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _binary(name):
+    pg_bin = os.getenv("PG_BIN")
+    path = os.path.join(pg_bin, name) if pg_bin else shutil.which(name)
+    if not path or not os.path.exists(path):
+        raise RuntimeError(
+            f"{name} not found; install the Postgres server with pgvector, set PG_BIN, "
+            "or point the benchmark at a running server with --database-url"
+        )
+    return path
+
+
+class EphemeralPgvector:
+    def __init__(self, user="bench", database="postgres"):
+        self.user = user
+        self.database = database
+        self.port = None
+        self.directory = None
+
+    @property
+    def connection_string(self):
+        return f"postgresql+psycopg://{self.user}@127.0.0.1:{self.port}/{self.database}"
+
+    def start(self):
+        initdb, pg_ctl = _binary("initdb"), _binary("pg_ctl")
+        self.directory = tempfile.mkdtemp(prefix="pgvector-bench-")
+        data = os.path.join(self.directory, "data")
+        self.port = _free_port()
+        subprocess.run(
+            [initdb, "-D", data, "-U", self.user, "--auth=trust", "--no-sync"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        options = f"-p {self.port} -k {self.directory} -c listen_addresses=127.0.0.1 -c fsync=off"
+        subprocess.run(
+            [pg_ctl, "-D", data, "-o", options, "-l", os.path.join(self.directory, "postgres.log"), "-w", "start"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        engine = create_engine(self.connection_string)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        engine.dispose()
+        return self
+
+    def stop(self):
+        if self.directory is None:
+            return
+        subprocess.run(
+            [_binary("pg_ctl"), "-D", os.path.join(self.directory, "data"), "-m", "immediate", "stop"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,700 @@
+# Local stand-in for the parts of the OpenAI API the chat loops use: Assistants, chat
+# completions (with function calling, for the LangChain agent), embeddings, and files and
+# batches for the Batch API (a batch finishes think_time seconds after it is created).
+# Runs are scripted: each run "thinks" for think_time seconds, asks for the tool calls the
+# script gives for the latest user message once, thinks again after the outputs are submitted
+# and then replies. Every request can be delayed by `latency` and failed at `failure_rate`.
+
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from tokens import count_tokens
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+# The default listen backlog of 5 drops connections when hundreds of clients connect at once
+class StandInHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def new_id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def thread_object(thread_id):
+    return {
+        "id": thread_id,
+        "object": "thread",
+        "created_at": int(time.time()),
+        "metadata": {},
+        "tool_resources": None,
+    }
+
+
+def message_object(thread_id, role, text, run_id=None, assistant_id=None):
+    return {
+        "id": new_id("msg"),
+        "object": "thread.message",
+        "created_at": int(time.time()),
+        "thread_id": thread_id,
+        "role": role,
+        "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        "assistant_id": assistant_id,
+        "run_id": run_id,
+        "attachments": [],
+        "metadata": {},
+        "status": "completed",
+        "completed_at": int(time.time()),
+        "incomplete_at": None,
+        "incomplete_details": None,
+    }
+
+
+def assistant_object(assistant_id, body):
+    return {
+        "id": assistant_id,
+        "object": "assistant",
+        "created_at": int(time.time()),
+        "name": body.get("name"),
+        "description": body.get("description"),
+        "model": body.get("model", "fake-model"),
+        "instructions": body.get("instructions"),
+        "tools": body.get("tools", []),
+        "metadata": body.get("metadata") or {},
+        "top_p": 1.0,
+        "temperature": 1.0,
+        "response_format": "auto",
+        "tool_resources": None,
+    }
+
+
+# Cursor page of items; the SDK keeps asking for the page after the last id until one is empty
+def list_object(items, query=""):
+    params = dict(pair.split("=", 1) for pair in query.split("&") if "=" in pair)
+    if params.get("after"):
+        ids = [item["id"] for item in items]
+        items = items[ids.index(params["after"]) + 1:] if params["after"] in ids else []
+    return {
+        "object": "list",
+        "data": items,
+        "first_id": items[0]["id"] if items else None,
+        "last_id": items[-1]["id"] if items else None,
+        "has_more": False,
+    }
+
+
+def run_object(run):
+    return {
+        "id": run["id"],
+        "object": "thread.run",
+        "created_at": int(run["created_at"]),
+        "assistant_id": run["assistant_id"],
+        "thread_id": run["thread_id"],
+        "status": run["status"],
+        "required_action": run.get("required_action"),
+        "last_error": None,
+        "expires_at": None,
+        "started_at": int(run["created_at"]),
+        "cancelled_at": None,
+        "failed_at": None,
+        "completed_at": int(time.time()) if run["status"] == "completed" else None,
+        "incomplete_details": None,
+        "instructions": "",
+        "model": "fake-model",
+        "tools": [],
+        "metadata": {},
+        "usage": run.get("usage"),
+        "temperature": 1.0,
+        "top_p": 1.0,
+        "max_prompt_tokens": None,
+        "max_completion_tokens": None,
+        "truncation_strategy": {"type": "auto", "last_messages": None},
+        "response_format": "auto",
+        "tool_choice": "auto",
+        "parallel_tool_calls": True,
+    }
+
+
+def file_object(file_id, record):
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(record["content"]),
+        "created_at": int(record["created_at"]),
+        "filename": record["filename"],
+        "purpose": record["purpose"],
+        "status": "processed",
+        "status_details": None,
+    }
+
+
+def batch_object(batch):
+    done = batch["status"] == "completed"
+    counts = batch["request_counts"] if done else dict(batch["request_counts"], completed=0, failed=0)
+    return {
+        "id": batch["id"],
+        "object": "batch",
+        "endpoint": batch["endpoint"],
+        "errors": None,
+        "input_file_id": batch["input_file_id"],
+        "completion_window": batch["completion_window"],
+        "status": batch["status"],
+        "output_file_id": batch["output_file_id"] if done else None,
+        "error_file_id": batch["error_file_id"] if done else None,
+        "created_at": int(batch["created_at"]),
+        "in_progress_at": int(batch["created_at"]),
+        "expires_at": int(batch["created_at"]) + 86400,
+        "finalizing_at": None,
+        "completed_at": int(batch["ready_at"]) if done else None,
+        "failed_at": None,
+        "expired_at": None,
+        "cancelling_at": None,
+        "cancelled_at": None,
+        "request_counts": counts,
+        "metadata": batch.get("metadata"),
+    }
+
+
+def usage_object(prompt_tokens, completion_tokens):
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def chat_completion_object(model, text, usage=None, function_call=None, tool_calls=None):
+    message = {"role": "assistant", "content": text}
+    finish_reason = "stop"
+    if function_call is not None:
+        message["function_call"] = function_call
+        finish_reason = "function_call"
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+        finish_reason = "tool_calls"
+    return {
+        "id": new_id("chatcmpl"),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model or "gpt-4o-mini",
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": finish_reason,
+            "logprobs": None,
+        }],
+        "usage": usage or usage_object(0, 0),
+    }
+
+
+# The same completion as a stream of chunks: the whole message in one delta, then the finish
+def chat_completion_chunks(completion):
+    choice = completion["choices"][0]
+    delta = {key: value for key, value in choice["message"].items() if value is not None}
+    if "tool_calls" in delta:
+        delta["tool_calls"] = [dict(call, index=index) for index, call in enumerate(delta["tool_calls"])]
+    base = {key: completion[key] for key in ("id", "created", "model")}
+    return [
+        dict(base, object="chat.completion.chunk",
+             choices=[{"index": 0, "delta": delta, "finish_reason": None, "logprobs": None}]),
+        dict(base, object="chat.completion.chunk",
+             choices=[{"index": 0, "delta": {}, "finish_reason": choice["finish_reason"], "logprobs": None}]),
+        dict(base, object="chat.completion.chunk", choices=[], usage=completion["usage"]),
+    ]
+
+
+# Deterministic unit vector for a text (or token list), so equal inputs embed equally
+def fake_embedding(value, dimensions=EMBEDDING_DIMENSIONS):
+    seed = hashlib.sha256(json.dumps(value).encode()).digest()[:8]
+    vector = np.random.default_rng(int.from_bytes(seed, "little")).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+# Short route name of a request path, for per-route request counts
+def route_name(method, parts):
+    if len(parts) >= 2 and parts[1] in ("files", "batches"):
+        if len(parts) == 2:
+            return f"{parts[1]}.create"
+        return f"{parts[1]}.{parts[3] if len(parts) > 3 else 'retrieve'}"
+    if len(parts) < 2 or parts[1] != "threads":
+        return ".".join(parts[1:]) or "root"
+    if len(parts) == 2:
+        return "threads.create"
+    if len(parts) == 4:
+        return f"{parts[3]}.{'list' if method == 'GET' else 'create'}"
+    if len(parts) == 5:
+        return f"{parts[3]}.retrieve"
+    return f"{parts[3]}.{parts[5]}"
+
+
+def _jsonl(records):
+    return "".join(json.dumps(record) + "\n" for record in records).encode()
+
+
+def _text_of(content):
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content or "")
+
+
+class FakeOpenAIServer:
+    # script(user_text) -> [(tool name, arguments)] picks the tool calls per turn; without one
+    # every run asks for tool_calls. latency is added to every request and failure_rate of them
+    # are answered with failure_status instead.
+    def __init__(self, think_time=0.3, tool_calls=None, reply="This is a stand-in reply.", host="127.0.0.1", port=0,
+                 script=None, latency=0.0, failure_rate=0.0, failure_status=500):
+        self.think_time = think_time
+        self.tool_calls = tool_calls or []
+        self.reply = reply
+        self.script = script
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.route_counts = {}
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.embedding_tokens = 0
+        self.assistants = {}
+        self.threads = {}
+        self.runs = {}
+        self.run_requests = []
+        self.completion_requests = []
+        self.files = {}
+        self.batches = {}
+        self.request_count = 0
+        self.lock = threading.Lock()
+        self.httpd = StandInHTTPServer((host, port), self._handler_class())
+        self._serve_thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._serve_thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._serve_thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def tool_calls_for(self, user_text):
+        if self.script is not None:
+            return self.script(user_text) or []
+        return self.tool_calls
+
+    # Counts one request on a route; True when it should be failed
+    def _count(self, route):
+        with self.lock:
+            self.request_count += 1
+            self.route_counts[route] = self.route_counts.get(route, 0) + 1
+            failed = self.failure_rate > 0 and random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return failed
+
+    # Caller holds the lock
+    def _charge(self, prompt_tokens, completion_tokens):
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        return usage_object(prompt_tokens, completion_tokens)
+
+    def counters(self):
+        with self.lock:
+            return {
+                "requests": self.request_count,
+                "failures": self.failures,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "embedding_tokens": self.embedding_tokens,
+                "routes": dict(self.route_counts),
+            }
+
+    # Chat completion for the LangChain agent (functions or tools) and history summaries: ask for
+    # the next scripted tool call that has no result since the last user message, else reply
+    def _complete(self, body):
+        messages = body.get("messages", [])
+        last_user = max((i for i, message in enumerate(messages) if message.get("role") == "user"), default=-1)
+        user_text = _text_of(messages[last_user].get("content")) if last_user >= 0 else ""
+        results = [message for message in messages[last_user + 1:] if message.get("role") in ("function", "tool")]
+        prompt_tokens = sum(count_tokens(_text_of(message.get("content"))) for message in messages)
+        prompt_tokens += count_tokens(json.dumps(body.get("functions") or body.get("tools") or []))
+
+        pending = []
+        if body.get("functions") or body.get("tools"):
+            pending = self.tool_calls_for(user_text)[len(results):]
+        if pending and body.get("tools"):
+            calls = [
+                {"id": new_id("call"), "type": "function",
+                 "function": {"name": name, "arguments": json.dumps(arguments)}}
+                for name, arguments in pending
+            ]
+            with self.lock:
+                usage = self._charge(prompt_tokens, count_tokens(json.dumps(pending)))
+            return chat_completion_object(body.get("model"), None, usage, tool_calls=calls)
+        if pending:
+            name, arguments = pending[0]
+            with self.lock:
+                usage = self._charge(prompt_tokens, count_tokens(json.dumps(pending[0])))
+            return chat_completion_object(
+                body.get("model"), None, usage, function_call={"name": name, "arguments": json.dumps(arguments)}
+            )
+        text = self.reply if body.get("functions") or body.get("tools") else "Stand-in summary."
+        with self.lock:
+            usage = self._charge(prompt_tokens, count_tokens(text))
+        return chat_completion_object(body.get("model"), text, usage)
+
+    def _embed(self, body):
+        inputs = body.get("input")
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        dimensions = body.get("dimensions") or EMBEDDING_DIMENSIONS
+        data = []
+        tokens = 0
+        for index, value in enumerate(inputs):
+            vector = fake_embedding(value, dimensions)
+            tokens += len(value) if isinstance(value, list) else count_tokens(value)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode()
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        with self.lock:
+            self.embedding_tokens += tokens
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def _create_file(self, filename, purpose, content):
+        file_id = new_id("file")
+        record = {"filename": filename, "purpose": purpose, "content": content, "created_at": time.time()}
+        self.files[file_id] = record
+        return file_object(file_id, record)
+
+    # Every request of the input file is answered up front; the batch only reports completed
+    # (with its output file) once think_time has passed
+    def _create_batch(self, body):
+        lines = [json.loads(line) for line in self.files[body["input_file_id"]]["content"].splitlines() if line.strip()]
+        outputs, errors = [], []
+        for line in lines:
+            if line.get("url") == "/v1/chat/completions":
+                response = self._complete(line["body"])
+            elif line.get("url") == "/v1/embeddings":
+                response = self._embed(line["body"])
+            else:
+                errors.append({"id": new_id("batch_req"), "custom_id": line.get("custom_id"), "response": None,
+                               "error": {"code": "invalid_url", "message": f"Unsupported url {line.get('url')}"}})
+                continue
+            outputs.append({"id": new_id("batch_req"), "custom_id": line.get("custom_id"),
+                            "response": {"status_code": 200, "request_id": new_id("req"), "body": response},
+                            "error": None})
+        output_file = self._create_file("batch_output.jsonl", "batch_output", _jsonl(outputs))
+        error_file = self._create_file("batch_errors.jsonl", "batch_output", _jsonl(errors)) if errors else None
+        batch = {
+            "id": new_id("batch"),
+            "endpoint": body.get("endpoint"),
+            "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window", "24h"),
+            "status": "in_progress",
+            "created_at": time.time(),
+            "ready_at": time.time() + self.think_time,
+            "output_file_id": output_file["id"],
+            "error_file_id": error_file["id"] if error_file else None,
+            "request_counts": {"total": len(lines), "completed": len(outputs), "failed": len(errors)},
+            "metadata": body.get("metadata"),
+        }
+        with self.lock:
+            self.batches[batch["id"]] = batch
+        return batch
+
+    def _advance_batch(self, batch):
+        if batch["status"] == "in_progress" and time.time() >= batch["ready_at"]:
+            batch["status"] = "completed"
+        return batch
+
+    # Scripted run state machine, driven by wall-clock time so the polling loop sees it too
+
+    def _create_run(self, thread_id, assistant_id, instructions=""):
+        messages = self.threads.get(thread_id, [])
+        user_text = next(
+            (message["content"][0]["text"]["value"] for message in reversed(messages) if message["role"] == "user"), ""
+        )
+        tool_calls = self.tool_calls_for(user_text)
+        run = {
+            "id": new_id("run"),
+            "thread_id": thread_id,
+            "assistant_id": assistant_id,
+            "created_at": time.time(),
+            "ready_at": time.time() + self.think_time,
+            "tool_calls": tool_calls,
+            "needs_tools": bool(tool_calls),
+            "status": "in_progress",
+            # The model reads the whole thread plus this turn's instructions
+            "prompt_tokens": count_tokens(instructions or "") + sum(
+                count_tokens(message["content"][0]["text"]["value"]) for message in messages
+            ),
+        }
+        self.runs[run["id"]] = run
+        return run
+
+    def _advance(self, run):
+        if run["status"] != "in_progress" or time.time() < run["ready_at"]:
+            return run
+        if run["needs_tools"]:
+            run["status"] = "requires_action"
+            run["required_action"] = {
+                "type": "submit_tool_outputs",
+                "submit_tool_outputs": {
+                    "tool_calls": [
+                        {
+                            "id": new_id("call"),
+                            "type": "function",
+                            "function": {"name": name, "arguments": json.dumps(arguments)},
+                        }
+                        for name, arguments in run["tool_calls"]
+                    ]
+                },
+            }
+        else:
+            run["status"] = "completed"
+            run["required_action"] = None
+            message = message_object(run["thread_id"], "assistant", self.reply, run["id"], run["assistant_id"])
+            self.threads[run["thread_id"]].append(message)
+            run["message"] = message
+            run["usage"] = self._charge(run["prompt_tokens"], count_tokens(self.reply))
+        return run
+
+    def _submit(self, run, tool_outputs):
+        expected = {call["id"] for call in run["required_action"]["submit_tool_outputs"]["tool_calls"]}
+        submitted = {output["tool_call_id"] for output in tool_outputs}
+        if run["status"] != "requires_action" or submitted != expected:
+            return False
+        run["needs_tools"] = False
+        run["required_action"] = None
+        run["status"] = "in_progress"
+        # The outputs are read back in, together with the whole prompt again
+        run["prompt_tokens"] *= 2
+        run["prompt_tokens"] += sum(count_tokens(str(output.get("output", ""))) for output in tool_outputs)
+        run["ready_at"] = time.time() + self.think_time
+        return True
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            # JSON bodies, and multipart forms (file uploads) as {field: value}, with bytes for files
+            def _read_json(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                content_type = self.headers.get("Content-Type", "")
+                if not content_type.startswith("multipart/form-data"):
+                    return json.loads(raw or b"{}")
+                form = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + raw)
+                fields = {}
+                for part in form.iter_parts():
+                    name = part.get_param("name", header="content-disposition")
+                    filename = part.get_filename()
+                    payload = part.get_payload(decode=True)
+                    fields[name] = payload if filename else payload.decode()
+                    if filename:
+                        fields[f"{name}.filename"] = filename
+                return fields
+
+            def _send_bytes(self, content):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_error(self, status, message):
+                self._send_json({"error": {"message": message, "type": "invalid_request_error"}}, status)
+
+            def _start_events(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+            def _event(self, name, data):
+                self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode())
+                self.wfile.flush()
+
+            def _stream_until_paused(self, run):
+                time.sleep(max(0.0, run["ready_at"] - time.time()))
+                with server.lock:
+                    server._advance(run)
+                if run["status"] == "requires_action":
+                    self._event("thread.run.requires_action", run_object(run))
+                else:
+                    message = dict(run["message"], status="in_progress", content=[])
+                    self._event("thread.message.created", message)
+                    self._event("thread.message.delta", {
+                        "id": message["id"],
+                        "object": "thread.message.delta",
+                        "delta": {"content": [{"index": 0, "type": "text", "text": {"value": server.reply, "annotations": []}}]},
+                    })
+                    self._event("thread.message.completed", run["message"])
+                    self._event("thread.run.completed", run_object(run))
+                self.wfile.write(b"event: done\ndata: [DONE]\n\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                query = self.path.split("?", 1)[1] if "?" in self.path else ""
+                if server._count(route_name("GET", parts)):
+                    return self._send_error(server.failure_status, "Injected failure")
+                # /v1/assistants
+                if parts == ["v1", "assistants"]:
+                    return self._send_json(list_object(list(reversed(server.assistants.values())), query))
+                # /v1/assistants/{assistant_id}
+                if len(parts) == 3 and parts[1] == "assistants":
+                    assistant = server.assistants.get(parts[2])
+                    if assistant is None:
+                        return self._send_error(404, "No such assistant")
+                    return self._send_json(assistant)
+                # /v1/threads/{thread_id}/runs/{run_id}
+                if len(parts) == 5 and parts[1] == "threads" and parts[3] == "runs":
+                    run = server.runs.get(parts[4])
+                    if run is None:
+                        return self._send_error(404, "No such run")
+                    with server.lock:
+                        server._advance(run)
+                    return self._send_json(run_object(run))
+                # /v1/files/{file_id}/content
+                if len(parts) == 4 and parts[1] == "files" and parts[3] == "content":
+                    record = server.files.get(parts[2])
+                    if record is None:
+                        return self._send_error(404, "No such file")
+                    return self._send_bytes(record["content"])
+                # /v1/batches/{batch_id}
+                if len(parts) == 3 and parts[1] == "batches":
+                    batch = server.batches.get(parts[2])
+                    if batch is None:
+                        return self._send_error(404, "No such batch")
+                    with server.lock:
+                        server._advance_batch(batch)
+                    return self._send_json(batch_object(batch))
+                # /v1/threads/{thread_id}/messages
+                if len(parts) == 4 and parts[1] == "threads" and parts[3] == "messages":
+                    return self._send_json(list_object(list(reversed(server.threads.get(parts[2], []))), query))
+                self._send_error(404, f"Unknown route {self.path}")
+
+            def do_POST(self):
+                body = self._read_json()
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if server._count(route_name("POST", parts)):
+                    return self._send_error(server.failure_status, "Injected failure")
+                # /v1/assistants
+                if parts == ["v1", "assistants"]:
+                    assistant = assistant_object(new_id("asst"), body)
+                    server.assistants[assistant["id"]] = assistant
+                    return self._send_json(assistant)
+                # /v1/threads
+                if parts == ["v1", "threads"]:
+                    thread_id = new_id("thread")
+                    server.threads[thread_id] = [
+                        message_object(thread_id, message.get("role", "user"), str(message.get("content", "")))
+                        for message in body.get("messages", [])
+                    ]
+                    return self._send_json(thread_object(thread_id))
+                # /v1/threads/{thread_id}/messages
+                if len(parts) == 4 and parts[1] == "threads" and parts[3] == "messages":
+                    message = message_object(parts[2], body.get("role", "user"), str(body.get("content", "")))
+                    server.threads.setdefault(parts[2], []).append(message)
+                    return self._send_json(message)
+                # /v1/threads/{thread_id}/runs
+                if len(parts) == 4 and parts[1] == "threads" and parts[3] == "runs":
+                    with server.lock:
+                        server.run_requests.append(body)
+                        run = server._create_run(
+                            parts[2], body.get("assistant_id"), body.get("additional_instructions")
+                        )
+                    if not body.get("stream"):
+                        return self._send_json(run_object(run))
+                    self._start_events()
+                    self._event("thread.run.created", run_object(run))
+                    return self._stream_until_paused(run)
+                # /v1/chat/completions (the LangChain agent and history summaries)
+                if parts == ["v1", "chat", "completions"]:
+                    with server.lock:
+                        server.completion_requests.append(body)
+                    completion = server._complete(body)
+                    if not body.get("stream"):
+                        return self._send_json(completion)
+                    self._start_events()
+                    for chunk in chat_completion_chunks(completion):
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                    return
+                # /v1/embeddings
+                if parts == ["v1", "embeddings"]:
+                    return self._send_json(server._embed(body))
+                # /v1/files (multipart upload)
+                if parts == ["v1", "files"]:
+                    with server.lock:
+                        record = server._create_file(body.get("file.filename", "upload"), body.get("purpose"), body.get("file", b""))
+                    return self._send_json(record)
+                # /v1/batches
+                if parts == ["v1", "batches"]:
+                    if body.get("input_file_id") not in server.files:
+                        return self._send_error(400, "No such input file")
+                    return self._send_json(batch_object(server._create_batch(body)))
+                # /v1/threads/{thread_id}/runs/{run_id}/submit_tool_outputs
+                if len(parts) == 6 and parts[3] == "runs" and parts[5] == "submit_tool_outputs":
+                    run = server.runs.get(parts[4])
+                    if run is None:
+                        return self._send_error(404, "No such run")
+                    with server.lock:
+                        accepted = server._submit(run, body.get("tool_outputs", []))
+                    if not accepted:
+                        return self._send_error(400, "Tool outputs must be submitted for every tool call in one request")
+                    if not body.get("stream"):
+                        return self._send_json(run_object(run))
+                    self._start_events()
+                    return self._stream_until_paused(run)
+                self._send_error(404, f"Unknown route {self.path}")
+
+        return Handler
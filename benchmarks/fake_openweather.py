@@ -0,0 +1,106 @@
+# Local stand-in for the OpenWeather geocoding and current-weather endpoints,
+# with configurable latency and failure injection
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from benchmarks.fake_openai import StandInHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+CITIES = {
+    "paris": (48.8566, 2.3522),
+    "tokyo": (35.6762, 139.6503),
+    "lima": (-12.0464, -77.0428),
+    "oslo": (59.9139, 10.7522),
+    "cairo": (30.0444, 31.2357),
+}
+
+
+class FakeOpenWeatherServer:
+    def __init__(self, latency=0.0, failure_rate=0.0, failure_status=503, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        # Fail exactly this many upcoming requests, regardless of failure_rate
+        self.fail_next = 0
+        self.request_count = 0
+        self.connection_count = 0
+        self.lock = threading.Lock()
+        self.httpd = StandInHTTPServer((host, port), self._handler_class())
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _should_fail(self):
+        with self.lock:
+            self.request_count += 1
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return True
+        return random.random() < self.failure_rate
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connection_count += 1
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._should_fail():
+                    return self._send_json({"cod": server.failure_status, "message": "injected failure"}, server.failure_status)
+
+                url = urlsplit(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if url.path == "/geo/1.0/direct":
+                    name = query.get("q", "").strip().lower()
+                    if name not in CITIES:
+                        return self._send_json([])
+                    lat, lon = CITIES[name]
+                    return self._send_json([{"name": name.title(), "lat": lat, "lon": lon, "country": "XX"}])
+                if url.path == "/data/2.5/weather":
+                    lat = float(query.get("lat", 0))
+                    return self._send_json({
+                        "main": {"temp": round(15 + lat / 10, 1), "humidity": 60},
+                        "weather": [{"description": "scattered clouds"}],
+                    })
+                self._send_json({"cod": 404, "message": "not found"}, 404)
+
+        return Handler
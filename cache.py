@@ -0,0 +1,245 @@
+# In-process caches for tool lookups: an LRU for values that never go stale and a TTL cache
+# for values that may only be reused for a while. Both can coalesce concurrent misses for the
+# same key into one computation (single flight) and keep hit/miss counters.
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from tracing import record_cache
+
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "10000"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "2000"))
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+CACHE_SINGLE_FLIGHT = os.getenv("CACHE_SINGLE_FLIGHT", "true").lower() == "true"
+
+_MISSING = object()
+# Result of an async flight whose leader was cancelled: the followers compute it themselves
+_RETRY = object()
+
+
+# One in-progress computation that concurrent callers for the same key wait on
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LRUCache:
+    # A named cache also reports its hits and misses to the tracer
+    def __init__(self, maxsize=1024, single_flight=CACHE_SINGLE_FLIGHT, name=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.single_flight = single_flight
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = {}
+        # Futures belong to one event loop, so async flights are kept per loop
+        self._async_flights = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    # Subclasses store extra data next to the value (e.g. an expiry time)
+    def _wrap(self, value):
+        return value
+
+    def _unwrap(self, key, entry):
+        return entry
+
+    def _lookup(self, key):
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return _MISSING
+        value = self._unwrap(key, entry)
+        if value is not _MISSING:
+            self._data.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        self._data[key] = self._wrap(value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _trace(self, hit):
+        if self.name:
+            record_cache(self.name, hits=int(hit), misses=int(not hit))
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+        self._trace(value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    # Return the cached value for key, or compute, cache and return it.
+    # Values that are None are returned but not cached, and exceptions are never cached.
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            value = self._lookup(key)
+            hit = value is not _MISSING
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+                flight = self._flights.get(key) if self.single_flight else None
+                if flight is not None:
+                    self.coalesced += 1
+                    leader = False
+                else:
+                    flight = _Flight()
+                    leader = True
+                    if self.single_flight:
+                        self._flights[key] = flight
+        self._trace(hit)
+        if hit:
+            return value
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            if flight.value is not None:
+                self.set(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            if self.single_flight:
+                with self._lock:
+                    self._flights.pop(key, None)
+            flight.done.set()
+
+    # Async counterpart of get_or_compute; compute is a coroutine function.
+    # Concurrent misses in the same event loop wait on the first caller's future; if that caller
+    # is cancelled, the waiting ones start over instead of failing with it.
+    async def aget_or_compute(self, key, compute):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                value = self._lookup(key)
+                hit = value is not _MISSING
+                if hit:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    flights = self._async_flights.setdefault(loop, {})
+                    leader = None
+                    flight = flights.get(key) if self.single_flight else None
+                    if flight is not None:
+                        self.coalesced += 1
+                    else:
+                        flight = loop.create_future()
+                        if self.single_flight:
+                            flights[key] = flight
+                        leader = flight
+            self._trace(hit)
+            if hit:
+                return value
+
+            if flight is not leader:
+                value = await asyncio.shield(flight)
+                if value is _RETRY:
+                    continue
+                return value
+
+            try:
+                value = await compute()
+                if value is not None:
+                    self.set(key, value)
+                flight.set_result(value)
+                return value
+            except asyncio.CancelledError:
+                flight.set_result(_RETRY)
+                raise
+            except Exception as e:
+                flight.set_exception(e)
+                # Nobody may be waiting on the future; don't let asyncio warn about it
+                flight.exception()
+                raise
+            finally:
+                if self.single_flight:
+                    with self._lock:
+                        flights.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TTLCache(LRUCache):
+    def __init__(self, maxsize=1024, ttl=600, single_flight=CACHE_SINGLE_FLIGHT, name=None):
+        super().__init__(maxsize=maxsize, single_flight=single_flight, name=name)
+        self.ttl = ttl
+        self.expirations = 0
+
+    def _wrap(self, value):
+        return (time.monotonic() + self.ttl, value)
+
+    def _unwrap(self, key, entry):
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._data[key]
+            self.expirations += 1
+            return _MISSING
+        return value
+
+    def stats(self):
+        stats = super().stats()
+        stats["ttl"] = self.ttl
+        stats["expirations"] = self.expirations
+        return stats
+
+
+# Cache key for a city name: case and whitespace don't matter
+def normalize_city(city):
+    return " ".join(city.lower().split())
+
+
+# Cache key for a position: ~1 km precision is plenty for current weather
+def round_coordinates(lat, lon, digits=2):
+    return (round(lat, digits), round(lon, digits))
+
+
+# Shared by both entry points through tools.py
+coordinates_cache = LRUCache(maxsize=GEOCODE_CACHE_SIZE, name="geocode")
+weather_cache = TTLCache(maxsize=WEATHER_CACHE_SIZE, ttl=WEATHER_CACHE_TTL, name="weather")
@@ -0,0 +1,355 @@
+# HTTP chat service on aiohttp. Each session id maps to its own conversation: an Assistants
+# thread in the asyncio engine (CHAT_BACKEND=assistants) or a LangChain history
+# (CHAT_BACKEND=langchain). Answers come back as JSON or, with "stream": true, as server-sent
+# events carrying the text as it is generated. A client that may retry a turn sends the same
+# Idempotency-Key header with each attempt, so transactions of the turn are processed once.
+#
+#   POST   /sessions                    -> {"session_id": ...}
+#   POST   /sessions/{session_id}/chat  {"message": "...", "stream": false}
+#   DELETE /sessions/{session_id}
+#   GET    /healthz, GET /metrics
+#
+# Backpressure: at most SERVER_MAX_PENDING_TURNS turns are admitted at once (the engine runs
+# MAX_CONCURRENT_TURNS of them, the rest wait), and each session may have SESSION_MAX_PENDING_TURNS
+# turns admitted; beyond either limit requests get 503/429 with Retry-After. On shutdown the
+# server stops admitting turns and waits up to SHUTDOWN_GRACE_SECONDS for the ones in flight.
+#
+# With --prewarm the clients, pools, indexes and (for the LangChain backend) the agent are built
+# before the server starts accepting requests.
+#
+# Usage: python chat_server.py [--backend langchain] [--port 8080] [--prewarm]
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import time
+import uuid
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from async_engine import MAX_CONCURRENT_TURNS, AsyncChatEngine
+from conversation_memory import ConversationMemory
+from tracing import span, tracer
+from transactions import turn_scope
+
+# Load environment variables
+load_dotenv()
+
+CHAT_BACKEND = os.getenv("CHAT_BACKEND", "assistants")
+CHAT_SERVER_HOST = os.getenv("CHAT_SERVER_HOST", "127.0.0.1")
+CHAT_SERVER_PORT = int(os.getenv("CHAT_SERVER_PORT", "8080"))
+SERVER_MAX_PENDING_TURNS = int(os.getenv("SERVER_MAX_PENDING_TURNS", "200"))
+# Turns one session may have running or queued; the session's turns still run one at a time
+SESSION_MAX_PENDING_TURNS = int(os.getenv("SESSION_MAX_PENDING_TURNS", "2"))
+# Sessions without a turn for this long are dropped
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "60"))
+# Pieces of streamed text buffered per request before the run waits for the client
+STREAM_BUFFER = int(os.getenv("STREAM_BUFFER", "64"))
+RETRY_AFTER_SECONDS = "1"
+
+
+class AgentSession:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.lock = asyncio.Lock()
+        self.turns = 0
+        self.conversation_id = uuid.uuid4().hex
+        self.last_active = time.time()
+        self.memory = ConversationMemory()
+
+
+# The LangChain agent of main-using-langchain.py behind the same interface as AsyncChatEngine
+class AgentChatEngine:
+    def __init__(self, max_concurrency=MAX_CONCURRENT_TURNS):
+        self.agent = importlib.import_module("main-using-langchain")
+        self.sessions = {}
+        self._turn_slots = asyncio.Semaphore(max_concurrency)
+
+    # Build the agent off the event loop; it imports LangChain
+    async def start(self):
+        self.agent_executor = await asyncio.get_running_loop().run_in_executor(None, self.agent.get_agent_executor)
+        self.agent_executor.verbose = False
+        return self
+
+    def get_session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = AgentSession(session_id)
+        return session
+
+    def end_session(self, session_id):
+        self.sessions.pop(session_id, None)
+
+    def memory_stats(self):
+        return {session_id: session.memory.stats() for session_id, session in self.sessions.items()}
+
+    async def chat(self, session_id, user_input, on_delta=None, turn_id=None):
+        session = self.get_session(session_id)
+        async with session.lock, self._turn_slots:
+            session.turns += 1
+            session.last_active = time.time()
+            callbacks = list(self.agent.tracing_callbacks)
+            if on_delta is not None:
+                from langchain_callbacks import TokenCallbackHandler
+                callbacks.append(TokenCallbackHandler(on_delta))
+            try:
+                with span("turn", session=session_id) as turn_span, \
+                        turn_scope(turn_id or f"{session.conversation_id}:{session.turns}"):
+                    response = await self.agent_executor.ainvoke(
+                        {"input": user_input, "chat_history": session.memory.langchain_messages()},
+                        config={"callbacks": callbacks},
+                    )
+                    answer = response["output"]
+                    session.memory.add_turn(user_input, answer)
+                    if session.memory.needs_compaction():
+                        with span("history.compact"):
+                            await session.memory.acompact()
+                    turn_span.set(history_tokens=session.memory.window_tokens, compactions=session.memory.compactions)
+                    return answer
+            except Exception as e:
+                return f"An error occurred: {str(e)}. Please try again."
+
+    async def close(self):
+        pass
+
+
+class ChatServer:
+    def __init__(self, engine, max_pending=SERVER_MAX_PENDING_TURNS, session_max_pending=SESSION_MAX_PENDING_TURNS,
+                 idle_seconds=SESSION_IDLE_SECONDS, grace_seconds=SHUTDOWN_GRACE_SECONDS, prewarm=False):
+        self.engine = engine
+        self.prewarm = prewarm
+        self.max_pending = max_pending
+        self.session_max_pending = session_max_pending
+        self.idle_seconds = idle_seconds
+        self.grace_seconds = grace_seconds
+        self.pending = 0
+        self.session_pending = {}
+        self.draining = False
+        self.rejected = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._reaper = None
+
+    def app(self):
+        app = web.Application()
+        app.add_routes([
+            web.post("/sessions", self.create_session),
+            web.post("/sessions/{session_id}/chat", self.chat),
+            web.delete("/sessions/{session_id}", self.delete_session),
+            web.get("/healthz", self.healthz),
+            web.get("/metrics", self.metrics),
+        ])
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app):
+        if self.prewarm:
+            await self._prewarm()
+        await self.engine.start()
+        self._reaper = asyncio.create_task(self._reap_idle_sessions())
+
+    # Everything the first turns would otherwise build; runs before the port is opened
+    async def _prewarm(self):
+        from prewarm import aprewarm, prewarm
+        assistants = isinstance(self.engine, AsyncChatEngine)
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: prewarm(assistant=False, async_stores=assistants)
+        )
+        if assistants:
+            await aprewarm()
+
+    # Stop admitting turns and let the ones in flight finish
+    async def _on_shutdown(self, app):
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.grace_seconds)
+        except asyncio.TimeoutError:
+            print(f"Shutting down with {self.pending} turns still in flight")
+
+    async def _on_cleanup(self, app):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        await self.engine.close()
+
+    async def _reap_idle_sessions(self):
+        while True:
+            await asyncio.sleep(min(60.0, self.idle_seconds))
+            cutoff = time.time() - self.idle_seconds
+            for session_id, session in list(self.engine.sessions.items()):
+                if session.last_active < cutoff and not self.session_pending.get(session_id):
+                    self.engine.end_session(session_id)
+
+    def _reject(self, status, reason):
+        self.rejected += 1
+        tracer.count("chat_server_rejected_total", reason=reason)
+        return web.json_response(
+            {"error": reason}, status=status, headers={"Retry-After": RETRY_AFTER_SECONDS}
+        )
+
+    # Admission control; None when the turn may run
+    def _admit(self, session_id):
+        if self.draining:
+            return self._reject(503, "shutting down")
+        if self.pending >= self.max_pending:
+            return self._reject(503, "server busy")
+        if self.session_pending.get(session_id, 0) >= self.session_max_pending:
+            return self._reject(429, "too many turns in flight for this session")
+        self.pending += 1
+        self.session_pending[session_id] = self.session_pending.get(session_id, 0) + 1
+        self._idle.clear()
+        return None
+
+    def _release(self, session_id):
+        self.pending -= 1
+        remaining = self.session_pending[session_id] - 1
+        if remaining:
+            self.session_pending[session_id] = remaining
+        else:
+            del self.session_pending[session_id]
+        if not self.pending:
+            self._idle.set()
+
+    async def create_session(self, request):
+        session_id = uuid.uuid4().hex
+        self.engine.get_session(session_id)
+        return web.json_response({"session_id": session_id}, status=201)
+
+    async def delete_session(self, request):
+        session_id = request.match_info["session_id"]
+        if self.session_pending.get(session_id):
+            return web.json_response({"error": "session has turns in flight"}, status=409)
+        self.engine.end_session(session_id)
+        return web.Response(status=204)
+
+    async def chat(self, request):
+        session_id = request.match_info["session_id"]
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            return web.json_response({"error": "body must be JSON"}, status=400)
+        if not isinstance(body, dict):
+            return web.json_response({"error": "body must be a JSON object"}, status=400)
+        message = body.get("message")
+        if not isinstance(message, str) or not message.strip():
+            return web.json_response({"error": "message is required"}, status=400)
+
+        # Retries of a turn share its id, and with it the turn's transaction idempotency keys
+        idempotency_key = request.headers.get("Idempotency-Key")
+        turn_id = f"{session_id}:{idempotency_key}" if idempotency_key else None
+
+        rejection = self._admit(session_id)
+        if rejection is not None:
+            return rejection
+        try:
+            if body.get("stream"):
+                return await self._stream_turn(request, session_id, message, turn_id)
+            response = await self.engine.chat(session_id, message, turn_id=turn_id)
+            return web.json_response({"session_id": session_id, "response": response})
+        finally:
+            self._release(session_id)
+
+    # The answer as server-sent events: "delta" events while it is written, then "done" with the
+    # whole answer. Text the run wrote before the answer (a message ahead of its tool calls) is
+    # withdrawn by a "reset" event, so the deltas since the last reset always add up to the "done"
+    # response. A slow client fills the buffer and holds up its own run, not the others.
+    async def _stream_turn(self, request, session_id, message, turn_id=None):
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        await response.prepare(request)
+        deltas = asyncio.Queue(maxsize=STREAM_BUFFER)
+        streamed = []
+        current_message = None
+
+        async def on_delta(text, message_id=None):
+            await deltas.put((text, message_id))
+
+        async def send(event, data):
+            await response.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+
+        turn = asyncio.create_task(self.engine.chat(session_id, message, on_delta=on_delta, turn_id=turn_id))
+        connected = True
+        while not (turn.done() and deltas.empty()):
+            getter = asyncio.ensure_future(deltas.get())
+            await asyncio.wait({getter, turn}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                continue
+            text, message_id = getter.result()
+            if connected:
+                try:
+                    if message_id != current_message and streamed:
+                        await send("reset", {})
+                        streamed = []
+                    current_message = message_id
+                    await send("delta", {"text": text})
+                    streamed.append(text)
+                except ConnectionResetError:
+                    # The client left; the turn still finishes so the conversation stays consistent
+                    connected = False
+        answer = await turn
+        if connected:
+            try:
+                # Cached answers, the polling run loop and errors produce no deltas (or other text)
+                if "".join(streamed) != answer:
+                    if streamed:
+                        await send("reset", {})
+                    await send("delta", {"text": answer})
+                await send("done", {"session_id": session_id, "response": answer})
+                await response.write_eof()
+            except ConnectionResetError:
+                pass
+        return response
+
+    async def healthz(self, request):
+        status = 503 if self.draining else 200
+        return web.json_response({
+            "status": "draining" if self.draining else "ok",
+            "sessions": len(self.engine.sessions),
+            "pending_turns": self.pending,
+        }, status=status)
+
+    async def metrics(self, request):
+        lines = [
+            f"chat_server_sessions {len(self.engine.sessions)}",
+            f"chat_server_pending_turns {self.pending}",
+            f"chat_server_rejected_turns_total {self.rejected}",
+        ]
+        # Conversation memory of the live sessions, summed over sessions so the series stay few
+        memory = {}
+        for stats in self.engine.memory_stats().values():
+            for name, value in stats.items():
+                memory[name] = memory.get(name, 0) + value
+        lines += [f"chat_server_memory_{name} {value}" for name, value in sorted(memory.items())]
+        body = tracer.render_prometheus() + "\n".join(lines) + "\n"
+        return web.Response(text=body, content_type="text/plain")
+
+
+def build_engine(backend):
+    if backend == "langchain":
+        return AgentChatEngine()
+    return AsyncChatEngine()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP chat service")
+    parser.add_argument("--backend", choices=["assistants", "langchain"], default=CHAT_BACKEND)
+    parser.add_argument("--host", default=CHAT_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=CHAT_SERVER_PORT)
+    parser.add_argument("--prewarm", action="store_true", help="Build clients, pools and caches before serving")
+    args = parser.parse_args()
+
+    server = ChatServer(build_engine(args.backend), prewarm=args.prewarm)
+    web.run_app(server.app(), host=args.host, port=args.port, shutdown_timeout=server.grace_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Named document collections. Each collection is a directory (and glob) of source files with
+# its own chunking parameters, ingested into its own pgvector collection. The routing fields
+# (description, keywords) let retrieval search only the collections a question is about.
+# A keyword matches a whole word of the question; one ending in "*" ("invest*") matches any word
+# starting with it.
+#
+# Collections are read from COLLECTIONS_CONFIG (collections.json); see collections.example.json.
+# Without that file there is one collection, "vectorstore", over docs/*.pdf as before.
+
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+COLLECTIONS_CONFIG = os.getenv("COLLECTIONS_CONFIG", "collections.json")
+DEFAULT_COLLECTION = "vectorstore"
+# When each collection was last (re-)ingested; anything derived from a collection, like cached
+# answers, is stale once its collection's entry changes
+INGEST_VERSIONS_PATH = os.getenv("INGEST_VERSIONS_PATH", ".ingest_versions.json")
+
+
+class CollectionConfig:
+    def __init__(self, name, path="docs/", glob="*.pdf", chunk_size=500, chunk_overlap=50,
+                 description="", keywords=()):
+        self.name = name
+        self.path = path
+        self.glob = glob
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.description = description
+        keywords = {keyword.lower() for keyword in keywords}
+        self.keywords = {keyword for keyword in keywords if not keyword.endswith("*")}
+        self.keyword_prefixes = tuple(keyword[:-1] for keyword in keywords if keyword.endswith("*"))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            name=data["name"],
+            path=data.get("path", "docs/"),
+            glob=data.get("glob", "*.pdf"),
+            chunk_size=int(data.get("chunk_size", 500)),
+            chunk_overlap=int(data.get("chunk_overlap", 50)),
+            description=data.get("description", ""),
+            keywords=data.get("keywords", ()),
+        )
+
+
+_collections = None
+
+
+def load_collections(path=COLLECTIONS_CONFIG):
+    if not os.path.exists(path):
+        return [CollectionConfig(DEFAULT_COLLECTION)]
+    with open(path) as f:
+        data = json.load(f)
+    collections = [CollectionConfig.from_dict(item) for item in data["collections"]]
+    names = [collection.name for collection in collections]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate collection names in {path}: {names}")
+    return collections
+
+
+# Collections configured for this process, read once
+def get_collections():
+    global _collections
+    if _collections is None:
+        _collections = load_collections()
+    return _collections
+
+
+def get_collection(name):
+    for collection in get_collections():
+        if collection.name == name:
+            return collection
+    raise KeyError(f"Unknown collection {name!r}")
+
+
+def read_ingest_versions(path=INGEST_VERSIONS_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_ingest(collection_name, path=INGEST_VERSIONS_PATH):
+    versions = read_ingest_versions(path)
+    versions[collection_name] = time.time()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(versions, f, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,108 @@
+# Picks the collections a question should be searched in. A collection whose keywords appear in
+# the question is always searched; otherwise the question's embedding is compared with each
+# collection's description and the best ones (within ROUTER_MARGIN of the top score) are
+# searched. Collections without a description are searched whenever keywords don't decide.
+
+import os
+import re
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from cache import LRUCache
+from collection_config import get_collections
+from lifecycle import get_embeddings
+
+# Load environment variables
+load_dotenv()
+
+ROUTER_MAX_COLLECTIONS = int(os.getenv("ROUTER_MAX_COLLECTIONS", "2"))
+ROUTER_MARGIN = float(os.getenv("ROUTER_MARGIN", "0.05"))
+
+
+def _cosine(a, b):
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    norm = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(a @ b / norm) if norm else 0.0
+
+
+class CollectionRouter:
+    # Embeddings default to the shared ones, created only once a description has to be compared
+    def __init__(self, collections, embeddings=None):
+        self.collections = collections
+        self.embeddings = embeddings
+        # Holds the description embeddings once computed; concurrent first calls (threads, or
+        # tasks of one event loop) wait for a single embedding request
+        self._description_vectors = LRUCache(maxsize=1, single_flight=True)
+
+    # Whole words only, so "ach" doesn't match "achieve"; "*" keywords match by prefix
+    def _by_keyword(self, query_text):
+        words = set(re.findall(r"\w+", query_text.lower()))
+        return [
+            collection.name for collection in self.collections
+            if words & collection.keywords
+            or (collection.keyword_prefixes and any(word.startswith(collection.keyword_prefixes) for word in words))
+        ]
+
+    def _described(self):
+        return [collection for collection in self.collections if collection.description]
+
+    def _by_description(self, query_embedding, vectors):
+        described = self._described()
+        scores = sorted(
+            ((_cosine(query_embedding, vector), collection.name) for collection, vector in zip(described, vectors)),
+            reverse=True,
+        )
+        best = scores[0][0]
+        chosen = [name for score, name in scores[:ROUTER_MAX_COLLECTIONS] if score >= best - ROUTER_MARGIN]
+        undescribed = [collection.name for collection in self.collections if not collection.description]
+        return chosen + undescribed
+
+    # Collections to search when that is clear from the text alone, else None
+    def route_without_embeddings(self, query_text):
+        if len(self.collections) == 1:
+            return [self.collections[0].name]
+        matched = self._by_keyword(query_text)
+        if matched:
+            return matched
+        if not self._described():
+            return [collection.name for collection in self.collections]
+        return None
+
+    # Embeddings of the collection descriptions, computed once
+    def description_vectors(self):
+        def embed():
+            descriptions = [collection.description for collection in self._described()]
+            return (self.embeddings or get_embeddings()).embed_documents(descriptions) if descriptions else []
+        return self._description_vectors.get_or_compute("descriptions", embed)
+
+    async def adescription_vectors(self):
+        async def embed():
+            descriptions = [collection.description for collection in self._described()]
+            return await (self.embeddings or get_embeddings()).aembed_documents(descriptions) if descriptions else []
+        return await self._description_vectors.aget_or_compute("descriptions", embed)
+
+    def route(self, query_text, query_embedding):
+        names = self.route_without_embeddings(query_text)
+        if names is not None:
+            return names
+        return self._by_description(query_embedding, self.description_vectors())
+
+    async def aroute(self, query_text, query_embedding):
+        names = self.route_without_embeddings(query_text)
+        if names is not None:
+            return names
+        return self._by_description(query_embedding, await self.adescription_vectors())
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = CollectionRouter(get_collections())
+        return _router
@@ -0,0 +1,190 @@
+# Bounded conversation memory shared by both entry points. Recent turns are kept verbatim up to
+# a token budget; older turns are folded into a running summary. Only the user's own words and
+# the assistant's answers are remembered: the knowledge-base context retrieved for a turn is
+# passed with that turn's run and never enters the history.
+#
+# main.py and the asyncio engine replay the compacted memory into a fresh Assistants thread when
+# the old one outgrows the budget; main-using-langchain.py sends it as chat_history.
+
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from tokens import count_tokens, truncate_to_tokens
+
+# Load environment variables
+load_dotenv()
+
+# Tokens of history (summary plus recent turns) sent with a turn
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+# Share of the budget that is left to recent turns after compaction, so compaction does not
+# run again on the very next turn
+HISTORY_KEEP_RATIO = float(os.getenv("HISTORY_KEEP_RATIO", "0.5"))
+# Turns always kept verbatim
+HISTORY_MIN_TURNS = int(os.getenv("HISTORY_MIN_TURNS", "2"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "500"))
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-4o-mini")
+
+SUMMARY_PROMPT = (
+    "You maintain the running summary of a conversation between a user and an assistant that "
+    "gives weather information and travel advisories and processes investments. Merge the "
+    "previous summary and the new turns into one concise summary. Keep every name, city, "
+    "country, amount, payment mode, wire ID, date and unfinished request."
+)
+
+
+class Turn:
+    def __init__(self, user, assistant):
+        self.user = user
+        self.assistant = assistant
+        self.tokens = count_tokens(user) + count_tokens(assistant)
+
+
+def _summary_request(previous_summary, turns):
+    lines = [f"Previous summary:\n{previous_summary or '(none)'}", "New turns:"]
+    for turn in turns:
+        lines.append(f"User: {turn.user}\nAssistant: {turn.assistant}")
+    return [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": "\n\n".join(lines)},
+    ]
+
+
+def summarize_with_openai(previous_summary, turns, client=None):
+    import openai
+    response = (client or openai.OpenAI()).chat.completions.create(
+        model=SUMMARY_MODEL, messages=_summary_request(previous_summary, turns), max_tokens=SUMMARY_MAX_TOKENS
+    )
+    return response.choices[0].message.content
+
+
+async def asummarize_with_openai(previous_summary, turns, client=None):
+    import openai
+    response = await (client or openai.AsyncOpenAI()).chat.completions.create(
+        model=SUMMARY_MODEL, messages=_summary_request(previous_summary, turns), max_tokens=SUMMARY_MAX_TOKENS
+    )
+    return response.choices[0].message.content
+
+
+# Used when the summarizer fails: the turns' opening lines, appended to the old summary
+def fallback_summary(previous_summary, turns):
+    lines = [previous_summary] if previous_summary else []
+    lines += [f"User asked: {turn.user[:200]} / Assistant: {turn.assistant[:200]}" for turn in turns]
+    return "\n".join(lines)
+
+
+class ConversationMemory:
+    def __init__(self, token_budget=HISTORY_TOKEN_BUDGET, keep_ratio=HISTORY_KEEP_RATIO,
+                 min_turns=HISTORY_MIN_TURNS, summary_max_tokens=SUMMARY_MAX_TOKENS):
+        self.token_budget = token_budget
+        self.keep_ratio = keep_ratio
+        self.min_turns = min_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.summary = ""
+        self.summary_tokens = 0
+        self.turns = []
+        self.turn_count = 0
+        self.tokens_seen = 0
+        self.tokens_summarized = 0
+        self.compactions = 0
+        self.summary_failures = 0
+        self.threads = 0
+        self._lock = threading.Lock()
+
+    @property
+    def window_tokens(self):
+        return self.summary_tokens + sum(turn.tokens for turn in self.turns)
+
+    def add_turn(self, user, assistant):
+        turn = Turn(user, assistant)
+        with self._lock:
+            self.turns.append(turn)
+            self.turn_count += 1
+            self.tokens_seen += turn.tokens
+
+    def needs_compaction(self):
+        return self.window_tokens > self.token_budget and len(self.turns) > self.min_turns
+
+    # Oldest turns that have to go so the rest fits in keep_ratio of the budget
+    def _turns_to_fold(self):
+        keep_tokens = self.token_budget * self.keep_ratio - self.summary_max_tokens
+        kept, tokens = 0, 0
+        for turn in reversed(self.turns):
+            if kept >= self.min_turns and tokens + turn.tokens > keep_tokens:
+                break
+            kept += 1
+            tokens += turn.tokens
+        return self.turns[:len(self.turns) - kept]
+
+    def _apply_summary(self, folded, summary):
+        summary = truncate_to_tokens(summary, self.summary_max_tokens)
+        with self._lock:
+            self.turns = self.turns[len(folded):]
+            self.summary = summary
+            self.summary_tokens = count_tokens(summary) if summary else 0
+            self.tokens_summarized += sum(turn.tokens for turn in folded)
+            self.compactions += 1
+
+    def compact(self, summarize=summarize_with_openai):
+        folded = self._turns_to_fold()
+        if not folded:
+            return False
+        try:
+            summary = summarize(self.summary, folded)
+        except Exception:
+            self.summary_failures += 1
+            summary = fallback_summary(self.summary, folded)
+        self._apply_summary(folded, summary)
+        return True
+
+    async def acompact(self, asummarize=asummarize_with_openai):
+        folded = self._turns_to_fold()
+        if not folded:
+            return False
+        try:
+            summary = await asummarize(self.summary, folded)
+        except Exception:
+            self.summary_failures += 1
+            summary = fallback_summary(self.summary, folded)
+        self._apply_summary(folded, summary)
+        return True
+
+    def thread_started(self):
+        with self._lock:
+            self.threads += 1
+
+    # Seed messages for a new Assistants thread carrying the compacted history
+    def thread_messages(self):
+        messages = []
+        if self.summary:
+            messages.append({"role": "user", "content": f"Summary of our conversation so far:\n{self.summary}"})
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn.user})
+            messages.append({"role": "assistant", "content": turn.assistant})
+        return messages
+
+    # chat_history for the LangChain agent
+    def langchain_messages(self):
+        from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+        messages = []
+        if self.summary:
+            messages.append(SystemMessage(content=f"Summary of the conversation so far:\n{self.summary}"))
+        for turn in self.turns:
+            messages.append(HumanMessage(content=turn.user))
+            messages.append(AIMessage(content=turn.assistant))
+        return messages
+
+    def stats(self):
+        with self._lock:
+            return {
+                "turns": self.turn_count,
+                "window_turns": len(self.turns),
+                "window_tokens": self.window_tokens,
+                "summary_tokens": self.summary_tokens,
+                "tokens_seen": self.tokens_seen,
+                "tokens_summarized": self.tokens_summarized,
+                "compactions": self.compactions,
+                "summary_failures": self.summary_failures,
+                "threads": self.threads,
+            }
@@ -0,0 +1,57 @@
+# Loading and splitting the PDFs in docs/. Parsing is CPU-bound, so files are spread over a
+# process pool and each file's chunks are handed back as soon as that file is done. A file is
+# always loaded and split whole inside one worker, so start_index is the offset into its own
+# document exactly as with serial loading.
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import UnstructuredFileLoader
+
+# Files parsed at the same time per worker; bounds how many finished files wait in memory
+FILES_IN_FLIGHT_PER_WORKER = 2
+
+
+def text_splitter(chunk_size=500, chunk_overlap=50):
+    return RecursiveCharacterTextSplitter(
+
+    length_function=len,
+    add_start_index=True,
+    chunk_size=chunk_size,
+    chunk_overlap=chunk_overlap,
+    )
+
+
+def load_file(path):
+    return UnstructuredFileLoader(path).load()
+
+
+# Runs in a worker process
+def load_and_split(path, chunk_size=500, chunk_overlap=50):
+    return path, text_splitter(chunk_size, chunk_overlap).split_documents(load_file(path))
+
+
+# Yield (path, chunks) per file, in the order the files finish. Biggest files are started
+# first so one large PDF does not keep a worker busy after the others have run dry.
+def iter_chunks(paths, workers=None, chunk_size=500, chunk_overlap=50):
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for path in paths:
+            yield load_and_split(path, chunk_size, chunk_overlap)
+        return
+
+    # Smallest first in the list, so pop() hands out the biggest
+    pending_paths = sorted(paths, key=os.path.getsize)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        try:
+            while pending_paths or in_flight:
+                while pending_paths and len(in_flight) < workers * FILES_IN_FLIGHT_PER_WORKER:
+                    in_flight.add(pool.submit(load_and_split, pending_paths.pop(), chunk_size, chunk_overlap))
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in in_flight:
+                future.cancel()
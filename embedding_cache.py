@@ -0,0 +1,166 @@
+# Persistent embedding cache keyed by model name and the hash of the normalized text.
+# An in-memory LRU sits in front of a local SQLite file, so repeated questions and unchanged
+# document chunks are only ever embedded once. Query embedding in main.py and document
+# embedding in generate_vector_embeddings.py share the same file.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from cache import LRUCache
+from tracing import record_cache
+
+# Load environment variables
+load_dotenv()
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".embedding_cache.sqlite3")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+
+# SQLite limits the number of parameters in one statement
+SQLITE_BATCH = 500
+
+
+# Case, Unicode form and whitespace don't change what a text means
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+def embedding_key(model, text):
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode()).hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), SQLITE_BATCH):
+                batch = keys[i:i + SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model, items):
+        rows = [(key, model, len(vector), np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, underlying, store=None, memory_size=EMBEDDING_CACHE_SIZE, model=None):
+        self.underlying = underlying
+        self.model = model or getattr(underlying, "model", type(underlying).__name__)
+        self.store = store or EmbeddingStore()
+        self.memory = LRUCache(maxsize=memory_size, single_flight=False)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    # Split texts into cached vectors and the unique texts that still have to be embedded
+    def _lookup(self, texts):
+        keys = [embedding_key(self.model, text) for text in texts]
+        vectors = {}
+        for key in set(keys):
+            vector = self.memory.get(key)
+            if vector is not None:
+                vectors[key] = vector
+        memory_hits = len(vectors)
+
+        remaining = [key for key in set(keys) if key not in vectors]
+        if remaining:
+            for key, vector in self.store.get_many(remaining).items():
+                vectors[key] = vector
+                self.memory.set(key, vector)
+        disk_hits = len(vectors) - memory_hits
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        with self._stats_lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += disk_hits
+            self.misses += len(missing)
+        record_cache("embedding", hits=memory_hits + disk_hits, misses=len(missing))
+        return keys, vectors, missing
+
+    def _remember(self, missing, embedded, vectors):
+        items = list(zip(missing.keys(), embedded))
+        for key, vector in items:
+            vectors[key] = vector
+            self.memory.set(key, vector)
+        if items:
+            self.store.put_many(self.model, items)
+
+    def embed_documents(self, texts):
+        keys, vectors, missing = self._lookup(texts)
+        if missing:
+            self._remember(missing, self.underlying.embed_documents(list(missing.values())), vectors)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        keys, vectors, missing = self._lookup([text])
+        if missing:
+            self._remember(missing, [self.underlying.embed_query(text)], vectors)
+        return vectors[keys[0]]
+
+    async def aembed_documents(self, texts):
+        keys, vectors, missing = self._lookup(texts)
+        if missing:
+            self._remember(missing, await self.underlying.aembed_documents(list(missing.values())), vectors)
+        return [vectors[key] for key in keys]
+
+    async def aembed_query(self, text):
+        keys, vectors, missing = self._lookup([text])
+        if missing:
+            self._remember(missing, [await self.underlying.aembed_query(text)], vectors)
+        return vectors[keys[0]]
+
+    def stats(self):
+        with self._stats_lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "model": self.model,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_size": len(self.memory),
+            }
+
+
+# OpenAI embeddings behind the shared cache
+def cached_openai_embeddings(**kwargs):
+    from langchain_openai import OpenAIEmbeddings
+    return CachedEmbeddings(OpenAIEmbeddings(**kwargs))
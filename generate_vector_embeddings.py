@@ -1,73 +1,195 @@
 # Create vector embeddings and store them in a postgres vector database using openai
 
-from langchain_community.document_loaders import DirectoryLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-from langchain_openai import OpenAIEmbeddings
 from typing import List
 from langchain_postgres.vectorstores import PGVector
+from embedding_cache import cached_openai_embeddings
+from ingest_manifest import IngestManifest
+from ingest_pipeline import IngestPipeline
+from document_loading import iter_chunks
+from collection_config import get_collection, get_collections, record_ingest
+from pathlib import Path
+import argparse
+import hashlib
 import openai
 from dotenv import load_dotenv
 import os
 
-# TODO:make multiple identifiable collections
-
 # Load environment variables
 load_dotenv()
 
-# Set OpenAI API key 
+# Set OpenAI API key
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
-# Set the path to the docs
-DATA_PATH = "docs/"
+# The document sets and the pgvector collections they go to are configured in
+# collection_config.py; by default docs/*.pdf goes to "vectorstore"
 CONNECTION_STRING = os.getenv('PGVECTOR_CONNECTION_STRING')
-COLLECTION_NAME = "vectorstore" 
-
-
-def main():
-    generate_data_store()
-
 
-def generate_data_store():
-    documents = load_documents()
-    chunks = split_text(documents)
-    save_to_pgvector(chunks)
+# Incremental ingestion keeps track of what it wrote here
+MANIFEST_PATH = os.getenv('INGEST_MANIFEST_PATH', '.ingest_manifest.sqlite3')
 
 
-def load_documents():
-    loader = DirectoryLoader(DATA_PATH, glob="*.pdf")
-    documents = loader.load()
-    return documents
+def main():
+    parser = argparse.ArgumentParser(description="Embed each configured document collection into pgvector")
+    parser.add_argument("--collection", action="append",
+                        help="Only ingest this collection (repeatable; default: all configured collections)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only embed new or changed chunks, delete chunks of removed files, and resume "
+                             "an interrupted run")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Processes that load and split PDFs (1 loads them in this process)")
+    args = parser.parse_args()
+
+    collections = [get_collection(name) for name in args.collection] if args.collection else get_collections()
+    for collection in collections:
+        print(f"Collection {collection.name}: {collection.path}{collection.glob}")
+        if args.incremental:
+            changed = generate_data_store_incremental(collection, args.workers)
+        else:
+            changed = generate_data_store(collection, args.workers)
+        if changed:
+            record_ingest(collection.name)
+
+
+# Files are loaded and split on a process pool, then embedded and written as a stream, see
+# document_loading.py and ingest_pipeline.py
+def generate_data_store(collection, workers=None):
+    pipeline = IngestPipeline(
+        embeddings=cached_openai_embeddings(),
+        vector_store=get_pgvector_store(collection),
+    )
+    paths = list_documents(collection)
+    stats = pipeline.run(
+        chunks for _, chunks in iter_chunks(paths, workers, collection.chunk_size, collection.chunk_overlap)
+    )
+    rate = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+    print(f"Split {len(paths)} documents into {stats['chunks']} chunks.")
+    print(f"Saved {stats['rows']} chunks to the PostgreSQL database ({rate:.1f} chunks/sec).")
+    return stats["rows"] > 0
+
+
+def get_pgvector_store(collection):
+    return PGVector(
+        embeddings=cached_openai_embeddings(),
+        connection=CONNECTION_STRING,
+        collection_name=collection.name,
+        collection_metadata={"path": collection.path, "description": collection.description},
+        use_jsonb=True,
+    )
 
 
+def generate_data_store_incremental(collection, workers=None):
+    manifest = IngestManifest(MANIFEST_PATH, collection.name)
+    vector_store = get_pgvector_store(collection)
+
+    paths = list_documents(collection)
+    removed = sorted(manifest.paths() - set(paths))
+    for path in removed:
+        remove_document(path, manifest, vector_store)
+
+    # Changing the chunking parameters re-splits every file; chunks that come out the same
+    # keep their ids and are not embedded again
+    params = f"{collection.chunk_size}/{collection.chunk_overlap}"
+    changed = {}
+    for path in paths:
+        content_hash = f"{file_hash(path)}:{params}"
+        if not manifest.is_done(path, content_hash):
+            changed[path] = content_hash
+
+    chunked = iter_chunks(list(changed), workers, collection.chunk_size, collection.chunk_overlap)
+    ingest_documents(
+        collection.name,
+        ((path, changed[path], chunks) for path, chunks in chunked),
+        manifest,
+        vector_store,
+        cached_openai_embeddings(),
+    )
 
-def split_text(documents: List[Document]):
-    text_splitter = RecursiveCharacterTextSplitter(
-        
-    length_function=len,
-    add_start_index=True,
-    chunk_size=500,
-    chunk_overlap=50,
+    print(f"{len(paths) - len(changed)} of {len(paths)} documents unchanged.")
+    manifest.close()
+    return bool(changed or removed)
+
+
+# Same files, and the same "source" metadata, as DirectoryLoader(collection.path, glob=collection.glob)
+def list_documents(collection):
+    return sorted(str(path) for path in Path(collection.path).glob(collection.glob))
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Ids derived from the chunk text and its position, so a chunk keeps its id only while both are
+# unchanged. A chunk that moves (text inserted above it) gets a new id and is written again with
+# its new start_index, which retrieval relies on to merge neighbouring passages.
+def chunk_ids(collection_name, chunks: List[Document]):
+    ids = []
+    for chunk in chunks:
+        source = chunk.metadata.get("source", "")
+        start_index = chunk.metadata.get("start_index", "")
+        digest = hashlib.sha256(
+            f"{collection_name}\0{source}\0{start_index}\0{chunk.page_content}".encode()
+        ).hexdigest()
+        ids.append(digest)
+    return ids
+
+
+# documents yields (path, content_hash, chunks) for each new or changed file. Only the chunks
+# not written yet go through the ingest pipeline, under their chunk ids, and every batch the
+# pipeline writes is checkpointed in the manifest. Chunks the files no longer have are deleted,
+# and the files marked done, once all new chunks are in.
+def ingest_documents(collection_name, documents, manifest, vector_store, embeddings, **pipeline_options):
+    files = []
+    # Path of every chunk in flight, by chunk id
+    owners = {}
+
+    def new_chunks():
+        for path, content_hash, chunks in documents:
+            ids = chunk_ids(collection_name, chunks)
+            manifest.start_file(path, content_hash)
+            # Chunks already written, by an earlier version of the file or by an interrupted run
+            existing = manifest.chunk_ids(path)
+            fresh = [(chunk_id, chunk) for chunk_id, chunk in zip(ids, chunks) if chunk_id not in existing]
+            for chunk_id, _ in fresh:
+                owners[chunk_id] = path
+            files.append((path, content_hash, existing - set(ids), len(fresh)))
+            yield [chunk for _, chunk in fresh]
+
+    def checkpoint(ids):
+        written = {}
+        for chunk_id in ids:
+            written.setdefault(owners.pop(chunk_id), []).append(chunk_id)
+        for path, path_ids in written.items():
+            manifest.add_chunks(path, path_ids)
+
+    pipeline = IngestPipeline(
+        embeddings=embeddings,
+        vector_store=vector_store,
+        chunk_id=lambda chunk: chunk_ids(collection_name, [chunk])[0],
+        on_write=checkpoint,
+        **pipeline_options,
     )
-    chunks = text_splitter.split_documents(documents)
-    print(f"Split {len(documents)} documents into {len(chunks)} chunks.")
-    return chunks
+    pipeline.run(new_chunks())
 
+    for path, content_hash, stale, added in files:
+        if stale:
+            vector_store.delete(ids=list(stale))
+            manifest.remove_chunks(stale)
+        manifest.finish_file(path, content_hash)
+        print(f"{path}: added {added} chunks, removed {len(stale)} chunks.")
 
-def save_to_pgvector(chunks: List[Document]):   
-    vector_store = PGVector.from_documents(
-                embedding=OpenAIEmbeddings(),
-                documents=chunks,
-                connection=CONNECTION_STRING,
-                collection_name=COLLECTION_NAME,
-                use_jsonb=True,
-                async_mode=False,
-            )
 
-    print(f"Saved {len(chunks)} chunks to the PostgreSQL database.")
-    return vector_store
+def remove_document(path, manifest, vector_store):
+    stale = manifest.chunk_ids(path)
+    if stale:
+        vector_store.delete(ids=list(stale))
+    manifest.remove_file(path)
+    print(f"{path}: removed, deleted {len(stale)} chunks.")
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,283 @@
+# Shared HTTP client for every outbound tool call: pooled keep-alive connections, connect/read
+# timeouts, bounded retries with jittered backoff on 429/5xx, a circuit breaker per endpoint,
+# and per-endpoint timing.
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from tool_registry import ToolStats
+from tracing import current_span, span
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.2"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "2"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+
+# Stops calling an endpoint after too many consecutive failures, then lets a single
+# trial request through once reset_timeout has passed
+class CircuitBreaker:
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+class HttpClient:
+    def __init__(self, connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 pool_size=HTTP_POOL_SIZE, max_retries=HTTP_MAX_RETRIES,
+                 backoff_base=HTTP_BACKOFF_BASE, backoff_max=HTTP_BACKOFF_MAX,
+                 failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.pool_size = pool_size
+        self.session = self._make_session()
+
+        self._breakers = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    # One session keeps connections alive between calls; retries are handled here, not by urllib3
+    def _make_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _endpoint_state(self, endpoint):
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._stats[endpoint] = ToolStats()
+            return self._breakers[endpoint], self._stats[endpoint]
+
+    # Full jitter: sleep a random amount up to the exponential backoff for this attempt
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    # Send a request with retries. Returns the last response, which may still be a 429/5xx
+    # once retries run out; raises requests exceptions for connection errors and timeouts,
+    # and CircuitOpenError while the endpoint's circuit is open.
+    def request(self, method, url, endpoint=None, timeout=None, **kwargs):
+        endpoint = endpoint or urlsplit(url).netloc + urlsplit(url).path
+        with span(f"http.{endpoint}", method=method) as request_span:
+            response = self._request(method, url, endpoint, timeout, **kwargs)
+            request_span.set(status=response.status_code)
+            return response
+
+    def _request(self, method, url, endpoint, timeout, **kwargs):
+        breaker, stats = self._endpoint_state(endpoint)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {endpoint}, not calling it for now")
+
+        # Any other exception counts as a failure too, so a half-open trial is always released
+        recorded = False
+        try:
+            attempt = 0
+            while True:
+                start = time.perf_counter()
+                response = None
+                error = None
+                try:
+                    response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+                failed = error is not None or response.status_code in RETRY_STATUSES
+                with self._lock:
+                    stats.observe(time.perf_counter() - start, failed)
+
+                if not failed:
+                    breaker.record_success()
+                    recorded = True
+                    return response
+                if attempt >= self.max_retries:
+                    breaker.record_failure()
+                    recorded = True
+                    if error is not None:
+                        raise error
+                    return response
+                time.sleep(self._backoff(attempt, response))
+                attempt += 1
+                current_span().add("retries")
+        finally:
+            if not recorded:
+                breaker.record_failure()
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    # Per-endpoint call counts, failures, latency histograms and circuit state
+    def stats(self):
+        with self._lock:
+            report = {}
+            for endpoint, stats in self._stats.items():
+                report[endpoint] = stats.as_dict()
+                report[endpoint]["circuit"] = self._breakers[endpoint].state
+            return report
+
+    def close(self):
+        self.session.close()
+
+
+# Fully read response of an AsyncHttpClient request, shaped like the parts of requests.Response the tools use
+class AsyncResponse:
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+# asyncio counterpart of HttpClient on aiohttp, with the same retry, circuit breaker and timing behaviour
+class AsyncHttpClient(HttpClient):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # aiohttp sessions belong to an event loop, so each loop gets its own, opened on first use
+        self._sessions = weakref.WeakKeyDictionary()
+
+    def _make_session(self):
+        return None
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            session = self._sessions[loop] = aiohttp.ClientSession(connector=connector)
+        return session
+
+    async def request(self, method, url, endpoint=None, timeout=None, **kwargs):
+        endpoint = endpoint or urlsplit(url).netloc + urlsplit(url).path
+        with span(f"http.{endpoint}", method=method) as request_span:
+            response = await self._request(method, url, endpoint, timeout, **kwargs)
+            request_span.set(status=response.status_code)
+            return response
+
+    async def _request(self, method, url, endpoint, timeout, **kwargs):
+        breaker, stats = self._endpoint_state(endpoint)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {endpoint}, not calling it for now")
+
+        connect_timeout, read_timeout = timeout or self.timeout
+        client_timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        # Any other exception (or cancellation) counts as a failure, releasing a half-open trial
+        recorded = False
+        try:
+            attempt = 0
+            while True:
+                start = time.perf_counter()
+                response = None
+                error = None
+                try:
+                    async with self._get_session().request(method, url, timeout=client_timeout, **kwargs) as raw:
+                        response = AsyncResponse(raw.status, raw.headers, await raw.read())
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = requests.ConnectionError(str(e) or type(e).__name__)
+                failed = error is not None or response.status_code in RETRY_STATUSES
+                with self._lock:
+                    stats.observe(time.perf_counter() - start, failed)
+
+                if not failed:
+                    breaker.record_success()
+                    recorded = True
+                    return response
+                if attempt >= self.max_retries:
+                    breaker.record_failure()
+                    recorded = True
+                    if error is not None:
+                        raise error
+                    return response
+                await asyncio.sleep(self._backoff(attempt, response))
+                attempt += 1
+                current_span().add("retries")
+        finally:
+            if not recorded:
+                breaker.record_failure()
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    # Close the running loop's session; call it before that loop is closed
+    async def close(self):
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+
+# Shared by every tool in the process
+http_client = HttpClient()
+async_http_client = AsyncHttpClient()
@@ -0,0 +1,92 @@
+# Manifest of what incremental ingestion has written to a collection: the content hash of
+# every source file and the ids of its chunks. Chunk ids are recorded batch by batch as
+# they are written, so an interrupted run resumes where it stopped. The ingest pipeline records
+# them from its writer thread, so every access takes the lock.
+
+import sqlite3
+import threading
+import time
+
+
+class IngestManifest:
+    def __init__(self, path, collection_name):
+        self.collection_name = collection_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                collection TEXT NOT NULL,
+                path TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (collection, path)
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                collection TEXT NOT NULL,
+                path TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (collection, chunk_id)
+            );
+            CREATE INDEX IF NOT EXISTS chunks_by_path ON chunks (collection, path);
+        """)
+        self._conn.commit()
+
+    def paths(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM files WHERE collection = ?", (self.collection_name,))
+            return {path for (path,) in rows}
+
+    # True when the file was completely ingested with exactly this content
+    def is_done(self, path, content_hash):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, status FROM files WHERE collection = ? AND path = ?",
+                (self.collection_name, path),
+            ).fetchone()
+        return row is not None and row == (content_hash, "done")
+
+    def start_file(self, path, content_hash):
+        self._set_file(path, content_hash, "pending")
+
+    def finish_file(self, path, content_hash):
+        self._set_file(path, content_hash, "done")
+
+    def _set_file(self, path, content_hash, status):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                (self.collection_name, path, content_hash, status, time.time()),
+            )
+
+    def chunk_ids(self, path):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE collection = ? AND path = ?", (self.collection_name, path)
+            )
+            return {chunk_id for (chunk_id,) in rows}
+
+    # Checkpoint: these chunks are in the vector store
+    def add_chunks(self, path, chunk_ids):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)",
+                [(self.collection_name, path, chunk_id) for chunk_id in chunk_ids],
+            )
+
+    def remove_chunks(self, chunk_ids):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE collection = ? AND chunk_id = ?",
+                [(self.collection_name, chunk_id) for chunk_id in chunk_ids],
+            )
+
+    def remove_file(self, path):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE collection = ? AND path = ?", (self.collection_name, path))
+            self._conn.execute("DELETE FROM files WHERE collection = ? AND path = ?", (self.collection_name, path))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,232 @@
+# Streaming ingestion pipeline: load -> split -> embed -> write, each stage on its own thread(s)
+# with a bounded queue in front of it, so memory stays flat and rows reach Postgres while later
+# files are still being parsed. Embedding runs in token-budgeted batches on a worker pool, paced
+# by a tokens-per-minute limiter, and rows are written with one bulk insert per batch.
+# chunk_id, if given, names each row; on_write is called with the ids (or chunks) of every batch
+# once it is written, so a caller can checkpoint its progress.
+
+import os
+import queue
+import random
+import threading
+import time
+
+import openai
+from dotenv import load_dotenv
+
+from tokens import count_tokens
+
+# Load environment variables
+load_dotenv()
+
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+# Tokens sent in one embeddings request, and inputs per request (the API allows 2048)
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "20000"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "512"))
+# Stay under the account's embedding rate limit; 0 disables pacing
+EMBED_TOKENS_PER_MINUTE = int(os.getenv("EMBED_TOKENS_PER_MINUTE", "1000000"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+# Rows per bulk insert
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "500"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+
+# Marks the end of a stage's input
+DONE = object()
+
+
+class TokenRateLimiter:
+    def __init__(self, tokens_per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.available = float(tokens_per_minute)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    # Block until the tokens fit in the budget. A request larger than a whole minute's
+    # budget waits for a full bucket instead of waiting forever.
+    def acquire(self, tokens):
+        if self.capacity <= 0:
+            return
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                wait = (tokens - self.available) / self.rate
+            self._sleep(wait)
+
+
+class PipelineError(RuntimeError):
+    pass
+
+
+class IngestPipeline:
+    def __init__(self, embeddings, vector_store, split=None, workers=EMBED_WORKERS,
+                 batch_tokens=EMBED_BATCH_TOKENS, batch_size=EMBED_BATCH_SIZE,
+                 tokens_per_minute=EMBED_TOKENS_PER_MINUTE, write_batch_size=WRITE_BATCH_SIZE,
+                 queue_size=PIPELINE_QUEUE_SIZE, chunk_id=None, on_write=None):
+        self.embeddings = embeddings
+        self.vector_store = vector_store
+        self.split = split
+        self.workers = workers
+        self.batch_tokens = batch_tokens
+        self.batch_size = batch_size
+        self.limiter = TokenRateLimiter(tokens_per_minute)
+        self.write_batch_size = write_batch_size
+        self.queue_size = queue_size
+        self.chunk_id = chunk_id
+        self.on_write = on_write
+        self._stop = threading.Event()
+        self._errors = []
+        self._stats_lock = threading.Lock()
+        self.stats = {"documents": 0, "chunks": 0, "tokens": 0, "embed_requests": 0,
+                      "rate_limited": 0, "inserts": 0, "rows": 0, "seconds": 0.0}
+
+    def _count(self, **amounts):
+        with self._stats_lock:
+            for name, amount in amounts.items():
+                self.stats[name] += amount
+
+    # Bounded put/get that give up once another stage has failed
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return DONE
+
+    def _stage(self, func, *args):
+        try:
+            func(*args)
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    # Load: each item from the source is the list of documents of one file
+    def _load(self, sources, out):
+        for documents in sources:
+            if self._stop.is_set() or not self._put(out, documents):
+                return
+            self._count(documents=len(documents))
+        self._put(out, DONE)
+
+    def _split(self, inp, out):
+        while (documents := self._get(inp)) is not DONE:
+            chunks = self.split(documents) if self.split else documents
+            if chunks and not self._put(out, chunks):
+                return
+        self._put(out, DONE)
+
+    # Group chunks into batches that fit both the token budget and the input limit
+    def _batch(self, inp, out):
+        batch, batch_tokens = [], 0
+        while (chunks := self._get(inp)) is not DONE:
+            for chunk in chunks:
+                tokens = count_tokens(chunk.page_content)
+                if batch and (batch_tokens + tokens > self.batch_tokens or len(batch) >= self.batch_size):
+                    if not self._put(out, (batch, batch_tokens)):
+                        return
+                    batch, batch_tokens = [], 0
+                batch.append(chunk)
+                batch_tokens += tokens
+        if batch:
+            self._put(out, (batch, batch_tokens))
+        for _ in range(self.workers):
+            self._put(out, DONE)
+
+    def _embed_batch(self, texts, tokens):
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            self.limiter.acquire(tokens)
+            try:
+                return self.embeddings.embed_documents(texts)
+            except openai.RateLimitError:
+                self._count(rate_limited=1)
+                if attempt == EMBED_MAX_RETRIES:
+                    raise
+                time.sleep(random.uniform(0, min(60, 2 ** attempt)))
+
+    def _embed(self, inp, out):
+        while (item := self._get(inp)) is not DONE:
+            chunks, tokens = item
+            vectors = self._embed_batch([chunk.page_content for chunk in chunks], tokens)
+            self._count(chunks=len(chunks), tokens=tokens, embed_requests=1)
+            if not self._put(out, list(zip(chunks, vectors))):
+                return
+        self._put(out, DONE)
+
+    def _write_rows(self, rows):
+        chunks = [chunk for chunk, _ in rows]
+        ids = [self.chunk_id(chunk) for chunk in chunks] if self.chunk_id else None
+        self.vector_store.add_embeddings(
+            texts=[chunk.page_content for chunk in chunks],
+            embeddings=[vector for _, vector in rows],
+            metadatas=[chunk.metadata for chunk in chunks],
+            ids=ids,
+        )
+        self._count(inserts=1, rows=len(rows))
+        if self.on_write:
+            self.on_write(ids if ids is not None else chunks)
+
+    def _write(self, inp):
+        pending = []
+        finished = 0
+        while finished < self.workers:
+            item = self._get(inp)
+            if item is DONE:
+                if self._stop.is_set():
+                    return
+                finished += 1
+                continue
+            pending.extend(item)
+            while len(pending) >= self.write_batch_size:
+                self._write_rows(pending[:self.write_batch_size])
+                pending = pending[self.write_batch_size:]
+        if pending:
+            self._write_rows(pending)
+
+    def run(self, sources):
+        start = time.perf_counter()
+        loaded = queue.Queue(self.queue_size)
+        split = queue.Queue(self.queue_size)
+        batches = queue.Queue(self.queue_size)
+        embedded = queue.Queue(self.queue_size)
+
+        threads = [
+            threading.Thread(target=self._stage, args=(self._load, sources, loaded), name="ingest-load"),
+            threading.Thread(target=self._stage, args=(self._split, loaded, split), name="ingest-split"),
+            threading.Thread(target=self._stage, args=(self._batch, split, batches), name="ingest-batch"),
+            threading.Thread(target=self._stage, args=(self._write, embedded), name="ingest-write"),
+        ]
+        threads += [
+            threading.Thread(target=self._stage, args=(self._embed, batches, embedded), name=f"ingest-embed-{i}")
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stats["seconds"] = time.perf_counter() - start
+        if self._errors:
+            raise PipelineError(f"Ingestion failed: {self._errors[0]!r}") from self._errors[0]
+        return self.stats
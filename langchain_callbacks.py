@@ -0,0 +1,65 @@
+# LangChain callbacks: spans for the agent's chains and LLM calls, and the answer's tokens passed
+# on as they are generated. Kept apart from tracing.py so that the Assistants entry points don't
+# import LangChain.
+
+from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackHandler
+
+from tracing import count, tracer
+
+
+# LLM calls and chains of the LangChain agent as spans; tools are traced by the registry
+class TracingCallbackHandler(BaseCallbackHandler):
+    def __init__(self, tracer=tracer):
+        self.tracer = tracer
+        self.spans = {}
+
+    def _start(self, run_id, parent_run_id, name, **attributes):
+        parent = self.spans.get(parent_run_id) if parent_run_id else None
+        self.spans[run_id] = self.tracer.start_span(name, parent=parent, **attributes)
+
+    def _end(self, run_id, error=None):
+        span = self.spans.pop(run_id, None)
+        if span is not None:
+            span.end(error)
+        return span
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "chain"
+        self._start(run_id, parent_run_id, f"langchain.chain.{name}")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "langchain.llm")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "langchain.llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self.spans.get(run_id)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if span is not None and usage:
+            span.set(prompt_tokens=usage.get("prompt_tokens", 0),
+                     completion_tokens=usage.get("completion_tokens", 0))
+            count("tokens_total", usage.get("prompt_tokens", 0), stage="langchain.llm", kind="prompt")
+            count("tokens_total", usage.get("completion_tokens", 0), stage="langchain.llm", kind="completion")
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+
+
+# Passes the agent's tokens on as they arrive, with the LLM call they belong to; the last call's
+# tokens are the answer
+class TokenCallbackHandler(AsyncCallbackHandler):
+    def __init__(self, on_delta):
+        self.on_delta = on_delta
+
+    async def on_llm_new_token(self, token, *, run_id=None, **kwargs):
+        if token:
+            await self.on_delta(token, run_id)
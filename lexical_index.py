@@ -0,0 +1,224 @@
+# In-process BM25 index over the chunks in the pgvector collections, for exact-term questions
+# (wire ids, product codes, policy numbers) that dense similarity misses. Postings are kept per
+# term in two parallel arrays (chunk number, term frequency), scored with numpy straight from
+# the array buffers. The index is loaded from Postgres on first use and then kept up to date
+# incrementally: a background refresh adds the chunks that ingestion wrote since and drops the
+# ones it deleted.
+
+import os
+import re
+import threading
+import time
+from array import array
+
+import numpy as np
+from dotenv import load_dotenv
+
+from lifecycle import get_engine
+
+# Load environment variables
+load_dotenv()
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+LEXICAL_REFRESH_SECONDS = float(os.getenv("LEXICAL_REFRESH_SECONDS", "300"))
+# Removed chunks stay in the postings until this share of the index is dead, then it is rebuilt
+LEXICAL_COMPACT_RATIO = float(os.getenv("LEXICAL_COMPACT_RATIO", "0.25"))
+LEXICAL_FETCH_BATCH = 1000
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_/.][a-z0-9]+)*")
+# Question words that say nothing about which chunk is relevant; they are indexed but not searched
+STOPWORDS = frozenset(
+    "a about an and are as at be by can could do does for from get how i in is it know like me my need "
+    "of on or our please so tell that the their there this to want was we what when where which who why "
+    "will with would you your".split()
+)
+
+
+# Words and codes; a code like "WX-2024-0173" is indexed whole and as its parts
+def tokenize(text):
+    tokens = []
+    for match in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(match)
+        parts = re.split(r"[-_/.]", match)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+# Tokens that look like ids or codes rather than words: they contain a digit
+def is_identifier(token):
+    return any(char.isdigit() for char in token) and len(token) >= 3
+
+
+class BM25Index:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self.terms = {}
+        self.postings = []
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self.lengths = array("I")
+        self.alive = bytearray()
+        self.numbers = {}
+        self.total_length = 0
+        self.dead = 0
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.numbers
+
+    def add(self, doc_id, content, metadata=None):
+        with self._lock:
+            if doc_id in self.numbers:
+                self.remove(doc_id)
+            number = len(self.ids)
+            tokens = tokenize(content)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                term = self.terms.get(token)
+                if term is None:
+                    term = self.terms[token] = len(self.postings)
+                    self.postings.append((array("I"), array("I")))
+                numbers, frequencies = self.postings[term]
+                numbers.append(number)
+                frequencies.append(count)
+            self.ids.append(doc_id)
+            self.texts.append(content)
+            self.metadatas.append(metadata or {})
+            self.lengths.append(len(tokens))
+            self.alive.append(1)
+            self.numbers[doc_id] = number
+            self.total_length += len(tokens)
+
+    def remove(self, doc_id):
+        with self._lock:
+            number = self.numbers.pop(doc_id, None)
+            if number is None:
+                return
+            self.alive[number] = 0
+            self.total_length -= self.lengths[number]
+            self.dead += 1
+            if self.dead > LEXICAL_COMPACT_RATIO * len(self.ids):
+                self.compact()
+
+    # Rebuild without the removed chunks
+    def compact(self):
+        with self._lock:
+            live = [(self.ids[n], self.texts[n], self.metadatas[n]) for n in range(len(self.ids)) if self.alive[n]]
+            self._clear()
+            for doc_id, content, metadata in live:
+                self.add(doc_id, content, metadata)
+
+    def _document(self, number):
+        from langchain_core.documents import Document
+        return Document(id=self.ids[number], page_content=self.texts[number], metadata=self.metadatas[number])
+
+    # [(Document, relevance)] for the k best BM25 matches, optionally only chunks whose metadata
+    # contains `filter`. Relevance (0..1) is the share of the question's term weight (idf) found in
+    # the chunk, so it doesn't depend on how the other hits scored: a chunk that only shares common
+    # words with the question stays low even when it ranks first. Terms no chunk contains weigh as
+    # much as the rarest ones.
+    def search(self, query_text, k=6, filter=None):
+        with self._lock:
+            count = len(self.numbers)
+            if not count:
+                return []
+            alive = np.frombuffer(self.alive, dtype=np.uint8).astype(np.float32)
+            lengths = np.frombuffer(self.lengths, dtype=np.uint32).astype(np.float32)
+            norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (self.total_length / count))
+            scores = np.zeros(len(self.ids), dtype=np.float32)
+            coverage = np.zeros(len(self.ids), dtype=np.float32)
+            weight = 0.0
+            for token in set(tokenize(query_text)) - STOPWORDS:
+                term = self.terms.get(token)
+                matching = 0
+                if term is not None:
+                    numbers, frequencies = self.postings[term]
+                    numbers = np.frombuffer(numbers, dtype=np.uint32)
+                    frequencies = np.frombuffer(frequencies, dtype=np.uint32).astype(np.float32)
+                    matching = alive[numbers].sum()
+                idf = np.log(1 + (count - matching + 0.5) / (matching + 0.5))
+                weight += idf
+                if not matching:
+                    continue
+                scores[numbers] += idf * frequencies * (BM25_K1 + 1) / (frequencies + norms[numbers])
+                coverage[numbers] += idf
+            scores *= alive
+
+            candidates = np.flatnonzero(scores)
+            if filter:
+                candidates = [
+                    n for n in candidates
+                    if all(self.metadatas[n].get(key) == value for key, value in filter.items())
+                ]
+                candidates = np.asarray(candidates, dtype=np.int64)
+            if not len(candidates):
+                return []
+            top = candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+            return [(self._document(n), float(coverage[n] / weight)) for n in top]
+
+
+# Bring the index in line with the collection in Postgres: fetch only chunks it doesn't have
+# yet and drop the ones that are gone
+def refresh_from_postgres(index, collection_name):
+    from sqlalchemy import text
+    with get_engine().connect() as conn:
+        stored = set(conn.execute(text(
+            "SELECT e.id FROM langchain_pg_embedding e JOIN langchain_pg_collection c "
+            "ON e.collection_id = c.uuid WHERE c.name = :collection"
+        ), {"collection": collection_name}).scalars())
+        missing = [doc_id for doc_id in stored if doc_id not in index]
+        for i in range(0, len(missing), LEXICAL_FETCH_BATCH):
+            rows = conn.execute(
+                text("SELECT id, document, cmetadata FROM langchain_pg_embedding WHERE id = ANY(:ids)"),
+                {"ids": missing[i:i + LEXICAL_FETCH_BATCH]},
+            )
+            for doc_id, content, metadata in rows:
+                index.add(doc_id, content or "", metadata)
+    for doc_id in [doc_id for doc_id in list(index.numbers) if doc_id not in stored]:
+        index.remove(doc_id)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+# One lock per collection, so loading one index doesn't hold up the others
+_load_locks = {}
+
+
+def _refresh_loop(index, collection_name):
+    while True:
+        time.sleep(LEXICAL_REFRESH_SECONDS)
+        try:
+            refresh_from_postgres(index, collection_name)
+        except Exception as e:
+            print(f"Lexical index refresh for {collection_name} failed: {e}")
+
+
+# The BM25 index of a collection, loaded once per process and refreshed in the background
+def get_lexical_index(collection_name):
+    index = _indexes.get(collection_name)
+    if index is not None:
+        return index
+    with _indexes_lock:
+        load_lock = _load_locks.setdefault(collection_name, threading.Lock())
+    with load_lock:
+        index = _indexes.get(collection_name)
+        if index is None:
+            index = BM25Index()
+            refresh_from_postgres(index, collection_name)
+            _indexes[collection_name] = index
+            if LEXICAL_REFRESH_SECONDS > 0:
+                threading.Thread(
+                    target=_refresh_loop, args=(index, collection_name), daemon=True,
+                    name=f"lexical-refresh-{collection_name}",
+                ).start()
+        return index
@@ -0,0 +1,227 @@
+# Long-lived resources, built once per process instead of per start or per query:
+# - the OpenAI module client, configured on first use
+# - the assistant, looked up by name and definition hash and its id cached on disk (and checked
+#   against the server once per process, so a deleted assistant is looked up or created again)
+# - the embeddings client and PGVector stores, sharing one SQLAlchemy connection pool
+# The libraries behind them (openai, langchain_postgres, SQLAlchemy) are imported when the
+# resource is first built, so importing an entry point stays cheap; prewarm.py builds them all
+# ahead of the first request.
+
+import hashlib
+import json
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from collection_config import DEFAULT_COLLECTION
+
+# Load environment variables
+load_dotenv()
+
+ASSISTANT_CACHE_PATH = os.getenv("ASSISTANT_CACHE_PATH", ".assistant_cache.json")
+PGVECTOR_POOL_SIZE = int(os.getenv("PGVECTOR_POOL_SIZE", "5"))
+PGVECTOR_MAX_OVERFLOW = int(os.getenv("PGVECTOR_MAX_OVERFLOW", "10"))
+COLLECTION_NAME = DEFAULT_COLLECTION
+
+_lock = threading.Lock()
+_openai = None
+_embeddings = None
+_engine = None
+_async_engine = None
+_vector_stores = {}
+_async_vector_stores = {}
+# (cache key, assistant id) pairs confirmed to exist on the server by this process
+_validated_assistants = set()
+
+
+# The openai module with the API key set, imported on first use
+def get_openai():
+    global _openai
+    with _lock:
+        if _openai is None:
+            import openai
+            openai.api_key = os.getenv("OPENAI_API_KEY")
+            _openai = openai
+        return _openai
+
+
+# Hash of everything that defines the assistant; a changed tool schema means a new assistant
+def definition_hash(definition=None):
+    from assistant_config import assistant_definition
+    definition = definition or assistant_definition()
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode()).hexdigest()[:16]
+
+
+# Assistant ids are only valid for the account (and server) they were created with
+def _cache_key(client, digest):
+    scope = f"{getattr(client, 'base_url', None)}|{getattr(client, 'api_key', None)}"
+    return f"{hashlib.sha256(scope.encode()).hexdigest()[:12]}:{digest}"
+
+
+def _read_assistant_cache():
+    try:
+        with open(ASSISTANT_CACHE_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_assistant_cache(cache):
+    tmp_path = f"{ASSISTANT_CACHE_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, ASSISTANT_CACHE_PATH)
+
+
+# Drop the cached id, e.g. after the assistant was deleted on the server
+def forget_assistant(client):
+    key = _cache_key(client, definition_hash())
+    cache = _read_assistant_cache()
+    assistant_id = cache.pop(key, None)
+    if assistant_id is not None:
+        _write_assistant_cache(cache)
+        _validated_assistants.discard((key, assistant_id))
+
+
+def _remember_assistant(key, assistant_id):
+    cache = _read_assistant_cache()
+    cache[key] = assistant_id
+    _write_assistant_cache(cache)
+    _validated_assistants.add((key, assistant_id))
+
+
+# Return the id of the assistant for the current definition: from the local cache (checked
+# against the server on its first use in the process), else an existing assistant with the same
+# name and hash, else a new one
+def get_or_create_assistant(client):
+    import openai
+    from assistant_config import ASSISTANT_NAME, assistant_definition
+    definition = assistant_definition()
+    digest = definition_hash(definition)
+    key = _cache_key(client, digest)
+
+    assistant_id = _read_assistant_cache().get(key)
+    if assistant_id:
+        if (key, assistant_id) in _validated_assistants:
+            return assistant_id
+        try:
+            client.beta.assistants.retrieve(assistant_id)
+            _validated_assistants.add((key, assistant_id))
+            return assistant_id
+        except openai.NotFoundError:
+            forget_assistant(client)
+
+    for assistant in client.beta.assistants.list(limit=100):
+        if assistant.name == ASSISTANT_NAME and (assistant.metadata or {}).get("definition_hash") == digest:
+            assistant_id = assistant.id
+            break
+    else:
+        assistant_id = client.beta.assistants.create(**definition, metadata={"definition_hash": digest}).id
+
+    _remember_assistant(key, assistant_id)
+    return assistant_id
+
+
+# Async counterpart of get_or_create_assistant
+async def aget_or_create_assistant(client):
+    import openai
+    from assistant_config import ASSISTANT_NAME, assistant_definition
+    definition = assistant_definition()
+    digest = definition_hash(definition)
+    key = _cache_key(client, digest)
+
+    assistant_id = _read_assistant_cache().get(key)
+    if assistant_id:
+        if (key, assistant_id) in _validated_assistants:
+            return assistant_id
+        try:
+            await client.beta.assistants.retrieve(assistant_id)
+            _validated_assistants.add((key, assistant_id))
+            return assistant_id
+        except openai.NotFoundError:
+            forget_assistant(client)
+
+    async for assistant in client.beta.assistants.list(limit=100):
+        if assistant.name == ASSISTANT_NAME and (assistant.metadata or {}).get("definition_hash") == digest:
+            assistant_id = assistant.id
+            break
+    else:
+        assistant_id = (await client.beta.assistants.create(**definition, metadata={"definition_hash": digest})).id
+
+    _remember_assistant(key, assistant_id)
+    return assistant_id
+
+
+# Query embeddings go through the persistent embedding cache
+def get_embeddings():
+    global _embeddings
+    with _lock:
+        if _embeddings is None:
+            from embedding_cache import cached_openai_embeddings
+            _embeddings = cached_openai_embeddings()
+        return _embeddings
+
+
+# One SQLAlchemy engine (and so one connection pool) for every store in the process
+def get_engine():
+    global _engine
+    with _lock:
+        if _engine is None:
+            from sqlalchemy import create_engine
+            _engine = create_engine(
+                os.getenv('PGVECTOR_CONNECTION_STRING'),
+                pool_size=PGVECTOR_POOL_SIZE,
+                max_overflow=PGVECTOR_MAX_OVERFLOW,
+                pool_pre_ping=True)
+        return _engine
+
+
+def get_async_engine():
+    global _async_engine
+    with _lock:
+        if _async_engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            _async_engine = create_async_engine(
+                os.getenv('PGVECTOR_CONNECTION_STRING'),
+                pool_size=PGVECTOR_POOL_SIZE,
+                max_overflow=PGVECTOR_MAX_OVERFLOW,
+                pool_pre_ping=True)
+        return _async_engine
+
+
+# The PGVector store for a collection, built (and its collection looked up) once per process
+def get_vector_store(collection_name=COLLECTION_NAME):
+    store = _vector_stores.get(collection_name)
+    if store is None:
+        embeddings = get_embeddings()
+        engine = get_engine()
+        with _lock:
+            store = _vector_stores.get(collection_name)
+            if store is None:
+                from langchain_postgres.vectorstores import PGVector
+                store = _vector_stores[collection_name] = PGVector(
+                    embeddings=embeddings,
+                    connection=engine,
+                    collection_name=collection_name,
+                    use_jsonb=True)
+    return store
+
+
+# Async store for the asyncio chat engine; it finishes its setup on first use
+def get_async_vector_store(collection_name=COLLECTION_NAME):
+    store = _async_vector_stores.get(collection_name)
+    if store is None:
+        embeddings = get_embeddings()
+        engine = get_async_engine()
+        with _lock:
+            store = _async_vector_stores.get(collection_name)
+            if store is None:
+                from langchain_postgres.vectorstores import PGVector
+                store = _async_vector_stores[collection_name] = PGVector(
+                    embeddings=embeddings,
+                    connection=engine,
+                    collection_name=collection_name,
+                    use_jsonb=True,
+                    async_mode=True)
+    return store
@@ -0,0 +1,127 @@
+# Build the process's long-lived resources before traffic arrives, so the first question doesn't
+# pay for imports, the assistant lookup, the tokenizer, the travel advisory index, the ledger,
+# TLS handshakes to Postgres, collection lookups, the BM25 indexes or the router's description
+# embeddings. Every step is best effort: a failure is reported and the resource is built again
+# on first use.
+#
+# Usage: python prewarm.py            (times each step; exits 1 if any failed)
+#        python main.py --prewarm, python main-using-langchain.py --prewarm,
+#        python chat_server.py --prewarm
+
+import argparse
+import contextlib
+import importlib
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from lifecycle import PGVECTOR_POOL_SIZE, get_embeddings, get_engine, get_openai, get_or_create_assistant
+from tracing import span
+
+# Load environment variables
+load_dotenv()
+
+
+def _step(timings, name, func, verbose):
+    start = time.perf_counter()
+    try:
+        with span(f"prewarm.{name}"):
+            func()
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}".splitlines()[0]
+    elapsed = time.perf_counter() - start
+    timings[name] = {"seconds": elapsed, "error": error}
+    if verbose:
+        print(f"prewarm {name:<32}{elapsed * 1000:>9.1f} ms" + (f"  FAILED {error}" if error else ""))
+
+
+async def _astep(timings, name, func, verbose):
+    start = time.perf_counter()
+    try:
+        with span(f"prewarm.{name}"):
+            await func()
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}".splitlines()[0]
+    elapsed = time.perf_counter() - start
+    timings[name] = {"seconds": elapsed, "error": error}
+    if verbose:
+        print(f"prewarm {name:<32}{elapsed * 1000:>9.1f} ms" + (f"  FAILED {error}" if error else ""))
+
+
+# Open pool_size connections at once so the pool holds that many ready connections afterwards
+def fill_pool(size=PGVECTOR_POOL_SIZE):
+    from sqlalchemy import text
+    engine = get_engine()
+    with contextlib.ExitStack() as stack:
+        connections = [stack.enter_context(engine.connect()) for _ in range(size)]
+        for connection in connections:
+            connection.execute(text("SELECT 1"))
+
+
+# Async counterpart of fill_pool for the asyncio engine; runs on the serving event loop
+async def afill_pool(size=PGVECTOR_POOL_SIZE):
+    import asyncio
+    from sqlalchemy import text
+    from lifecycle import get_async_engine
+    engine = get_async_engine()
+    async with contextlib.AsyncExitStack() as stack:
+        connections = await asyncio.gather(*(stack.enter_async_context(engine.connect()) for _ in range(size)))
+        for connection in connections:
+            await connection.execute(text("SELECT 1"))
+
+
+# Returns {step: {"seconds": ..., "error": ...}}. assistant=False skips the Assistants lookup (the
+# LangChain agent doesn't use it); retrieval=False skips everything that needs Postgres.
+def prewarm(assistant=True, retrieval=True, async_stores=False, verbose=True):
+    from collection_config import get_collections
+    from collection_router import get_router
+    from lexical_index import get_lexical_index
+    from lifecycle import get_async_vector_store, get_vector_store
+    from tokens import get_encoding
+
+    timings = {}
+    _step(timings, "openai", get_openai, verbose)
+    if assistant:
+        _step(timings, "assistant", lambda: get_or_create_assistant(get_openai()), verbose)
+    _step(timings, "tokenizer", get_encoding, verbose)
+    _step(timings, "tools", lambda: importlib.import_module("tools"), verbose)
+    _step(timings, "advisories", lambda: importlib.import_module("travel_advisories").get_advisory_index(), verbose)
+    _step(timings, "ledger", lambda: importlib.import_module("transactions").get_ledger(), verbose)
+    _step(timings, "embeddings", get_embeddings, verbose)
+    if retrieval:
+        _step(timings, "pgvector_pool", fill_pool, verbose)
+        for collection in get_collections():
+            name = collection.name
+            _step(timings, f"vector_store.{name}", lambda: get_vector_store(name), verbose)
+            if async_stores:
+                _step(timings, f"async_vector_store.{name}", lambda: get_async_vector_store(name), verbose)
+            _step(timings, f"lexical_index.{name}", lambda: get_lexical_index(name), verbose)
+        _step(timings, "router", get_router().description_vectors, verbose)
+    return timings
+
+
+# The steps that must run on the serving event loop, after prewarm(async_stores=True)
+async def aprewarm(verbose=True):
+    timings = {}
+    await _astep(timings, "async_pgvector_pool", afill_pool, verbose)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build clients, pools and caches ahead of traffic")
+    parser.add_argument("--no-assistant", action="store_true", help="Skip the Assistants lookup")
+    parser.add_argument("--no-retrieval", action="store_true", help="Skip Postgres and the indexes")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    timings = prewarm(assistant=not args.no_assistant, retrieval=not args.no_retrieval)
+    print(f"prewarm total{(time.perf_counter() - start) * 1000:>37.1f} ms")
+    if any(timing["error"] for timing in timings.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
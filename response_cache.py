@@ -0,0 +1,137 @@
+# Opt-in semantic cache of whole assistant answers. A question whose embedding is close enough
+# to one answered before (cosine similarity >= RESPONSE_CACHE_THRESHOLD, within the TTL) gets the
+# earlier answer straight away, without retrieval or a run. Only turns that opened a conversation,
+# retrieved context and called no tools are stored: their answers come from the knowledge base
+# alone, while follow-up questions depend on the conversation and tool results (weather,
+# investments) must be produced fresh every time. Re-ingesting any collection empties the cache.
+
+import os
+import threading
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from collection_config import INGEST_VERSIONS_PATH, read_ingest_versions
+from tracing import record_cache
+
+# Load environment variables
+load_dotenv()
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "false").lower() == "true"
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+
+
+def _unit(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticResponseCache:
+    def __init__(self, threshold=RESPONSE_CACHE_THRESHOLD, ttl=RESPONSE_CACHE_TTL, maxsize=RESPONSE_CACHE_SIZE,
+                 versions_path=INGEST_VERSIONS_PATH, clock=time.monotonic):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.versions_path = versions_path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._entries = []
+        self._versions_stamp = self._stamp()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # Cheap check for a re-ingest: the versions file's mtime and size
+    def _stamp(self):
+        try:
+            stat = os.stat(self.versions_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _check_versions(self):
+        stamp = self._stamp()
+        if stamp != self._versions_stamp:
+            self._versions_stamp = stamp
+            if self._entries:
+                self.invalidations += 1
+            self._vectors = None
+            self._entries = []
+
+    def _drop(self, keep):
+        self._entries = [entry for entry, kept in zip(self._entries, keep) if kept]
+        self._vectors = self._vectors[np.asarray(keep, dtype=bool)] if self._entries else None
+
+    def lookup(self, embedding):
+        answer = self._find(embedding)
+        record_cache("response", hits=int(answer is not None), misses=int(answer is None))
+        return answer
+
+    def _find(self, embedding):
+        with self._lock:
+            self._check_versions()
+            if not self._entries:
+                self.misses += 1
+                return None
+            now = self._clock()
+            expired = [now - entry["stored_at"] > self.ttl for entry in self._entries]
+            if any(expired):
+                self.expirations += sum(expired)
+                self._drop([not flag for flag in expired])
+                if not self._entries:
+                    self.misses += 1
+                    return None
+            similarities = self._vectors @ _unit(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._entries[best]["answer"]
+
+    def store(self, embedding, question, answer):
+        with self._lock:
+            self._check_versions()
+            vector = _unit(embedding)[None, :]
+            self._entries.append({"question": question, "answer": answer, "stored_at": self._clock()})
+            self._vectors = vector if self._vectors is None else np.vstack([self._vectors, vector])
+            if len(self._entries) > self.maxsize:
+                self._drop([False] * (len(self._entries) - self.maxsize) + [True] * self.maxsize)
+
+    def clear(self):
+        with self._lock:
+            self._vectors = None
+            self._entries = []
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "versions": read_ingest_versions(self.versions_path),
+            }
+
+
+# Records whether a run called any tools, by wrapping its (coroutine) tool handler
+class AsyncToolUseTracker:
+    def __init__(self, handle_tool_calls):
+        self.handle_tool_calls = handle_tool_calls
+        self.used = False
+
+    async def __call__(self, tool_calls):
+        self.used = True
+        return await self.handle_tool_calls(tool_calls)
+
+
+response_cache = SemanticResponseCache() if RESPONSE_CACHE_ENABLED else None
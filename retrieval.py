@@ -0,0 +1,286 @@
+# Knowledge base retrieval from the pgvector collection written by generate_vector_embeddings.py
+
+import asyncio
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from collection_config import get_collections
+from collection_router import get_router
+from lexical_index import get_lexical_index, is_identifier, tokenize
+from lifecycle import PGVECTOR_POOL_SIZE, get_embeddings
+from tokens import count_tokens, truncate_to_tokens
+from tracing import in_current_context, span
+
+# Load environment variables
+load_dotenv()
+
+# Most tokens of retrieved text added to a turn
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+# Chunks scoring below this relevance (0..1) are left out: cosine relevance for chunks the vector
+# search found, the share of the question's term weight they contain for BM25-only ones
+CONTEXT_MIN_SCORE = float(os.getenv("CONTEXT_MIN_SCORE", "0.7"))
+# Chunks of the same source this close together (in characters) are merged into one passage;
+# the splitter drops the whitespace it split on, so neighbours are rarely exactly adjacent
+CONTEXT_MERGE_GAP = int(os.getenv("CONTEXT_MERGE_GAP", "4"))
+# Collections searched at the same time when a question is routed to several
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+
+# Search the BM25 index next to the vector index and fuse the two rankings
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+# Reciprocal-rank fusion constant: score = sum of 1 / (RRF_K + rank) over both rankings
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Answer from the BM25 index alone, without embedding the question, when the question names an
+# id or code and the best lexical hit contains all of them and beats the runner-up by this factor
+LEXICAL_FAST_PATH_RATIO = float(os.getenv("LEXICAL_FAST_PATH_RATIO", "1.5"))
+
+_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+
+# Best k over all searched collections; scores are cosine relevance in every collection
+def merge_results(result_lists, k=6):
+    merged = [result for results in result_lists for result in results]
+    return sorted(merged, key=lambda result: result[1], reverse=True)[:k]
+
+
+# Nearest chunks through the ANN index in the collections the router picks (or the ones given),
+# optionally limited by metadata, e.g. {"source": "docs/a.pdf"}
+def dense_search(query_text: str, filter=None, collections=None, k=6):
+    from vector_index import search
+    with span("embedding"):
+        embedding = get_embeddings().embed_query(query_text)
+    names = collections or get_router().route(query_text, embedding)
+    if len(names) == 1:
+        return search(embedding, k=k, collection_name=names[0], filter=filter)
+    search_one = in_current_context(lambda name: search(embedding, k=k, collection_name=name, filter=filter))
+    return merge_results(_executor.map(search_one, names), k=k)
+
+
+async def adense_search(query_text: str, filter=None, collections=None, k=6):
+    from vector_index import asearch
+    with span("embedding"):
+        embedding = await get_embeddings().aembed_query(query_text)
+    names = collections or await get_router().aroute(query_text, embedding)
+    result_lists = await asyncio.gather(
+        *(asearch(embedding, k=k, collection_name=name, filter=filter) for name in names)
+    )
+    return merge_results(result_lists, k=k)
+
+
+# BM25 hits as (Document, relevance), relevance being the share of the question's term weight
+# the chunk contains (see BM25Index.search), or 1.0 for a chunk containing every id or code the
+# question names. Lexical search is cheap, so it covers every collection unless the text alone
+# says which ones to search.
+def lexical_search(query_text: str, filter=None, collections=None, k=6):
+    names = collections or get_router().route_without_embeddings(query_text)
+    names = names or [collection.name for collection in get_collections()]
+    hits = []
+    with span("lexical", collections=len(names)):
+        for name in names:
+            hits += get_lexical_index(name).search(query_text, k, filter)
+    identifiers = _identifiers(query_text)
+    if identifiers:
+        hits = [
+            (doc, 1.0 if identifiers <= set(tokenize(doc.page_content)) else score) for doc, score in hits
+        ]
+    return merge_results([hits], k=k)
+
+
+def _identifiers(query_text):
+    return {token for token in tokenize(query_text) if is_identifier(token)}
+
+
+def confident_lexical(query_text, hits, ratio=LEXICAL_FAST_PATH_RATIO):
+    identifiers = _identifiers(query_text)
+    if not identifiers or not hits:
+        return False
+    if not identifiers <= set(tokenize(hits[0][0].page_content)):
+        return False
+    return len(hits) == 1 or hits[1][1] * ratio <= hits[0][1]
+
+
+# Reciprocal-rank fusion of the dense and lexical rankings. The fusion only orders the chunks: a
+# chunk the vector search found keeps its cosine relevance and one found only by BM25 keeps its
+# lexical relevance, so pack_context's cutoff means the same whatever rank a chunk got.
+def fuse_results(dense, lexical, k=6):
+    fused = {}
+    for results in (dense, lexical):
+        for rank, (doc, score) in enumerate(results, start=1):
+            key = doc.id or doc.page_content
+            rrf, first_doc, first_score = fused.get(key, (0.0, doc, score))
+            fused[key] = (rrf + 1 / (RRF_K + rank), first_doc, first_score)
+    ranked = sorted(fused.values(), key=lambda item: item[0], reverse=True)[:k]
+    return [(doc, score) for _, doc, score in ranked]
+
+
+# Hybrid retrieval: questions naming an id or code try the lexical fast path first; otherwise
+# the lexical and the dense search run at the same time and their rankings are fused
+def get_relevant_documents(query_text: str, filter=None, collections=None):
+    with span("retrieval") as retrieval_span:
+        results = _get_relevant_documents(query_text, filter, collections)
+        retrieval_span.set(results=len(results))
+        return results
+
+
+def _get_relevant_documents(query_text, filter, collections):
+    if not HYBRID_RETRIEVAL:
+        return dense_search(query_text, filter, collections)
+    if _identifiers(query_text):
+        lexical = lexical_search(query_text, filter, collections)
+        if confident_lexical(query_text, lexical):
+            return lexical
+        return fuse_results(dense_search(query_text, filter, collections), lexical)
+    lexical_future = _executor.submit(in_current_context(lexical_search), query_text, filter, collections)
+    dense = dense_search(query_text, filter, collections)
+    return fuse_results(dense, lexical_future.result())
+
+
+async def aget_relevant_documents(query_text: str, filter=None, collections=None):
+    with span("retrieval") as retrieval_span:
+        results = await _aget_relevant_documents(query_text, filter, collections)
+        retrieval_span.set(results=len(results))
+        return results
+
+
+async def _aget_relevant_documents(query_text, filter, collections):
+    if not HYBRID_RETRIEVAL:
+        return await adense_search(query_text, filter, collections)
+    if _identifiers(query_text):
+        lexical = await asyncio.to_thread(lexical_search, query_text, filter, collections)
+        if confident_lexical(query_text, lexical):
+            return lexical
+        return fuse_results(await adense_search(query_text, filter, collections), lexical)
+    lexical, dense = await asyncio.gather(
+        asyncio.to_thread(lexical_search, query_text, filter, collections),
+        adense_search(query_text, filter, collections),
+    )
+    return fuse_results(dense, lexical)
+
+
+# get_relevant_documents for many questions at once (offline jobs): one lexical pass, the dense
+# questions embedded in batched requests, and every (question, collection) search run on a pool
+# as wide as the pgvector connection pool. Results are in the order of query_texts.
+def get_relevant_documents_batch(query_texts, filter=None, collections=None, workers=PGVECTOR_POOL_SIZE):
+    from vector_index import search
+    with span("retrieval.batch", queries=len(query_texts)) as batch_span:
+        results = [None] * len(query_texts)
+        lexical = [[] for _ in query_texts]
+        if HYBRID_RETRIEVAL:
+            with span("lexical.batch"):
+                lexical = [lexical_search(query_text, filter, collections) for query_text in query_texts]
+            for i, query_text in enumerate(query_texts):
+                if _identifiers(query_text) and confident_lexical(query_text, lexical[i]):
+                    results[i] = lexical[i]
+        dense_needed = [i for i, result in enumerate(results) if result is None]
+
+        with span("embedding", texts=len(dense_needed)):
+            embeddings = get_embeddings().embed_documents([query_texts[i] for i in dense_needed])
+        router = get_router()
+        searches = [
+            (i, name, embedding)
+            for i, embedding in zip(dense_needed, embeddings)
+            for name in (collections or router.route(query_texts[i], embedding))
+        ]
+        search_one = in_current_context(
+            lambda item: search(item[2], k=6, collection_name=item[1], filter=filter)
+        )
+        found = defaultdict(list)
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="retrieval-batch") as pool:
+            for (i, _, _), hits in zip(searches, pool.map(search_one, searches)):
+                found[i].append(hits)
+
+        for i in dense_needed:
+            dense = merge_results(found[i])
+            results[i] = fuse_results(dense, lexical[i]) if HYBRID_RETRIEVAL else dense
+        batch_span.set(searches=len(searches), lexical_only=len(query_texts) - len(dense_needed))
+        return results
+
+
+class Passage:
+    def __init__(self, source, start, text, score):
+        self.source = source
+        self.start = start
+        self.end = start + len(text)
+        self.text = text
+        self.score = score
+
+    # Absorb a chunk starting at or after this passage's start, dropping the overlapping text
+    def extend(self, start, text, score):
+        end = start + len(text)
+        if end > self.end:
+            overlap = self.end - start
+            self.text += text[overlap:] if overlap >= 0 else "\n" + text
+            self.end = end
+        self.score = max(self.score, score)
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+# Turn (Document, score) results into passages: chunks under the cutoff are dropped, and chunks
+# of one source that overlap or touch are merged using their start_index
+def _passages(relevant_docs, min_score):
+    by_source = {}
+    loose = []
+    for doc, score in relevant_docs:
+        if score < min_score:
+            continue
+        source = doc.metadata.get("source", "")
+        start = doc.metadata.get("start_index")
+        if start is None:
+            loose.append(Passage(source, 0, doc.page_content, score))
+        else:
+            by_source.setdefault(source, []).append((start, doc.page_content, score))
+
+    passages = []
+    for source, chunks in by_source.items():
+        chunks.sort(key=lambda chunk: chunk[0])
+        current = None
+        for start, text, score in chunks:
+            if current is not None and start <= current.end + CONTEXT_MERGE_GAP:
+                current.extend(start, text, score)
+            else:
+                current = Passage(source, start, text, score)
+                passages.append(current)
+    return passages + loose
+
+
+# Pack the most relevant passages into the token budget, skipping any whose text already
+# appears in a passage that was kept
+def pack_context(relevant_docs, token_budget=CONTEXT_TOKEN_BUDGET, min_score=CONTEXT_MIN_SCORE):
+    kept = []
+    kept_text = []
+    remaining = token_budget
+    for passage in sorted(_passages(relevant_docs, min_score), key=lambda passage: passage.score, reverse=True):
+        normalized = _normalize(passage.text)
+        if any(normalized in text for text in kept_text):
+            continue
+        header = f"Relevant information from {Path(passage.source).name}:\n" if passage.source else "Relevant information:\n"
+        cost = count_tokens(header) + count_tokens(passage.text)
+        if cost > remaining:
+            # Only the best passage is cut down to fit; the rest are skipped whole
+            if kept:
+                continue
+            text = truncate_to_tokens(passage.text, remaining - count_tokens(header))
+            if not text:
+                break
+            cost = count_tokens(header) + count_tokens(text)
+        else:
+            text = passage.text
+        kept.append(header + text)
+        kept_text.append(normalized)
+        remaining -= cost
+    return "\n\n".join(kept)
+
+
+# Retrieved context goes with the run as additional instructions rather than into the thread,
+# so it is used for this turn only and never piles up in the conversation history
+def context_instructions(context):
+    if not context:
+        return None
+    return f"Use the following knowledge base information if it helps answer the latest message:\n\n{context}"
@@ -0,0 +1,8 @@
+# Tests run from the repository root against the local stand-in servers in benchmarks/, with
+# tracing kept in memory so no trace file is written.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TRACE_PATH", "")
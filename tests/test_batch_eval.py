@@ -0,0 +1,35 @@
+# batch_eval.py: ids are checked up front, and the async generation mode runs the assistant's
+# tools against the local OpenAI stand-in without processing any transaction.
+
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+import batch_eval
+import lifecycle
+import tools  # noqa: F401  registers the tools
+from benchmarks.fake_openai import FakeOpenAIServer
+from tool_registry import registry
+
+
+def test_duplicate_ids_are_rejected():
+    queries = [{"id": "a", "query": "One"}, {"id": "b", "query": "Two"}, {"id": "a", "query": "Three"}]
+    with pytest.raises(ValueError, match="Duplicate question ids: a"):
+        batch_eval.evaluate(queries, generation="none")
+
+
+def test_async_fanout_does_not_process_transactions(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(registry.get("process_transaction"), "func", lambda **arguments: calls.append(arguments))
+    monkeypatch.setattr(lifecycle, "ASSISTANT_CACHE_PATH", str(tmp_path / "assistant_cache.json"))
+    arguments = {"amount": 5000, "payment_mode": "wire transfer", "wire_id": "WX-1", "transaction_date": "2024-02-15"}
+    with FakeOpenAIServer(think_time=0, tool_calls=[("process_transaction", arguments)]) as server:
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        queries = [{"id": "1", "query": "Invest 5000 by wire WX-1"}, {"id": "2", "query": "Invest again"}]
+        retrieved = [[(Document(page_content="Wires settle the same day."), 0.9)], []]
+        answers = asyncio.run(batch_eval.run_async_fanout(queries, retrieved))
+
+    assert answers == {"1": ("This is a stand-in reply.", None), "2": ("This is a stand-in reply.", None)}
+    assert calls == []
@@ -0,0 +1,114 @@
+# The HTTP chat service with a stand-in engine: request validation, server-sent events whose
+# deltas since the last reset add up to the final answer, and the memory gauges on /metrics.
+
+import asyncio
+import json
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from chat_server import ChatServer
+from conversation_memory import ConversationMemory
+
+
+class ScriptedEngine:
+    # deltas: [(text, message_id)] streamed before returning answer
+    def __init__(self, deltas, answer):
+        self.deltas = deltas
+        self.answer = answer
+        self.sessions = {}
+
+    async def start(self):
+        return self
+
+    def get_session(self, session_id):
+        return self.sessions.setdefault(session_id, ConversationMemory())
+
+    def end_session(self, session_id):
+        self.sessions.pop(session_id, None)
+
+    def memory_stats(self):
+        return {session_id: memory.stats() for session_id, memory in self.sessions.items()}
+
+    async def chat(self, session_id, user_input, on_delta=None, turn_id=None):
+        self.get_session(session_id).add_turn(user_input, self.answer)
+        if on_delta is not None:
+            for text, message_id in self.deltas:
+                await on_delta(text, message_id)
+        return self.answer
+
+    async def close(self):
+        pass
+
+
+def request(engine, method, path, **kwargs):
+    async def main():
+        client = TestClient(TestServer(ChatServer(engine).app()))
+        await client.start_server()
+        try:
+            response = await client.request(method, path, **kwargs)
+            return response.status, await response.text()
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+def events(text):
+    parsed = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        parsed.append((lines["event"], json.loads(lines["data"])))
+    return parsed
+
+
+def streamed_answer(parsed):
+    text = ""
+    for event, data in parsed:
+        if event == "reset":
+            text = ""
+        elif event == "delta":
+            text += data["text"]
+    return text
+
+
+def test_non_object_body_is_rejected():
+    for body in ("[]", '"hello"', "3"):
+        status, text = request(ScriptedEngine([], "hi"), "POST", "/sessions/s/chat", data=body)
+        assert status == 400
+        assert json.loads(text) == {"error": "body must be a JSON object"}
+
+
+def test_text_before_tool_calls_is_withdrawn():
+    engine = ScriptedEngine([("Let me check.", "msg_1"), ("It is ", "msg_2"), ("sunny.", "msg_2")], "It is sunny.")
+    status, text = request(engine, "POST", "/sessions/s/chat", json={"message": "Weather?", "stream": True})
+    parsed = events(text)
+    assert status == 200
+    assert [event for event, _ in parsed] == ["delta", "reset", "delta", "delta", "done"]
+    assert streamed_answer(parsed) == parsed[-1][1]["response"] == "It is sunny."
+
+
+def test_answer_without_matching_deltas_is_sent_whole():
+    engine = ScriptedEngine([("It is", "msg_1"), ("sunny.", "msg_1")], "It is sunny.")
+    status, text = request(engine, "POST", "/sessions/s/chat", json={"message": "Weather?", "stream": True})
+    parsed = events(text)
+    assert [event for event, _ in parsed] == ["delta", "delta", "reset", "delta", "done"]
+    assert streamed_answer(parsed) == parsed[-1][1]["response"]
+
+    status, text = request(ScriptedEngine([], "Cached."), "POST", "/sessions/s/chat",
+                           json={"message": "Weather?", "stream": True})
+    assert events(text) == [("delta", {"text": "Cached."}), ("done", {"session_id": "s", "response": "Cached."})]
+
+
+def test_metrics_sum_memory_over_sessions():
+    engine = ScriptedEngine([], "It is sunny.")
+    for session_id in ("a", "b"):
+        asyncio.run(engine.chat(session_id, "Weather in Paris?"))
+    asyncio.run(engine.chat("a", "And in Lima?"))
+
+    status, text = request(engine, "GET", "/metrics")
+    gauges = dict(line.rsplit(" ", 1) for line in text.splitlines() if line.startswith("chat_server_"))
+    assert status == 200
+    assert gauges["chat_server_sessions"] == "2"
+    assert gauges["chat_server_memory_turns"] == "3"
+    window_tokens = sum(memory.window_tokens for memory in engine.sessions.values())
+    assert gauges["chat_server_memory_window_tokens"] == str(window_tokens)
+    assert gauges["chat_server_memory_compactions"] == "0"
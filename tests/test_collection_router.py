@@ -0,0 +1,74 @@
+# Collection routing: keyword matching on whole words (or opted-in prefixes), and description
+# embeddings computed once however many first questions arrive together.
+
+import asyncio
+import threading
+import time
+
+from collection_config import CollectionConfig
+from collection_router import CollectionRouter
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _vectors(self, texts):
+        with self.lock:
+            self.calls += 1
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_documents(self, texts):
+        time.sleep(0.05)
+        return self._vectors(texts)
+
+    async def aembed_documents(self, texts):
+        await asyncio.sleep(0.05)
+        return self._vectors(texts)
+
+
+def make_router(embeddings=None):
+    return CollectionRouter([
+        CollectionConfig("travel", description="Travel guides", keywords=["trip", "flight*"]),
+        CollectionConfig("investments", description="Investment products", keywords=["ach", "fund", "invest*"]),
+    ], embeddings=embeddings or CountingEmbeddings())
+
+
+def test_keywords_match_whole_words():
+    router = make_router()
+    assert router.route_without_embeddings("How do I achieve a fundamental change?") is None
+    assert router.route_without_embeddings("Can I pay by ACH?") == ["investments"]
+    assert router.route_without_embeddings("Which fund is best?") == ["investments"]
+
+
+def test_prefix_keywords_are_opt_in():
+    router = make_router()
+    assert router.route_without_embeddings("Any flights to Rome?") == ["travel"]
+    assert router.route_without_embeddings("I am investing for retirement") == ["investments"]
+    assert router.route_without_embeddings("Planning trips") is None
+
+
+def test_concurrent_async_routes_embed_descriptions_once():
+    embeddings = CountingEmbeddings()
+    router = make_router(embeddings)
+
+    async def main():
+        return await asyncio.gather(*(router.aroute("Tell me something", [13.0, 1.0]) for _ in range(10)))
+
+    routes = asyncio.run(main())
+    assert embeddings.calls == 1
+    assert all(route == routes[0] for route in routes)
+    router.route("Tell me something", [13.0, 1.0])
+    assert embeddings.calls == 1
+
+
+def test_concurrent_threads_embed_descriptions_once():
+    embeddings = CountingEmbeddings()
+    router = make_router(embeddings)
+    threads = [threading.Thread(target=router.description_vectors) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert embeddings.calls == 1
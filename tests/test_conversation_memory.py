@@ -0,0 +1,72 @@
+# Conversation memory: compaction starts only once the window is over budget with more than
+# min_turns turns, folds the oldest turns into the summary, and a new thread is seeded with the
+# summary followed by the recent turns.
+
+from conversation_memory import ConversationMemory
+
+
+def memory_with_turns(count, **options):
+    memory = ConversationMemory(**options)
+    for i in range(count):
+        memory.add_turn(f"Question {i} " + "word " * 20, f"Answer {i} " + "word " * 20)
+    return memory
+
+
+def test_compaction_waits_for_budget_and_min_turns():
+    turn_tokens = memory_with_turns(1).window_tokens
+    memory = ConversationMemory(token_budget=turn_tokens * 3, keep_ratio=0.5, min_turns=2, summary_max_tokens=0)
+    for i in range(3):
+        memory.add_turn(f"Question {i} " + "word " * 20, f"Answer {i} " + "word " * 20)
+        assert not memory.needs_compaction()
+
+    memory.add_turn("Question 3 " + "word " * 20, "Answer 3 " + "word " * 20)
+    assert memory.needs_compaction()
+
+    # Over budget, but nothing may be folded while only min_turns turns are left
+    small = memory_with_turns(2, token_budget=1, min_turns=2)
+    assert not small.needs_compaction()
+    assert not small.compact(summarize=lambda summary, turns: "unused")
+
+
+def test_compact_folds_oldest_turns_into_summary():
+    turn_tokens = memory_with_turns(1).window_tokens
+    memory = memory_with_turns(5, token_budget=turn_tokens * 4, keep_ratio=0.5, min_turns=2, summary_max_tokens=20)
+    folded_questions = []
+
+    def summarize(previous_summary, turns):
+        folded_questions.extend(turn.user.split()[1] for turn in turns)
+        return "Asked about the weather."
+
+    assert memory.needs_compaction()
+    assert memory.compact(summarize=summarize)
+    assert folded_questions == ["0", "1", "2"]
+    assert [turn.user.split()[1] for turn in memory.turns] == ["3", "4"]
+    assert memory.summary == "Asked about the weather."
+    assert not memory.needs_compaction()
+    stats = memory.stats()
+    assert (stats["turns"], stats["window_turns"], stats["compactions"], stats["summary_failures"]) == (5, 2, 1, 0)
+    assert stats["tokens_summarized"] == turn_tokens * 3
+
+
+def test_failed_summary_falls_back_to_opening_lines():
+    memory = memory_with_turns(4, token_budget=1, min_turns=2, summary_max_tokens=500)
+
+    def summarize(previous_summary, turns):
+        raise RuntimeError("summarizer unavailable")
+
+    assert memory.compact(summarize=summarize)
+    assert memory.summary.startswith("User asked: Question 0")
+    assert memory.stats()["summary_failures"] == 1
+
+
+def test_thread_messages_start_with_the_summary():
+    memory = ConversationMemory()
+    assert memory.thread_messages() == []
+
+    memory.add_turn("Weather in Paris?", "Sunny.")
+    memory.summary = "The user is planning a trip."
+    assert memory.thread_messages() == [
+        {"role": "user", "content": "Summary of our conversation so far:\nThe user is planning a trip."},
+        {"role": "user", "content": "Weather in Paris?"},
+        {"role": "assistant", "content": "Sunny."},
+    ]
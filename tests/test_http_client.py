@@ -0,0 +1,152 @@
+# HttpClient and AsyncHttpClient against the local OpenWeather stand-in: retries, the circuit
+# breaker, connection reuse, and the weather tool on top of them.
+
+import asyncio
+import time
+
+import pytest
+import requests
+
+import tools
+from benchmarks.fake_openweather import FakeOpenWeatherServer
+from cache import coordinates_cache, weather_cache
+from http_client import AsyncHttpClient, CircuitOpenError, HttpClient
+
+
+def make_client(cls=HttpClient, **options):
+    settings = {"max_retries": 2, "backoff_base": 0.001, "backoff_max": 0.001,
+                "failure_threshold": 2, "reset_timeout": 0.05}
+    settings.update(options)
+    return cls(**settings)
+
+
+@pytest.fixture
+def server():
+    with FakeOpenWeatherServer() as server:
+        yield server
+
+
+def geocode_url(server):
+    return f"{server.base_url}/geo/1.0/direct?q=Paris"
+
+
+def test_retries_5xx_then_succeeds(server):
+    client = make_client()
+    server.fail_next = 2
+    response = client.get(geocode_url(server), endpoint="geocode")
+    assert response.status_code == 200
+    assert server.request_count == 3
+    assert client.stats()["geocode"]["circuit"] == "closed"
+
+
+def test_returns_last_response_once_retries_run_out(server):
+    client = make_client(failure_threshold=5)
+    server.fail_next = 3
+    response = client.get(geocode_url(server), endpoint="geocode")
+    assert response.status_code == 503
+    assert server.request_count == 3
+
+
+def test_circuit_opens_and_stops_calling(server):
+    client = make_client(max_retries=0)
+    server.fail_next = 2
+    for _ in range(2):
+        assert client.get(geocode_url(server), endpoint="geocode").status_code == 503
+    with pytest.raises(CircuitOpenError):
+        client.get(geocode_url(server), endpoint="geocode")
+    assert server.request_count == 2
+
+
+def test_half_open_trial_closes_circuit(server):
+    client = make_client(max_retries=0)
+    server.fail_next = 2
+    for _ in range(2):
+        client.get(geocode_url(server), endpoint="geocode")
+    time.sleep(0.06)
+    assert client.get(geocode_url(server), endpoint="geocode").status_code == 200
+    assert client.stats()["geocode"]["circuit"] == "closed"
+
+
+def test_unexpected_error_in_trial_releases_it(server, monkeypatch):
+    client = make_client(max_retries=0)
+    server.fail_next = 2
+    for _ in range(2):
+        client.get(geocode_url(server), endpoint="geocode")
+    time.sleep(0.06)
+
+    def broken(*args, **kwargs):
+        raise ValueError("unexpected")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(client.session, "request", broken)
+        with pytest.raises(ValueError):
+            client.get(geocode_url(server), endpoint="geocode")
+    # The failed trial re-opened the circuit; after the reset timeout another trial goes through
+    time.sleep(0.06)
+    assert client.get(geocode_url(server), endpoint="geocode").status_code == 200
+
+
+def test_connection_error_is_raised_after_retries():
+    client = make_client(failure_threshold=5)
+    with pytest.raises(requests.ConnectionError):
+        client.get("http://127.0.0.1:1/geo/1.0/direct", endpoint="geocode")
+    assert client.stats()["geocode"]["calls"] == 3
+
+
+def test_keeps_connections_alive(server):
+    client = make_client()
+    for _ in range(10):
+        assert client.get(geocode_url(server)).status_code == 200
+    assert server.connection_count == 1
+
+
+def test_async_retries_and_reuses_client_across_loops(server):
+    client = make_client(AsyncHttpClient)
+
+    async def get():
+        try:
+            return (await client.get(geocode_url(server), endpoint="geocode")).status_code
+        finally:
+            await client.close()
+
+    server.fail_next = 1
+    assert asyncio.run(get()) == 200
+    assert asyncio.run(get()) == 200
+    assert server.request_count == 3
+
+
+def test_async_cancelled_trial_releases_it(server):
+    client = make_client(AsyncHttpClient, max_retries=0)
+
+    async def scenario():
+        try:
+            server.fail_next = 2
+            for _ in range(2):
+                await client.get(geocode_url(server), endpoint="geocode")
+            await asyncio.sleep(0.06)
+            server.latency = 0.5
+            trial = asyncio.create_task(client.get(geocode_url(server), endpoint="geocode"))
+            await asyncio.sleep(0.05)
+            trial.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await trial
+            server.latency = 0
+            await asyncio.sleep(0.06)
+            return (await client.get(geocode_url(server), endpoint="geocode")).status_code
+        finally:
+            await client.close()
+
+    assert asyncio.run(scenario()) == 200
+
+
+def test_weather_tool_does_not_cache_failures(server, monkeypatch):
+    monkeypatch.setattr(tools, "OPENWEATHER_BASE_URL", server.base_url)
+    coordinates_cache.clear()
+    weather_cache.clear()
+    server.fail_next = 3
+    assert tools.get_current_weather("Paris") == "Unable to find coordinates for Paris"
+    report = tools.get_current_weather("Paris")
+    assert "Description: Scattered clouds" in report
+    requests_so_far = server.request_count
+    assert tools.get_current_weather(" PARIS ").endswith(report.split("\n", 1)[1])
+    assert server.request_count == requests_so_far
@@ -0,0 +1,76 @@
+# BM25 relevance and rank fusion: the relevance cutoff doesn't let a chunk through just because it
+# was the best lexical hit, and the lexical index hands out documents consistent with its search.
+
+import threading
+
+from langchain_core.documents import Document
+
+import retrieval
+from lexical_index import BM25Index
+from retrieval import CONTEXT_MIN_SCORE, confident_lexical, fuse_results, lexical_search, pack_context
+
+
+def make_index():
+    index = BM25Index()
+    index.add("wire", "Wire transfer WX-2024-0173 was approved on the 15th of February.", {"source": "a.pdf"})
+    index.add("ach", "ACH payments settle in one to three business days.", {"source": "b.pdf"})
+    index.add("fees", "There is a fee for each wire transfer sent abroad.", {"source": "c.pdf"})
+    return index
+
+
+def test_stopword_only_match_is_not_relevant():
+    hits = make_index().search("What is the meaning of it all?")
+    assert all(score < CONTEXT_MIN_SCORE for _, score in hits)
+    assert pack_context(hits) == ""
+
+
+def test_weak_top_hit_stays_below_cutoff():
+    hits = make_index().search("What about the mortgage fee schedule?")
+    assert hits[0][0].id == "fees"
+    assert hits[0][1] < CONTEXT_MIN_SCORE
+
+
+def test_identifier_match_is_relevant(monkeypatch):
+    index = make_index()
+    monkeypatch.setattr(retrieval, "get_lexical_index", lambda name: index)
+    hits = lexical_search("What is the status of WX-2024-0173?", collections=["payments"])
+    assert [doc.id for doc, _ in hits] == ["wire"]
+    assert hits[0][1] == 1.0
+    assert hits[0][0].metadata == {"source": "a.pdf"}
+    assert confident_lexical("What is the status of WX-2024-0173?", hits)
+
+
+def test_fused_chunk_keeps_its_dense_relevance():
+    shared = Document(id="shared", page_content="shared chunk")
+    lexical_only = Document(id="lexical", page_content="lexical chunk")
+    fused = dict((doc.id, score) for doc, score in fuse_results(
+        [(shared, 0.4)], [(lexical_only, 0.9), (shared, 1.0)]
+    ))
+    assert fused == {"shared": 0.4, "lexical": 0.9}
+
+
+def test_search_during_removal_never_fails():
+    index = make_index()
+    for i in range(200):
+        index.add(f"doc-{i}", f"transfer note {i}")
+    errors = []
+
+    def churn():
+        for i in range(200):
+            index.remove(f"doc-{i}")
+            index.add(f"doc-{i}", f"transfer note {i}")
+
+    def search():
+        try:
+            for _ in range(200):
+                for doc, _ in index.search("transfer note"):
+                    assert doc.page_content
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=churn), threading.Thread(target=search)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
@@ -0,0 +1,97 @@
+# Incremental ingestion through the ingest pipeline with an in-memory vector store: unchanged
+# chunks are kept, chunks that moved are written again so their start_index stays right, and an
+# interrupted run resumes from the batches it checkpointed.
+
+import pytest
+from langchain.schema import Document
+
+from generate_vector_embeddings import ingest_documents
+from ingest_manifest import IngestManifest
+from ingest_pipeline import PipelineError
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text))] for text in texts]
+
+
+class MemoryStore:
+    def __init__(self, fail_after=None):
+        self.documents = {}
+        self.fail_after = fail_after
+
+    def add_embeddings(self, texts, embeddings, metadatas, ids):
+        if self.fail_after is not None and len(self.documents) >= self.fail_after:
+            raise RuntimeError("database went away")
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            self.documents[chunk_id] = Document(page_content=text, metadata=metadata)
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self.documents.pop(chunk_id, None)
+
+
+def chunks(texts):
+    result = []
+    start = 0
+    for text in texts:
+        result.append(Document(page_content=text, metadata={"source": "doc.pdf", "start_index": start}))
+        start += len(text) + 1
+    return result
+
+
+def ingest(texts, manifest, store, embeddings=None):
+    ingest_documents(
+        "docs", [("doc.pdf", str(texts), chunks(texts))], manifest, store, embeddings or FakeEmbeddings(),
+        workers=1, write_batch_size=2,
+    )
+
+
+def test_moved_chunks_get_their_new_start_index(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite3"), "docs")
+    store = MemoryStore()
+    ingest(["alpha", "beta", "gamma"], manifest, store)
+    ingest(["alpha", "inserted", "beta", "gamma"], manifest, store)
+
+    positions = {doc.page_content: doc.metadata["start_index"] for doc in store.documents.values()}
+    assert positions == {"alpha": 0, "inserted": 6, "beta": 15, "gamma": 20}
+    assert len(store.documents) == 4
+    assert manifest.chunk_ids("doc.pdf") == set(store.documents)
+
+
+def test_identical_chunks_in_one_file_are_kept_apart(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite3"), "docs")
+    store = MemoryStore()
+    ingest(["same", "same"], manifest, store)
+    assert len(store.documents) == 2
+
+
+def test_only_new_chunks_are_embedded(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite3"), "docs")
+    store = MemoryStore()
+    ingest(["alpha", "beta"], manifest, store)
+    embeddings = FakeEmbeddings()
+    ingest(["alpha", "beta", "gamma"], manifest, store, embeddings)
+    assert embeddings.embedded == ["gamma"]
+    assert manifest.is_done("doc.pdf", str(["alpha", "beta", "gamma"]))
+
+
+def test_interrupted_run_resumes_from_written_batches(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite3"), "docs")
+    texts = ["one", "two", "three", "four", "five"]
+    store = MemoryStore(fail_after=2)
+    with pytest.raises(PipelineError):
+        ingest(texts, manifest, store)
+    assert not manifest.is_done("doc.pdf", str(texts))
+    assert manifest.chunk_ids("doc.pdf") == set(store.documents)
+
+    store.fail_after = None
+    embeddings = FakeEmbeddings()
+    ingest(texts, manifest, store, embeddings)
+    assert sorted(embeddings.embedded) == ["five", "four", "three"]
+    assert manifest.chunk_ids("doc.pdf") == set(store.documents)
+    assert len(store.documents) == 5
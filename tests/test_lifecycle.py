@@ -0,0 +1,56 @@
+# Assistant lookup against the local OpenAI stand-in: the cached id is reused, and an assistant
+# deleted on the server is found or created again instead of being trusted from the cache.
+
+import asyncio
+
+import openai
+import pytest
+
+import lifecycle
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(lifecycle, "ASSISTANT_CACHE_PATH", str(tmp_path / "assistant_cache.json"))
+    monkeypatch.setattr(lifecycle, "_validated_assistants", set())
+    with FakeOpenAIServer() as server:
+        yield server
+
+
+def test_cached_id_is_checked_once_per_process(server):
+    client = openai.OpenAI(base_url=server.base_url, api_key="test", max_retries=0)
+    assistant_id = lifecycle.get_or_create_assistant(client)
+    assert lifecycle.get_or_create_assistant(client) == assistant_id
+
+    # A new process trusts the file only after the server confirms the id
+    lifecycle._validated_assistants.clear()
+    assert lifecycle.get_or_create_assistant(client) == assistant_id
+    assert len(server.assistants) == 1
+
+
+def test_deleted_assistant_is_created_again(server):
+    client = openai.OpenAI(base_url=server.base_url, api_key="test", max_retries=0)
+    assistant_id = lifecycle.get_or_create_assistant(client)
+
+    server.assistants.pop(assistant_id)
+    lifecycle._validated_assistants.clear()
+    new_id = lifecycle.get_or_create_assistant(client)
+    assert new_id != assistant_id
+    assert new_id in server.assistants
+    assert lifecycle._read_assistant_cache() == {lifecycle._cache_key(client, lifecycle.definition_hash()): new_id}
+
+
+def test_async_lookup_replaces_deleted_assistant(server):
+    async def main():
+        client = openai.AsyncOpenAI(base_url=server.base_url, api_key="test", max_retries=0)
+        assistant_id = await lifecycle.aget_or_create_assistant(client)
+        server.assistants.pop(assistant_id)
+        lifecycle._validated_assistants.clear()
+        new_id = await lifecycle.aget_or_create_assistant(client)
+        await client.close()
+        return assistant_id, new_id
+
+    assistant_id, new_id = asyncio.run(main())
+    assert new_id != assistant_id
+    assert list(server.assistants) == [new_id]
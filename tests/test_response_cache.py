@@ -0,0 +1,71 @@
+# The response cache in the asyncio chat engine, against the local OpenAI stand-in: only opening
+# questions answered from retrieved context are reused, and a cached answer still becomes part
+# of the conversation.
+
+import asyncio
+
+import openai
+from langchain_core.documents import Document
+
+from async_engine import AsyncChatEngine
+from benchmarks.fake_openai import FakeOpenAIServer
+from response_cache import SemanticResponseCache
+
+
+class SameEmbeddings:
+    async def aembed_query(self, text):
+        return [1.0, 0.0]
+
+
+def make_retriever(documents):
+    async def retrieve(query_text):
+        return documents
+    return retrieve
+
+
+def run_turns(server, cache, turns, documents):
+    async def main():
+        client = openai.AsyncOpenAI(base_url=server.base_url, api_key="test", max_retries=0)
+        engine = AsyncChatEngine(client=client, assistant_id="asst_test", retrieve=make_retriever(documents),
+                                 response_cache=cache, embeddings=SameEmbeddings())
+        answers = [await engine.chat(session_id, text) for session_id, text in turns]
+        await client.close()
+        return engine, answers
+    return asyncio.run(main())
+
+
+def test_cached_answer_is_recorded_in_the_conversation(tmp_path):
+    cache = SemanticResponseCache(versions_path=str(tmp_path / "versions.json"))
+    documents = [(Document(page_content="Wire transfers settle the same day.", metadata={"source": "a.pdf"}), 0.9)]
+    with FakeOpenAIServer(think_time=0, reply="Wires settle the same day.") as server:
+        engine, answers = run_turns(server, cache, [("a", "When do wires settle?"), ("b", "When do wires settle?")],
+                                    documents)
+        runs = len(server.run_requests)
+        thread = server.threads[engine.sessions["b"].thread_id]
+
+    assert answers == ["Wires settle the same day.", "Wires settle the same day."]
+    assert runs == 1
+    assert [message["role"] for message in thread] == ["user", "assistant"]
+    assert engine.sessions["b"].memory.turn_count == 1
+
+
+def test_follow_up_questions_are_not_cached(tmp_path):
+    cache = SemanticResponseCache(versions_path=str(tmp_path / "versions.json"))
+    documents = [(Document(page_content="Wire transfers settle the same day.", metadata={"source": "a.pdf"}), 0.9)]
+    with FakeOpenAIServer(think_time=0) as server:
+        run_turns(server, cache, [("a", "Tell me about wires"), ("a", "And what about the other one?"),
+                                  ("b", "Something else"), ("b", "And what about the other one?")], documents)
+        runs = len(server.run_requests)
+
+    assert cache.stats()["size"] == 1
+    assert runs == 3
+
+
+def test_answers_without_context_are_not_cached(tmp_path):
+    cache = SemanticResponseCache(versions_path=str(tmp_path / "versions.json"))
+    with FakeOpenAIServer(think_time=0) as server:
+        run_turns(server, cache, [("a", "Hello"), ("b", "Hello")], [])
+        runs = len(server.run_requests)
+
+    assert cache.stats()["size"] == 0
+    assert runs == 2
@@ -0,0 +1,48 @@
+# The transaction ledger: a resubmitted transaction of the same turn is processed once, and
+# submissions racing with close() are either written or rejected, never left waiting.
+
+import threading
+import time
+from concurrent.futures import wait
+
+import pytest
+
+from transactions import Transaction, TransactionLedger, idempotency_key, process, turn_scope
+
+
+def test_resubmission_in_a_turn_is_processed_once(tmp_path):
+    ledger = TransactionLedger(str(tmp_path / "ledger.sqlite3"))
+    with turn_scope("conversation:1"):
+        first, entry = process(5000.0, "wire transfer", "2024-02-15", "WX-1", ledger=ledger)
+        _, again = process(5000.0, "wire transfer", "2024-02-15", "WX-1", ledger=ledger)
+    ledger.close()
+    assert not entry.duplicate and again.duplicate
+    assert again.transaction_id == entry.transaction_id
+    assert len(TransactionLedger(str(tmp_path / "ledger.sqlite3")).entries()) == 1
+
+
+def test_submit_racing_close_never_hangs(tmp_path):
+    ledger = TransactionLedger(str(tmp_path / "ledger.sqlite3"))
+    put = ledger._queue.put
+
+    # Widen the window between a submission's closed check and its enqueue
+    def slow_put(item, *args, **kwargs):
+        if item is not None:
+            time.sleep(0.05)
+        put(item, *args, **kwargs)
+
+    ledger._queue.put = slow_put
+    futures = []
+    submitter = threading.Thread(target=lambda: futures.append(
+        ledger.submit(Transaction(idempotency_key("ACH", 100.0, "2024-02-15", turn_id="turn-1"), 100.0, "ACH", "2024-02-15", turn_id="turn-1"))
+    ))
+    submitter.start()
+    time.sleep(0.01)
+    ledger.close()
+    submitter.join()
+
+    done, pending = wait(futures, timeout=2)
+    assert not pending
+    assert futures[0].result().transaction_id
+    with pytest.raises(RuntimeError, match="closed"):
+        ledger.submit(Transaction(idempotency_key("ACH", 100.0, "2024-02-15", turn_id="turn-2"), 100.0, "ACH", "2024-02-15")).result(1)
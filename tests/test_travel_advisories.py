@@ -0,0 +1,56 @@
+# Background reloading of the travel advisory file: the last good index stays in use, and a
+# missing or broken file is reported when that starts and when it ends, not on every check.
+
+import os
+import threading
+
+import travel_advisories
+from travel_advisories import AdvisoryIndex
+
+
+def write(path, level, mtime_ns):
+    path.write_text(f"country,city,level,advisory,updated,aliases\nFrance,,{level},,2026-01-15,\n")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_reload_reports_failures_once(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "advisories.csv"
+    write(path, 1, 1_000_000_000)
+    monkeypatch.setattr(travel_advisories, "_index", AdvisoryIndex.load(str(path)))
+    reloader = travel_advisories._AdvisoryReloader(str(path), travel_advisories._index.mtime)
+
+    def check(times=3):
+        for _ in range(times):
+            reloader.check()
+        return capsys.readouterr().out.splitlines()
+
+    assert check() == []
+
+    path.rename(tmp_path / "moved.csv")
+    lines = check()
+    assert len(lines) == 1 and "FileNotFoundError" in lines[0]
+
+    (tmp_path / "moved.csv").rename(path)
+    assert check() == [f"Travel advisories from {path} loaded again"]
+
+    write(path, 7, 2_000_000_000)
+    lines = check()
+    assert len(lines) == 1 and "level must be 1-4" in lines[0]
+    assert travel_advisories._index.lookup("Paris", "France").level == 1
+
+    write(path, 3, 3_000_000_000)
+    assert check() == [f"Travel advisories from {path} loaded again"]
+    assert travel_advisories._index.lookup("Paris", "France").level == 3
+
+
+def test_reload_thread_stops(tmp_path, monkeypatch):
+    path = tmp_path / "advisories.csv"
+    write(path, 1, 1_000_000_000)
+    monkeypatch.setattr(travel_advisories, "ADVISORIES_RELOAD_SECONDS", 60)
+    reloader = travel_advisories._AdvisoryReloader(str(path), 1_000_000_000)
+    thread = threading.Thread(target=reloader.run, daemon=True)
+    thread.start()
+
+    reloader.stop()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
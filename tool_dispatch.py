@@ -0,0 +1,44 @@
+# Run all tool calls of a requires_action step concurrently and collect their outputs,
+# so they can be submitted to the run in a single submit_tool_outputs request
+
+import asyncio
+import os
+
+from tool_registry import registry
+
+# Seconds each tool call may take before its output is replaced by a timeout error
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "20"))
+
+
+# Tools with side effects (process_transaction) are never reported as timed out: their output
+# is only known once they finish, and the model must not retry a call that may still commit
+def may_time_out(tool_call):
+    tool = registry.get(tool_call.function.name)
+    return tool is None or not tool.side_effects
+
+
+def _timeout_output(tool_call, timeout):
+    return f"Error: {tool_call.function.name} timed out after {timeout:g} seconds."
+
+
+# run_tool is a coroutine function taking one tool call and returning its output. Each call's
+# timeout starts when the call does.
+# Returns the tool outputs in the same order as the tool calls.
+async def adispatch_tool_calls(tool_calls, run_tool, timeout=TOOL_TIMEOUT):
+    async def run_one(tool_call):
+        try:
+            if may_time_out(tool_call):
+                output = await asyncio.wait_for(run_tool(tool_call), timeout)
+            else:
+                output = await run_tool(tool_call)
+        except asyncio.TimeoutError:
+            output = _timeout_output(tool_call, timeout)
+        except Exception as e:
+            print(f"Error in tool call: {str(e)}")
+            output = f"Error: {str(e)}"
+        return {
+            "tool_call_id": tool_call.id,
+            "output": str(output)
+        }
+
+    return list(await asyncio.gather(*(run_one(tool_call) for tool_call in tool_calls)))
@@ -0,0 +1,296 @@
+# Tool registry: decorating a function registers it for dispatch, generates its JSON schema
+# from the signature and type hints, and precompiles an argument validator for it.
+#
+#   @registry.tool("Get the current weather for a given city")
+#   def get_current_weather(city: Annotated[str, "The name of the city"]): ...
+
+import asyncio
+import inspect
+import json
+import threading
+import time
+from typing import Annotated, Literal, Union, get_args, get_origin, get_type_hints
+
+JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+}
+
+# Upper bounds (seconds) of the latency histogram buckets, Prometheus style
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+
+class ToolArgumentError(ValueError):
+    pass
+
+
+class ToolParameter:
+    def __init__(self, name, python_type, description=None, enum=None, required=True, has_default=False, default=None):
+        self.name = name
+        self.python_type = python_type
+        self.description = description
+        self.enum = enum
+        self.required = required
+        self.has_default = has_default
+        self.default = default
+
+    def json_schema(self):
+        schema = {"type": JSON_TYPES.get(self.python_type, "string")}
+        if self.enum:
+            schema["enum"] = list(self.enum)
+        if self.description:
+            schema["description"] = self.description
+        return schema
+
+
+class ToolStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+
+    def observe(self, seconds, failed):
+        self.calls += 1
+        if failed:
+            self.errors += 1
+        self.latency_sum += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def as_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(LATENCY_BUCKETS, self.bucket_counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "latency_sum": self.latency_sum,
+            "latency_buckets": buckets,
+        }
+
+
+class Tool:
+    def __init__(self, func, name, description, parameters, side_effects=False):
+        self.func = func
+        self.async_func = None
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        # Calls change state outside the process (a recorded transaction), so they are never
+        # abandoned half way or run where nothing may be written
+        self.side_effects = side_effects
+        self.stats = ToolStats()
+        self.validate = compile_validator(name, parameters)
+
+    def json_schema(self):
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": {param.name: param.json_schema() for param in self.parameters},
+                    "required": [param.name for param in self.parameters if param.required],
+                },
+            },
+        }
+
+
+# Split Annotated/Optional/Literal hints into (python type, description, enum, optional)
+def unpack_hint(hint):
+    description = None
+    enum = None
+    optional = False
+
+    if get_origin(hint) is Annotated:
+        hint, *metadata = get_args(hint)
+        description = next((item for item in metadata if isinstance(item, str)), None)
+
+    if get_origin(hint) is Union:
+        members = [arg for arg in get_args(hint) if arg is not type(None)]
+        optional = len(members) < len(get_args(hint))
+        hint = members[0] if len(members) == 1 else str
+
+    if get_origin(hint) is Literal:
+        enum = get_args(hint)
+        hint = type(enum[0])
+
+    if get_origin(hint) in (list, dict):
+        hint = get_origin(hint)
+    if hint not in JSON_TYPES:
+        hint = str
+    return hint, description, enum, optional
+
+
+# Build the parameter list of a tool from its signature and type hints
+def parameters_from_signature(func, required=None):
+    hints = get_type_hints(func, include_extras=True)
+    parameters = []
+    for param in inspect.signature(func).parameters.values():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        python_type, description, enum, optional = unpack_hint(hints.get(param.name, str))
+        has_default = param.default is not inspect.Parameter.empty
+        if required is not None:
+            is_required = param.name in required
+        else:
+            is_required = not has_default and not optional
+        parameters.append(ToolParameter(
+            name=param.name,
+            python_type=python_type,
+            description=description,
+            enum=enum,
+            required=is_required,
+            has_default=has_default,
+            default=param.default if has_default else None,
+        ))
+    return parameters
+
+
+# Precompile one check per parameter so a call only runs the checks, nothing is introspected per call
+def compile_validator(tool_name, parameters):
+    checks = []
+    for param in parameters:
+        expected = param.python_type
+        # JSON has no int/float distinction, so integers are fine where a number is expected
+        accepted = (int, float) if expected is float else (expected,)
+        enum = {value.lower() if isinstance(value, str) else value for value in param.enum} if param.enum else None
+        # Parameters the function defaults itself (and reports on when missing) are left to the function
+        required = param.required and not param.has_default
+        checks.append((param.name, required, accepted, expected, enum, param.enum))
+    known = {param.name for param in parameters}
+
+    def validate(arguments):
+        if not isinstance(arguments, dict):
+            raise ToolArgumentError(f"Arguments for {tool_name} must be a JSON object.")
+        unknown = set(arguments) - known
+        if unknown:
+            raise ToolArgumentError(f"Unknown argument(s) for {tool_name}: {', '.join(sorted(unknown))}.")
+        for name, required, accepted, expected, enum, choices in checks:
+            value = arguments.get(name)
+            if value is None:
+                if required:
+                    raise ToolArgumentError(f"Missing required argument '{name}' for {tool_name}.")
+                continue
+            if not isinstance(value, accepted) or (expected is not bool and isinstance(value, bool)):
+                raise ToolArgumentError(f"Argument '{name}' for {tool_name} must be of type {JSON_TYPES[expected]}.")
+            if enum is not None and (value.lower() if isinstance(value, str) else value) not in enum:
+                raise ToolArgumentError(f"Argument '{name}' for {tool_name} must be one of: {', '.join(map(str, choices))}.")
+        return arguments
+
+    return validate
+
+
+class ToolRegistry:
+    def __init__(self):
+        self._tools = {}
+        self._lock = threading.Lock()
+
+    # Decorator that registers a function as a tool
+    def tool(self, description, name=None, required=None, side_effects=False):
+        def register(func):
+            tool_name = name or func.__name__
+            if tool_name in self._tools:
+                raise ValueError(f"Tool {tool_name} is already registered")
+            self._tools[tool_name] = Tool(
+                func, tool_name, description, parameters_from_signature(func, required), side_effects
+            )
+            return func
+        return register
+
+    def get(self, name):
+        return self._tools.get(name)
+
+    def tools(self):
+        return list(self._tools.values())
+
+    def names(self):
+        return list(self._tools)
+
+    # JSON schemas in the format openai.beta.assistants.create expects
+    def schemas(self):
+        return [tool.json_schema() for tool in self._tools.values()]
+
+    # Decorator that registers a coroutine function as the async implementation of a tool.
+    # Tools without one are run in a worker thread by acall.
+    def async_impl(self, name):
+        def register(func):
+            self._tools[name].async_func = func
+            return func
+        return register
+
+    # Parse (a dict or a JSON string) and validate arguments, dropping the ones left unset
+    def _prepare_arguments(self, tool, arguments):
+        if arguments is None or arguments == "":
+            arguments = {}
+        elif isinstance(arguments, str):
+            arguments = json.loads(arguments)
+        tool.validate(arguments)
+        return {key: value for key, value in arguments.items() if value is not None}
+
+    def _observe(self, tool, start, failed):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            tool.stats.observe(elapsed, failed)
+
+    # Validate the arguments and call the tool.
+    # Bad arguments come back as an error string for the model instead of raising.
+    def call(self, name, arguments=None):
+        tool = self._tools.get(name)
+        if tool is None:
+            return f"Error: Unknown tool {name}"
+
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = tool.func(**self._prepare_arguments(tool, arguments))
+            failed = False
+            return result
+        except json.JSONDecodeError:
+            return "Error: Invalid tool arguments."
+        except ToolArgumentError as e:
+            return f"Error: {str(e)}"
+        finally:
+            self._observe(tool, start, failed)
+
+    # Async counterpart of call
+    async def acall(self, name, arguments=None):
+        tool = self._tools.get(name)
+        if tool is None:
+            return f"Error: Unknown tool {name}"
+
+        start = time.perf_counter()
+        failed = True
+        try:
+            arguments = self._prepare_arguments(tool, arguments)
+            if tool.async_func is not None:
+                result = await tool.async_func(**arguments)
+            else:
+                result = await asyncio.to_thread(tool.func, **arguments)
+            failed = False
+            return result
+        except json.JSONDecodeError:
+            return "Error: Invalid tool arguments."
+        except ToolArgumentError as e:
+            return f"Error: {str(e)}"
+        finally:
+            self._observe(tool, start, failed)
+
+    # Per-tool call counts, error counts and cumulative latency histograms
+    def stats(self):
+        with self._lock:
+            return {name: tool.stats.as_dict() for name, tool in self._tools.items()}
+
+
+# The registry shared by both entry points
+registry = ToolRegistry()
@@ -0,0 +1,251 @@
+# Tools available to the assistant. Both entry points call them through the registry.
+
+import requests
+from dotenv import load_dotenv
+import os
+from datetime import datetime
+from typing import Annotated, Literal
+from tool_registry import registry
+from http_client import http_client, async_http_client
+from cache import coordinates_cache, weather_cache, normalize_city, round_coordinates
+from travel_advisories import format_advisory, get_advisory_index
+import transactions
+
+# Load environment variables
+load_dotenv()
+
+# OpenWeather API key
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org")
+
+# Raised for non-200 OpenWeather responses so they are never cached
+class WeatherAPIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"Error fetching weather data: {status_code}")
+        self.status_code = status_code
+
+# Function to get coordinates for a city, cached for the life of the process
+def get_coordinates(city):
+    coordinates = coordinates_cache.get_or_compute(normalize_city(city), lambda: fetch_coordinates(city))
+    if coordinates is None:
+        return None, None
+    return coordinates
+
+def fetch_coordinates(city):
+    response = http_client.get(
+        f"{OPENWEATHER_BASE_URL}/geo/1.0/direct",
+        params=geocoding_params(city),
+        endpoint="openweather.geocode"
+    )
+    return parse_coordinates(response)
+
+async def aget_coordinates(city):
+    coordinates = await coordinates_cache.aget_or_compute(normalize_city(city), lambda: afetch_coordinates(city))
+    if coordinates is None:
+        return None, None
+    return coordinates
+
+async def afetch_coordinates(city):
+    response = await async_http_client.get(
+        f"{OPENWEATHER_BASE_URL}/geo/1.0/direct",
+        params=geocoding_params(city),
+        endpoint="openweather.geocode"
+    )
+    return parse_coordinates(response)
+
+def geocoding_params(city):
+    return {
+        "q": city,
+        "limit": 1,
+        "appid": OPENWEATHER_API_KEY
+    }
+
+def parse_coordinates(response):
+    if response.status_code == 200:
+        data = response.json()
+        if data:
+            lat = data[0]['lat']
+            lon = data[0]['lon']
+            return lat, lon
+    return None
+
+# Function to get the raw current weather for a position, reused for WEATHER_CACHE_TTL seconds
+def get_weather_data(lat, lon):
+    key = round_coordinates(lat, lon)
+    return weather_cache.get_or_compute(key, lambda: fetch_weather_data(*key))
+
+def fetch_weather_data(lat, lon):
+    # Use the One Call API endpoint
+    base_url = f"{OPENWEATHER_BASE_URL}/data/2.5/weather"
+    response = http_client.get(base_url, params=weather_params(lat, lon), endpoint="openweather.weather")
+    if response.status_code != 200:
+        raise WeatherAPIError(response.status_code)
+    return response.json()
+
+async def aget_weather_data(lat, lon):
+    key = round_coordinates(lat, lon)
+    return await weather_cache.aget_or_compute(key, lambda: afetch_weather_data(*key))
+
+async def afetch_weather_data(lat, lon):
+    base_url = f"{OPENWEATHER_BASE_URL}/data/2.5/weather"
+    response = await async_http_client.get(base_url, params=weather_params(lat, lon), endpoint="openweather.weather")
+    if response.status_code != 200:
+        raise WeatherAPIError(response.status_code)
+    return response.json()
+
+def weather_params(lat, lon):
+    return {
+        "lat": lat,
+        "lon": lon,
+        "appid": OPENWEATHER_API_KEY,
+        "units": "metric"
+    }
+
+# Function to get current weather
+@registry.tool("Get the current weather for a given city")
+def get_current_weather(city: Annotated[str, "The name of the city"]):
+    try:
+        lat, lon = get_coordinates(city)
+        if lat is None or lon is None:
+            return f"Unable to find coordinates for {city}"
+        data = get_weather_data(lat, lon)
+    except WeatherAPIError as e:
+        return str(e)
+    except requests.RequestException as e:
+        return f"Error fetching weather data: {str(e)}"
+    return format_weather_report(city, data)
+
+# Async version of get_current_weather for the asyncio chat engine
+@registry.async_impl("get_current_weather")
+async def aget_current_weather(city: str):
+    try:
+        lat, lon = await aget_coordinates(city)
+        if lat is None or lon is None:
+            return f"Unable to find coordinates for {city}"
+        data = await aget_weather_data(lat, lon)
+    except WeatherAPIError as e:
+        return str(e)
+    except requests.RequestException as e:
+        return f"Error fetching weather data: {str(e)}"
+    return format_weather_report(city, data)
+
+# Format the OpenWeather response into a readable report
+def format_weather_report(city, data):
+    try:
+        weather_info = {}
+        
+        # Extract temperature
+        if "current" in data:
+            weather_info["Temperature"] = f"{data['current']['temp']}°C"
+        elif "main" in data:
+            weather_info["Temperature"] = f"{data['main']['temp']}°C"
+        
+        # Extract weather description
+        if "current" in data and "weather" in data["current"]:
+            weather_info["Description"] = data["current"]["weather"][0]["description"].capitalize()
+        elif "weather" in data and isinstance(data["weather"], list):
+            weather_info["Description"] = data["weather"][0]["description"].capitalize()
+        
+        # Extract humidity
+        if "current" in data:
+            weather_info["Humidity"] = f"{data['current']['humidity']}%"
+        elif "main" in data:
+            weather_info["Humidity"] = f"{data['main']['humidity']}%"
+        
+        # Format the weather information into a readable string
+        weather_report = f"Weather in {city}:\n"
+        for key, value in weather_info.items():
+            weather_report += f"- {key}: {value}\n"
+        
+        return weather_report.strip()
+    
+    except KeyError:
+        return "Error: Could not retrieve some weather data."
+
+# Function for Travel Advisory API
+@registry.tool("Get the travel advisory for a given city and country")
+def get_travel_advisory(city: Annotated[str, "The name of the city"],
+                        country: Annotated[str, "The name of the country"]):
+    if not city:
+        return "Error: City is required for travel advisory."
+    if not country:
+        return "Error: Country is required for travel advisory."
+    
+    # Looked up in the advisory dataset, so every process gives the same answer
+    try:
+        index = get_advisory_index()
+    except (OSError, ValueError) as e:
+        return f"Error: Travel advisories are unavailable: {e}"
+    return format_advisory(city, country, index.lookup(city, country))
+
+# The first problem with the investment details, or None when they are complete and valid
+def investment_error(amount, payment_mode, wire_id, transaction_date):
+    if amount is None:
+        return "Please provide the amount you'd like to invest."
+    
+    if payment_mode is None:
+        return "Please choose a payment mode: ACH or wire transfer."
+    
+    if payment_mode.lower() not in ["ach", "wire transfer"]:
+        return "Invalid payment mode. Please choose either ACH or wire transfer."
+    
+    if payment_mode.lower() == "wire transfer" and wire_id is None:
+        return "Please provide the wire ID for your wire transfer."
+    
+    if transaction_date is None:
+        return "Please provide the transaction date in YYYY-MM-DD format."
+    
+    try:
+        date = datetime.strptime(transaction_date, "%Y-%m-%d")
+        if date > datetime.now():
+            return "The transaction date cannot be in the future. Please provide a valid date."
+    except ValueError:
+        return "Invalid date format. Please use YYYY-MM-DD."
+    return None
+
+# New function for handling investments
+@registry.tool("Process an investment transaction", required=["amount", "payment_mode", "transaction_date"])
+def process_investment(amount: Annotated[float, "The amount to invest"] = None,
+                       payment_mode: Annotated[Literal["ACH", "wire transfer"], "The mode of payment"] = None,
+                       wire_id: Annotated[str, "The wire ID for wire transfers"] = None,
+                       transaction_date: Annotated[str, "The date of the transaction (YYYY-MM-DD)"] = None):
+    error = investment_error(amount, payment_mode, wire_id, transaction_date)
+    if error:
+        return error
+    
+    # Summarize the investment details
+    summary = f"Investment Summary:\n"
+    summary += f"Amount: ${amount}\n"
+    summary += f"Payment Mode: {payment_mode}\n"
+    if payment_mode.lower() == "wire transfer":
+        summary += f"Wire ID: {wire_id}\n"
+    summary += f"Transaction Date: {transaction_date}\n"
+    
+    return summary
+
+# Record the confirmed investment in the ledger, at most once per wire (or ACH payment) and turn
+@registry.tool("Process the confirmed investment transaction", required=["amount", "payment_mode", "transaction_date"],
+               side_effects=True)
+def process_transaction(amount: Annotated[float, "The amount to invest"] = None,
+                        payment_mode: Annotated[Literal["ACH", "wire transfer"], "The mode of payment"] = None,
+                        wire_id: Annotated[str, "The wire ID for wire transfers"] = None,
+                        transaction_date: Annotated[str, "The date of the transaction (YYYY-MM-DD)"] = None):
+    error = investment_error(amount, payment_mode, wire_id, transaction_date)
+    if error:
+        return error
+    if payment_mode.lower() != "wire transfer":
+        wire_id = None
+
+    transaction, entry = transactions.process(amount, payment_mode, transaction_date, wire_id)
+    if entry.details() != transaction.details():
+        return (f"Error: Wire {wire_id} was already submitted in this conversation turn with different details "
+                f"(transaction {entry.transaction_id}). Please confirm the details with the user.")
+    result = f"Transaction {entry.transaction_id}: {entry.status}\n"
+    result += f"Amount: ${entry.amount}\n"
+    result += f"Payment Mode: {entry.payment_mode}\n"
+    if entry.wire_id:
+        result += f"Wire ID: {entry.wire_id}\n"
+    result += f"Transaction Date: {entry.transaction_date}\n"
+    if entry.duplicate:
+        result += "This transaction had already been processed; it was not processed again.\n"
+    return result
@@ -0,0 +1,318 @@
+# Timed spans for every stage of a turn (embedding, pgvector, run creation, polls, each tool,
+# each HTTP endpoint, message listing). Spans nest through a context variable, so the same code
+# works in threads and asyncio tasks. Each finished span is
+#   - appended to a local JSONL trace when TRACE_PATH names one (off by default),
+#   - counted in per-stage Prometheus-style counters and latency histograms,
+#   - kept in a bounded per-stage sample for exact p50/p95/p99.
+# Spans carry token usage and cache hits as attributes, which are also summed as counters.
+#
+# Usage: python tracing.py traces.jsonl   (p50/p95/p99 per stage from a trace file)
+
+import argparse
+import atexit
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+from tool_registry import ToolStats
+
+# Load environment variables
+load_dotenv()
+
+TRACING_ENABLED = os.getenv("TRACING", "true").lower() == "true"
+# JSONL file every finished span is appended to, e.g. /var/log/assistant/traces.jsonl; empty (the
+# default) keeps spans in memory only, for the metrics and percentiles
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+# Serve /metrics on this port; 0 turns it off
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Recent durations kept per stage for percentiles
+TRACE_SAMPLE_SIZE = int(os.getenv("TRACE_SAMPLE_SIZE", "10000"))
+TRACE_FLUSH_EVERY = 100
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_ids = itertools.count(1)
+_process = f"{os.getpid():x}"
+
+
+def _new_id():
+    return f"{_process}-{next(_ids):x}"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Span:
+    def __init__(self, tracer, name, parent=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = _new_id()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def add(self, key, amount=1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+        return self
+
+    def end(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.tracer._finish(self)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        self.end(exc)
+        return False
+
+    def as_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+# Stand-in when tracing is off: same interface, records nothing
+class NoopSpan:
+    def set(self, **attributes):
+        return self
+
+    def add(self, key, amount=1):
+        return self
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Tracer:
+    def __init__(self, path=TRACE_PATH, enabled=TRACING_ENABLED, sample_size=TRACE_SAMPLE_SIZE):
+        self.path = path
+        self.enabled = enabled
+        self.sample_size = sample_size
+        self.stages = defaultdict(ToolStats)
+        self.samples = defaultdict(lambda: deque(maxlen=self.sample_size))
+        self.counters = defaultdict(float)
+        self._lock = threading.Lock()
+        self._file = None
+        self._unflushed = 0
+
+    # Child of the current span, made current inside the `with` block
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, _current_span.get(), attributes)
+
+    # Span started and ended explicitly (callbacks); it does not become the current span
+    def start_span(self, name, parent=None, **attributes):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, parent or _current_span.get(), attributes)
+
+    def count(self, metric, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] += amount
+
+    def _finish(self, span):
+        line = json.dumps(span.as_dict(), default=str) if self.path else None
+        with self._lock:
+            self.stages[span.name].observe(span.duration, span.error is not None)
+            self.samples[span.name].append(span.duration)
+            for key, value in span.attributes.items():
+                if key.endswith("_tokens") or key.startswith("cache_"):
+                    if isinstance(value, (int, float)):
+                        self.counters[(f"span_{key}_total", (("stage", span.name),))] += value
+            if self.path:
+                if self._file is None:
+                    self._file = open(self.path, "a", buffering=1 << 16)
+                self._file.write(line + "\n")
+                self._unflushed += 1
+                if self._unflushed >= TRACE_FLUSH_EVERY:
+                    self._file.flush()
+                    self._unflushed = 0
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self._unflushed = 0
+
+    def percentiles(self, stage):
+        with self._lock:
+            values = list(self.samples.get(stage, ()))
+        return {
+            "count": len(values),
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+        }
+
+    def summary(self):
+        return {stage: self.percentiles(stage) for stage in sorted(self.samples)}
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.samples.clear()
+            self.counters.clear()
+
+    # Prometheus text exposition format
+    def render_prometheus(self):
+        lines = [
+            "# TYPE stage_calls_total counter",
+            "# TYPE stage_errors_total counter",
+            "# TYPE stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            stages = {name: stats.as_dict() for name, stats in self.stages.items()}
+            counters = dict(self.counters)
+        for name, stats in sorted(stages.items()):
+            label = f'stage="{name}"'
+            lines.append(f"stage_calls_total{{{label}}} {stats['calls']}")
+            lines.append(f"stage_errors_total{{{label}}} {stats['errors']}")
+            for bound, cumulative in stats["latency_buckets"].items():
+                lines.append(f'stage_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"stage_duration_seconds_sum{{{label}}} {stats['latency_sum']}")
+            lines.append(f"stage_duration_seconds_count{{{label}}} {stats['calls']}")
+        for (metric, labels), value in sorted(counters.items()):
+            label_text = ",".join(f'{key}="{value_}"' for key, value_ in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer()
+span = tracer.span
+count = tracer.count
+atexit.register(tracer.flush)
+
+
+def current_span():
+    return _current_span.get() or NOOP_SPAN
+
+
+# Wrap func to run in a copy of the caller's context, so spans it opens on a pool thread
+# still nest under the caller's span
+def in_current_context(func):
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+# Cache lookups: a counter per cache and outcome, and the outcome on the current span
+def record_cache(cache, hits=0, misses=0):
+    if hits:
+        count("cache_hits_total", hits, cache=cache)
+        current_span().add(f"cache_{cache}_hits", hits)
+    if misses:
+        count("cache_misses_total", misses, cache=cache)
+        current_span().add(f"cache_{cache}_misses", misses)
+
+
+# Token usage reported by the API, as span attributes and counters
+def record_usage(usage, stage):
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", None) or 0
+    completion = getattr(usage, "completion_tokens", None) or 0
+    current_span().add("prompt_tokens", prompt).add("completion_tokens", completion)
+    count("tokens_total", prompt, stage=stage, kind="prompt")
+    count("tokens_total", completion, stage=stage, kind="completion")
+
+
+def serve_metrics(port=METRICS_PORT, host="127.0.0.1"):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
+
+
+# Start the /metrics endpoint if METRICS_PORT is set
+def start_metrics_server():
+    if METRICS_PORT:
+        return serve_metrics(METRICS_PORT)
+    return None
+
+
+def summarize_trace(path):
+    durations = defaultdict(list)
+    errors = defaultdict(int)
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            durations[record["name"]].append(record["duration_ms"])
+            if record.get("error"):
+                errors[record["name"]] += 1
+    print(f"{'stage':<36}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in sorted(durations):
+        values = durations[name]
+        print(f"{name:<36}{len(values):>8}{errors[name]:>8}{percentile(values, 0.5):>10.2f}"
+              f"{percentile(values, 0.95):>10.2f}{percentile(values, 0.99):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency percentiles from a trace file")
+    parser.add_argument("path", nargs="?", default=TRACE_PATH, help="Trace file (default: TRACE_PATH)")
+    args = parser.parse_args()
+    if not args.path:
+        parser.error("no trace file given and TRACE_PATH is not set")
+    summarize_trace(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+# Investment transactions, processed at most once. Every transaction is appended to a local
+# SQLite ledger (LEDGER_PATH, WAL mode) under an idempotency key derived from the turn and the
+# wire ID (for ACH, the amount and date), so a resubmitted run step, a duplicated tool call or a
+# client retrying the same turn gets back the transaction that was already recorded instead of
+# processing it again.
+#
+# One writer thread owns the ledger. Submissions from every session are queued and written in
+# groups: one transaction and one fsync per group instead of per submission, and duplicates
+# within a group are resolved without touching the file. The ledger is append-only (triggers
+# reject UPDATE and DELETE) and several processes can share it; the unique key decides.
+#
+# The turn comes from turn_scope(), set by the entry points around each turn:
+#   with turn_scope(f"{session_id}:{turn}"):
+#       ...  # tool calls made here share the turn's keys
+
+import atexit
+import contextlib
+import contextvars
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+from tracing import span
+
+# Load environment variables
+load_dotenv()
+
+LEDGER_PATH = os.getenv("LEDGER_PATH", ".transactions.sqlite3")
+# Most submissions written in one group commit
+LEDGER_MAX_BATCH = int(os.getenv("LEDGER_MAX_BATCH", "256"))
+# How long the writer waits for more submissions before committing a group; 0 commits whatever
+# queued up during the previous commit
+LEDGER_COMMIT_DELAY_MS = float(os.getenv("LEDGER_COMMIT_DELAY_MS", "0"))
+# Seconds a submission waits for its group to be written
+LEDGER_TIMEOUT = float(os.getenv("LEDGER_TIMEOUT", "30"))
+# Share of transactions the simulated settlement approves
+TRANSACTION_APPROVAL_RATE = float(os.getenv("TRANSACTION_APPROVAL_RATE", "0.8"))
+
+# SQLite limits the number of parameters in one statement
+SQLITE_BATCH = 500
+
+_current_turn = contextvars.ContextVar("current_turn", default=None)
+
+
+# Mark the tool calls made inside the block as belonging to one turn
+@contextlib.contextmanager
+def turn_scope(turn_id):
+    token = _current_turn.set(turn_id)
+    try:
+        yield
+    finally:
+        _current_turn.reset(token)
+
+
+def current_turn():
+    return _current_turn.get()
+
+
+# Wire transfers are keyed by the wire ID within the turn, ACH payments by their details. Outside
+# a turn the key is the details alone, so the same wire is only ever processed once.
+def idempotency_key(payment_mode, amount, transaction_date, wire_id=None, turn_id=None):
+    if payment_mode.lower() == "wire transfer":
+        subject = f"wire\0{wire_id}"
+    else:
+        subject = f"ach\0{float(amount)!r}\0{transaction_date}"
+    return hashlib.sha256(f"{turn_id or ''}\0{subject}".encode()).hexdigest()
+
+
+# Stand-in for the payment processor: approves TRANSACTION_APPROVAL_RATE of transactions, decided
+# by the key so replays and benchmarks are reproducible
+def settle(key):
+    return "approved" if int(key[:8], 16) / 0x100000000 < TRANSACTION_APPROVAL_RATE else "declined"
+
+
+class Transaction:
+    def __init__(self, key, amount, payment_mode, transaction_date, wire_id=None, turn_id=None):
+        self.key = key
+        self.amount = float(amount)
+        self.payment_mode = payment_mode
+        self.transaction_date = transaction_date
+        self.wire_id = wire_id
+        self.turn_id = turn_id
+
+    def details(self):
+        return (self.amount, self.payment_mode.lower(), self.transaction_date, self.wire_id)
+
+
+class LedgerEntry:
+    def __init__(self, transaction_id, status, amount, payment_mode, transaction_date, wire_id, recorded_at,
+                 duplicate=False):
+        self.transaction_id = transaction_id
+        self.status = status
+        self.amount = amount
+        self.payment_mode = payment_mode
+        self.transaction_date = transaction_date
+        self.wire_id = wire_id
+        self.recorded_at = recorded_at
+        # True when the key was already in the ledger and this submission processed nothing
+        self.duplicate = duplicate
+
+    def details(self):
+        return (self.amount, self.payment_mode.lower(), self.transaction_date, self.wire_id)
+
+    def replayed(self):
+        return LedgerEntry(self.transaction_id, self.status, self.amount, self.payment_mode, self.transaction_date,
+                           self.wire_id, self.recorded_at, duplicate=True)
+
+
+ENTRY_COLUMNS = "idempotency_key, transaction_id, status, amount, payment_mode, transaction_date, wire_id, recorded_at"
+
+
+class TransactionLedger:
+    def __init__(self, path=LEDGER_PATH, max_batch=LEDGER_MAX_BATCH, commit_delay_ms=LEDGER_COMMIT_DELAY_MS):
+        self.path = path
+        self.max_batch = max_batch
+        self.commit_delay = commit_delay_ms / 1000
+        self.commits = 0
+        self.written = 0
+        self.duplicates = 0
+        self._queue = queue.Queue()
+        # Taken by submit and close, so nothing is queued behind the writer's stop sentinel
+        self._close_lock = threading.Lock()
+        self._closed = False
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=LEDGER_TIMEOUT)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # A commit is on disk before anyone is told the transaction went through
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS ledger (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                transaction_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                amount REAL NOT NULL,
+                payment_mode TEXT NOT NULL,
+                transaction_date TEXT NOT NULL,
+                wire_id TEXT,
+                turn_id TEXT,
+                recorded_at REAL NOT NULL
+            );
+            CREATE TRIGGER IF NOT EXISTS ledger_no_update BEFORE UPDATE ON ledger
+                BEGIN SELECT RAISE(ABORT, 'the ledger is append-only'); END;
+            CREATE TRIGGER IF NOT EXISTS ledger_no_delete BEFORE DELETE ON ledger
+                BEGIN SELECT RAISE(ABORT, 'the ledger is append-only'); END;
+        """)
+        self._writer = threading.Thread(target=self._write_loop, daemon=True, name="ledger-writer")
+        self._writer.start()
+
+    # Queue a transaction; the future resolves to its LedgerEntry once its group is committed
+    def submit(self, transaction):
+        future = Future()
+        with self._close_lock:
+            if self._closed:
+                future.set_exception(RuntimeError("The ledger is closed"))
+                return future
+            self._queue.put((transaction, future))
+        return future
+
+    def record(self, transaction, timeout=LEDGER_TIMEOUT):
+        return self.submit(transaction).result(timeout)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.commit_delay
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self):
+        while True:
+            batch = self._next_batch()
+            stop = any(item is None for item in batch)
+            batch = [item for item in batch if item is not None]
+            if batch:
+                try:
+                    entries = self._write_batch([transaction for transaction, _ in batch])
+                    for transaction, future in batch:
+                        future.set_result(entries[id(transaction)])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+            if stop:
+                return
+
+    def _existing(self, keys):
+        found = {}
+        for i in range(0, len(keys), SQLITE_BATCH):
+            batch = keys[i:i + SQLITE_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT {ENTRY_COLUMNS} FROM ledger WHERE idempotency_key IN ({placeholders})", batch
+            )
+            for row in rows:
+                found[row[0]] = LedgerEntry(*row[1:])
+        return found
+
+    # One write transaction for the whole group. Returns {id(transaction): LedgerEntry}.
+    def _write_batch(self, transactions):
+        with span("ledger.commit", submissions=len(transactions)) as commit_span:
+            by_key = {}
+            for transaction in transactions:
+                by_key.setdefault(transaction.key, transaction)
+            # BEGIN IMMEDIATE takes the write lock up front, so another process can't record one
+            # of these keys between the lookup and the insert
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                recorded = self._existing(list(by_key))
+                rows = []
+                now = time.time()
+                for key, transaction in by_key.items():
+                    if key in recorded:
+                        continue
+                    entry = LedgerEntry(f"txn-{uuid.uuid4().hex[:12]}", settle(key), transaction.amount,
+                                        transaction.payment_mode, transaction.transaction_date, transaction.wire_id, now)
+                    recorded[key] = entry
+                    rows.append((key, entry.transaction_id, entry.status, entry.amount, entry.payment_mode,
+                                 entry.transaction_date, entry.wire_id, transaction.turn_id, now))
+                self._conn.executemany(
+                    "INSERT INTO ledger (idempotency_key, transaction_id, status, amount, payment_mode, "
+                    "transaction_date, wire_id, turn_id, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            commit_span.set(written=len(rows))
+
+        # The first submission of a newly written key processed it; every other one is a replay
+        written = {row[0] for row in rows}
+        entries = {}
+        for transaction in transactions:
+            entry = recorded[transaction.key]
+            if transaction.key in written and by_key[transaction.key] is transaction:
+                entries[id(transaction)] = entry
+            else:
+                entries[id(transaction)] = entry.replayed()
+        self.commits += 1
+        self.written += len(rows)
+        self.duplicates += len(transactions) - len(rows)
+        return entries
+
+    def entries(self):
+        rows = self._conn.execute(f"SELECT {ENTRY_COLUMNS} FROM ledger ORDER BY seq").fetchall()
+        return [LedgerEntry(*row[1:]) for row in rows]
+
+    def stats(self):
+        return {"commits": self.commits, "written": self.written, "duplicates": self.duplicates,
+                "queued": self._queue.qsize()}
+
+    # Write what is queued, then stop the writer
+    def close(self):
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._writer.join()
+        self._conn.close()
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+# The process's ledger, opened on first use
+def get_ledger():
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = TransactionLedger()
+            atexit.register(_ledger.close)
+        return _ledger
+
+
+# Record a transaction for the current turn; the entry says whether it was processed just now or
+# replayed from an earlier submission
+def process(amount, payment_mode, transaction_date, wire_id=None, ledger=None):
+    turn_id = current_turn()
+    key = idempotency_key(payment_mode, amount, transaction_date, wire_id, turn_id)
+    transaction = Transaction(key, amount, payment_mode, transaction_date, wire_id, turn_id)
+    with span("transaction.process", payment_mode=payment_mode) as process_span:
+        entry = (ledger or get_ledger()).record(transaction)
+        process_span.set(status=entry.status, duplicate=entry.duplicate)
+    return transaction, entry
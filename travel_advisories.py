@@ -0,0 +1,176 @@
+# Travel advisories from a local dataset (ADVISORIES_PATH, CSV) instead of a per-process random
+# pick, so every worker and both entry points give the same answer for the same destination.
+#
+# Each row is an advisory for a country (empty city) or for one city in it:
+#   country,city,level,advisory,updated,aliases
+# level is 1-4 (low, medium, high, extreme); advisory may be empty to use the level's standard
+# text; aliases are other names of the country, separated by ";" (country rows only).
+#
+# The rows are held in one dict keyed by normalized (country, city), so a lookup is two dict
+# probes at most: the city, then the country as a whole. A background thread reloads the file
+# when its modification time changes and swaps in the new index in one assignment; a file that
+# fails to load leaves the previous index in place.
+
+import csv
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+ADVISORIES_PATH = os.getenv("ADVISORIES_PATH", "travel_advisories.csv")
+# How often the file is checked for changes; 0 turns reloading off
+ADVISORIES_RELOAD_SECONDS = float(os.getenv("ADVISORIES_RELOAD_SECONDS", "60"))
+
+RISK_LEVELS = {
+    1: ("low", "Exercise normal precautions"),
+    2: ("medium", "Exercise increased caution"),
+    3: ("high", "Reconsider travel"),
+    4: ("extreme", "Do not travel"),
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+# Case, accents, punctuation and spacing don't matter: "São Paulo", "sao  paulo" and "Sao-Paulo"
+# are one place
+def normalize_place(name):
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(_PUNCTUATION.sub(" ", stripped.casefold()).split())
+
+
+class Advisory:
+    __slots__ = ("level", "text", "updated", "scope")
+
+    def __init__(self, level, text, updated, scope):
+        self.level = level
+        self.text = text
+        self.updated = updated
+        self.scope = scope
+
+    @property
+    def risk(self):
+        return RISK_LEVELS[self.level][0]
+
+
+class AdvisoryIndex:
+    def __init__(self, entries=None, aliases=None, mtime=None):
+        # (country, city) -> Advisory, with city "" for the country as a whole
+        self.entries = entries or {}
+        # alternative country name -> country name, both normalized
+        self.aliases = aliases or {}
+        self.mtime = mtime
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def load(cls, path=ADVISORIES_PATH):
+        mtime = os.stat(path).st_mtime_ns
+        entries = {}
+        aliases = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for line_number, row in enumerate(csv.DictReader(f), start=2):
+                country = normalize_place(row.get("country"))
+                city = normalize_place(row.get("city"))
+                if not country:
+                    raise ValueError(f"{path}:{line_number}: country is required")
+                level = int(row.get("level") or 0)
+                if level not in RISK_LEVELS:
+                    raise ValueError(f"{path}:{line_number}: level must be 1-4, not {row.get('level')!r}")
+                text = (row.get("advisory") or "").strip() or RISK_LEVELS[level][1]
+                entries[(country, city)] = Advisory(level, text, (row.get("updated") or "").strip(),
+                                                    "city" if city else "country")
+                for alias in (row.get("aliases") or "").split(";"):
+                    if normalize_place(alias):
+                        aliases[normalize_place(alias)] = country
+        return cls(entries, aliases, mtime)
+
+    # The city's own advisory, else the country's, else None
+    def lookup(self, city, country):
+        country_key = normalize_place(country)
+        country_key = self.aliases.get(country_key, country_key)
+        return self.entries.get((country_key, normalize_place(city))) or self.entries.get((country_key, ""))
+
+
+_index = None
+_index_lock = threading.Lock()
+# The running reloader, kept so it can be stopped
+_reloader = None
+
+
+# Keeps the index in step with the file. The last good index stays in use while the file is
+# missing or fails to load. Failures are reported when they start or change, not on every
+# check, and recovery is reported once.
+class _AdvisoryReloader:
+    def __init__(self, path, mtime):
+        self.path = path
+        self.mtime = mtime
+        self.failure = None
+        # A version of the file that failed to load is only tried again once it changes
+        self.failed_mtime = None
+        self.stopped = threading.Event()
+
+    def check(self):
+        global _index
+        try:
+            current = os.stat(self.path).st_mtime_ns
+            if current == self.failed_mtime:
+                return
+            if current != self.mtime:
+                try:
+                    _index = AdvisoryIndex.load(self.path)
+                except Exception:
+                    self.failed_mtime = current
+                    raise
+                self.mtime = current
+            error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        if error != self.failure:
+            if error is not None:
+                print(f"Reloading travel advisories from {self.path} failed: {error}")
+            else:
+                print(f"Travel advisories from {self.path} loaded again")
+            self.failure = error
+
+    def run(self):
+        while not self.stopped.wait(ADVISORIES_RELOAD_SECONDS):
+            self.check()
+
+    def stop(self):
+        self.stopped.set()
+
+
+# The advisory index, loaded on first use and then kept in step with the file
+def get_advisory_index():
+    global _index, _reloader
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AdvisoryIndex.load(ADVISORIES_PATH)
+                if ADVISORIES_RELOAD_SECONDS > 0:
+                    _reloader = _AdvisoryReloader(ADVISORIES_PATH, _index.mtime)
+                    threading.Thread(target=_reloader.run, daemon=True, name="advisories-reload").start()
+    return _index
+
+
+def format_advisory(city, country, advisory):
+    text = f"Travel Advisory for {city}, {country}:\n"
+    if advisory is None:
+        text += "Risk Level: unknown\n"
+        text += "Advisory: No advisory is on file for this destination; check the official government travel site."
+        return text
+    text += f"Risk Level: {advisory.risk}\n"
+    text += f"Advisory: {advisory.text}"
+    if advisory.scope == "country":
+        text += f"\n(Country-wide advisory for {country})"
+    if advisory.updated:
+        text += f"\nLast updated: {advisory.updated}"
+    return text
@@ -0,0 +1,277 @@
+# Approximate nearest neighbour index for the pgvector collection, and the search query that
+# uses it. Without an index every similarity search is an exact scan over all of
+# langchain_pg_embedding; with HNSW or IVFFlat the search reads a few index pages instead, at
+# the cost of a little recall, which `recall` measures against the exact search.
+#
+# Usage:
+#   python vector_index.py create --method hnsw --m 16 --ef-construction 64
+#   python vector_index.py create --method ivfflat
+#   python vector_index.py status
+#   python vector_index.py recall --samples 100 --ef-search 20 40 80 160
+#   python vector_index.py drop
+
+import argparse
+import json
+import math
+import os
+import statistics
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from lifecycle import COLLECTION_NAME, get_async_engine, get_engine
+from tracing import span
+
+# Load environment variables
+load_dotenv()
+
+# Candidates HNSW keeps while searching, and IVFFlat lists probed, per query; 0 keeps the
+# server's setting. Higher finds more of the true nearest neighbours and takes longer.
+ANN_EF_SEARCH = int(os.getenv("ANN_EF_SEARCH", "0"))
+ANN_PROBES = int(os.getenv("ANN_PROBES", "0"))
+# pgvector 0.8+ keeps scanning the index until a filtered query has k rows
+# (off, strict_order or relaxed_order); empty leaves it alone for older servers
+ANN_ITERATIVE_SCAN = os.getenv("ANN_ITERATIVE_SCAN", "")
+
+EMBEDDING_TABLE = "langchain_pg_embedding"
+COLLECTION_TABLE = "langchain_pg_collection"
+INDEX_METHODS = ("hnsw", "ivfflat")
+
+SEARCH_SQL = f"""
+    SELECT e.id, e.document, e.cmetadata, e.embedding <=> CAST(:embedding AS vector) AS distance
+    FROM {EMBEDDING_TABLE} e
+    JOIN {COLLECTION_TABLE} c ON e.collection_id = c.uuid
+    WHERE c.name = :collection {{filter}}
+    ORDER BY e.embedding <=> CAST(:embedding AS vector)
+    LIMIT :k
+"""
+
+
+def index_name(method):
+    return f"{EMBEDDING_TABLE}_embedding_{method}_idx"
+
+
+def vector_literal(embedding):
+    return "[" + ",".join(repr(float(value)) for value in embedding) + "]"
+
+
+# Session settings for one query; set_config(..., true) only lasts until the transaction ends
+def _search_settings(ef_search, probes, exact, filtered):
+    settings = []
+    if exact:
+        settings.append(("enable_indexscan", "off"))
+    if ef_search:
+        settings.append(("hnsw.ef_search", str(ef_search)))
+    if probes:
+        settings.append(("ivfflat.probes", str(probes)))
+    if filtered and ANN_ITERATIVE_SCAN:
+        settings.append(("hnsw.iterative_scan", ANN_ITERATIVE_SCAN))
+        settings.append(("ivfflat.iterative_scan", ANN_ITERATIVE_SCAN))
+    return settings
+
+
+# Metadata pre-filter on the jsonb cmetadata column, e.g. {"source": "docs/policies.pdf"}.
+# Containment (@>) is served by the GIN index langchain_postgres creates on cmetadata.
+def _search_query(embedding, k, collection_name, filter):
+    params = {"embedding": vector_literal(embedding), "collection": collection_name, "k": k}
+    clause = ""
+    if filter:
+        clause = "AND e.cmetadata @> CAST(:filter AS jsonb)"
+        params["filter"] = json.dumps(filter)
+    return text(SEARCH_SQL.format(filter=clause)), params
+
+
+# Same scores as PGVector's cosine relevance: 1 - distance
+def _results(rows):
+    from langchain_core.documents import Document
+    return [
+        (Document(id=str(row.id), page_content=row.document, metadata=row.cmetadata or {}), 1.0 - row.distance)
+        for row in rows
+    ]
+
+
+def search(embedding, k=6, collection_name=COLLECTION_NAME, filter=None,
+           ef_search=ANN_EF_SEARCH, probes=ANN_PROBES, exact=False):
+    query, params = _search_query(embedding, k, collection_name, filter)
+    with span("pgvector", collection=collection_name, k=k, exact=exact) as search_span:
+        with get_engine().begin() as conn:
+            for name, value in _search_settings(ef_search, probes, exact, bool(filter)):
+                conn.execute(text("SELECT set_config(:name, :value, true)"), {"name": name, "value": value})
+            results = _results(conn.execute(query, params).all())
+        search_span.set(rows=len(results))
+        return results
+
+
+async def asearch(embedding, k=6, collection_name=COLLECTION_NAME, filter=None,
+                  ef_search=ANN_EF_SEARCH, probes=ANN_PROBES, exact=False):
+    query, params = _search_query(embedding, k, collection_name, filter)
+    with span("pgvector", collection=collection_name, k=k, exact=exact) as search_span:
+        async with get_async_engine().begin() as conn:
+            for name, value in _search_settings(ef_search, probes, exact, bool(filter)):
+                await conn.execute(text("SELECT set_config(:name, :value, true)"), {"name": name, "value": value})
+            results = _results((await conn.execute(query, params)).all())
+        search_span.set(rows=len(results))
+        return results
+
+
+def _autocommit():
+    return get_engine().connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+# Indexes need a fixed dimension, but langchain_postgres creates the column as plain `vector`
+def ensure_dimensions(conn, dimensions=None):
+    column_type = conn.execute(text(
+        "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+        f"WHERE attrelid = '{EMBEDDING_TABLE}'::regclass AND attname = 'embedding'"
+    )).scalar_one()
+    if column_type != "vector":
+        return column_type
+    if dimensions is None:
+        dimensions = conn.execute(text(f"SELECT vector_dims(embedding) FROM {EMBEDDING_TABLE} LIMIT 1")).scalar()
+        if dimensions is None:
+            raise SystemExit("The embedding table is empty; pass --dimensions or ingest documents first.")
+    conn.execute(text(f"ALTER TABLE {EMBEDDING_TABLE} ALTER COLUMN embedding TYPE vector({int(dimensions)})"))
+    return f"vector({int(dimensions)})"
+
+
+# pgvector's guidance: rows / 1000 lists up to a million rows, sqrt(rows) beyond
+def default_lists(rows):
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def create_index(method, m=16, ef_construction=64, lists=None, dimensions=None,
+                 maintenance_work_mem=None, concurrently=True):
+    with _autocommit() as conn:
+        column_type = ensure_dimensions(conn, dimensions)
+        if maintenance_work_mem:
+            conn.execute(text("SELECT set_config('maintenance_work_mem', :value, false)"),
+                         {"value": maintenance_work_mem})
+        if method == "hnsw":
+            options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+        else:
+            if lists is None:
+                lists = default_lists(conn.execute(text(f"SELECT count(*) FROM {EMBEDDING_TABLE}")).scalar_one())
+            options = f"lists = {int(lists)}"
+        conn.execute(text(
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {index_name(method)} "
+            f"ON {EMBEDDING_TABLE} USING {method} (embedding vector_cosine_ops) WITH ({options})"
+        ))
+        conn.execute(text(f"ANALYZE {EMBEDDING_TABLE}"))
+    print(f"Created {method} index {index_name(method)} ({options}) on {column_type} embeddings.")
+
+
+def drop_index(method):
+    with _autocommit() as conn:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name(method)}"))
+    print(f"Dropped {index_name(method)}.")
+
+
+def index_status():
+    with get_engine().connect() as conn:
+        rows = conn.execute(text(
+            "SELECT indexname, indexdef, pg_size_pretty(pg_relation_size(quote_ident(indexname)::regclass)) "
+            f"FROM pg_indexes WHERE tablename = '{EMBEDDING_TABLE}'"
+        )).all()
+        count = conn.execute(text(f"SELECT count(*) FROM {EMBEDDING_TABLE}")).scalar_one()
+    print(f"{count} embeddings in {EMBEDDING_TABLE}")
+    for name, definition, size in rows:
+        print(f"{name} ({size}): {definition}")
+
+
+def _sample_queries(samples, collection_name):
+    with get_engine().connect() as conn:
+        rows = conn.execute(text(
+            f"SELECT e.embedding::text FROM {EMBEDDING_TABLE} e JOIN {COLLECTION_TABLE} c "
+            "ON e.collection_id = c.uuid WHERE c.name = :collection ORDER BY random() LIMIT :samples"
+        ), {"collection": collection_name, "samples": samples}).scalars().all()
+    return [json.loads(row) for row in rows]
+
+
+def _timed_ids(queries, **options):
+    ids, latencies = [], []
+    for embedding in queries:
+        start = time.perf_counter()
+        results = search(embedding, **options)
+        latencies.append(time.perf_counter() - start)
+        ids.append({doc.id for doc, _ in results})
+    return ids, latencies
+
+
+def _latency_ms(latencies):
+    ordered = sorted(latencies)
+    return statistics.mean(ordered) * 1000, ordered[int(0.95 * (len(ordered) - 1))] * 1000
+
+
+# Recall@k of the index against exact search, using stored embeddings as queries so no
+# embedding calls are made
+def recall_report(samples=100, k=6, ef_search_values=(), probes_values=(), filter=None,
+                  collection_name=COLLECTION_NAME):
+    queries = _sample_queries(samples, collection_name)
+    if not queries:
+        raise SystemExit(f"No embeddings in collection {collection_name!r}.")
+    options = {"k": k, "collection_name": collection_name, "filter": filter}
+    exact_ids, exact_latencies = _timed_ids(queries, exact=True, **options)
+
+    settings = [("exact", {"exact": True})]
+    settings += [(f"ef_search={value}", {"ef_search": value}) for value in ef_search_values]
+    settings += [(f"probes={value}", {"probes": value}) for value in probes_values]
+    if len(settings) == 1:
+        settings.append(("index defaults", {}))
+
+    print(f"{len(queries)} queries, k={k}" + (f", filter {json.dumps(filter)}" if filter else ""))
+    print(f"{'setting':<20}{'recall@k':>10}{'mean ms':>10}{'p95 ms':>10}")
+    for label, setting in settings:
+        if setting.get("exact"):
+            ids, latencies = exact_ids, exact_latencies
+        else:
+            ids, latencies = _timed_ids(queries, **setting, **options)
+        found = sum(len(got & expected) for got, expected in zip(ids, exact_ids))
+        total = sum(len(expected) for expected in exact_ids)
+        mean_ms, p95_ms = _latency_ms(latencies)
+        print(f"{label:<20}{found / total if total else 1.0:>10.3f}{mean_ms:>10.2f}{p95_ms:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the ANN index of the pgvector collection")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create", help="Create (or keep) an HNSW or IVFFlat index")
+    create.add_argument("--method", choices=INDEX_METHODS, default="hnsw")
+    create.add_argument("--m", type=int, default=16, help="HNSW: links per node")
+    create.add_argument("--ef-construction", type=int, default=64, help="HNSW: candidates while building")
+    create.add_argument("--lists", type=int, help="IVFFlat: number of lists (default from the row count)")
+    create.add_argument("--dimensions", type=int, help="Embedding size if the table is still empty")
+    create.add_argument("--maintenance-work-mem", help="e.g. 1GB; a build that fits in memory is much faster")
+    create.add_argument("--blocking", action="store_true", help="Build without CONCURRENTLY (locks writes)")
+
+    drop = commands.add_parser("drop", help="Drop an index")
+    drop.add_argument("--method", choices=INDEX_METHODS, default="hnsw")
+
+    commands.add_parser("status", help="List the indexes on the embedding table")
+
+    recall = commands.add_parser("recall", help="Recall and latency of the index against exact search")
+    recall.add_argument("--samples", type=int, default=100)
+    recall.add_argument("--k", type=int, default=6)
+    recall.add_argument("--ef-search", type=int, nargs="*", default=[])
+    recall.add_argument("--probes", type=int, nargs="*", default=[])
+    recall.add_argument("--source", help="Only search chunks of this source file")
+    recall.add_argument("--collection", default=COLLECTION_NAME)
+
+    args = parser.parse_args()
+    if args.command == "create":
+        create_index(args.method, args.m, args.ef_construction, args.lists, args.dimensions,
+                     args.maintenance_work_mem, concurrently=not args.blocking)
+    elif args.command == "drop":
+        drop_index(args.method)
+    elif args.command == "status":
+        index_status()
+    else:
+        recall_report(args.samples, args.k, args.ef_search, args.probes,
+                      {"source": args.source} if args.source else None, args.collection)
+
+
+if __name__ == "__main__":
+    main()